@@ -1,9 +1,16 @@
 from django.contrib import admin
-from .models import Company
+from .models import Company, ShopifyDomain
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'organization', 'alegra_id', 'created_at')
     search_fields = ('name', 'organization__name')
     list_filter = ('organization',)
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(ShopifyDomain)
+class ShopifyDomainAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'company', 'organization', 'updated_at')
+    search_fields = ('domain', 'company__name')
+    list_filter = ('organization',)
+    readonly_fields = ('domain', 'company', 'organization', 'created_at', 'updated_at')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0001_initial'),
+        ('organizations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopifyDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_domains', to='companies.company')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_domains', to='organizations.organization')),
+            ],
+            options={
+                'verbose_name': 'Shopify Domain',
+                'verbose_name_plural': 'Shopify Domains',
+            },
+        ),
+    ]
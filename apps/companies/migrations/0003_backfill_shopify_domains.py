@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def backfill_shopify_domains(apps, schema_editor):
+    Company = apps.get_model('companies', 'Company')
+    ShopifyDomain = apps.get_model('companies', 'ShopifyDomain')
+
+    for company in Company.objects.order_by('created_at').iterator():
+        metadata = company.metadata if isinstance(company.metadata, dict) else {}
+        domain = metadata.get('shopify_domain')
+        if not domain and isinstance(metadata.get('metadata'), dict):
+            domain = metadata['metadata'].get('shopify_domain')
+        if not isinstance(domain, str) or not domain.strip():
+            continue
+
+        ShopifyDomain.objects.update_or_create(
+            domain=domain.strip().lower(),
+            defaults={'company_id': company.id, 'organization_id': company.organization_id},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_shopifydomain'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_shopify_domains, migrations.RunPython.noop),
+    ]
@@ -15,4 +15,33 @@ class Company(models.Model):
         unique_together = ('organization', 'name')
         verbose_name = 'Company'
         verbose_name_plural = 'Companies'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+def extract_shopify_domain(metadata):
+    """
+    Returns the Shopify domain declared in a company's metadata, looking at the
+    top level first and then at the double-nested 'metadata' key.
+    """
+    metadata = metadata if isinstance(metadata, dict) else {}
+    domain = metadata.get('shopify_domain')
+    if not domain and isinstance(metadata.get('metadata'), dict):
+        domain = metadata['metadata'].get('shopify_domain')
+    return domain.strip().lower() if isinstance(domain, str) and domain.strip() else None
+
+
+class ShopifyDomain(models.Model):
+    """
+    Indexed shop domain -> Company mapping, maintained from Company.metadata.
+    """
+    domain = models.CharField(max_length=255, unique=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='shopify_domains')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='shopify_domains')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Shopify Domain'
+        verbose_name_plural = 'Shopify Domains'
+
+    def __str__(self):
+        return self.domain
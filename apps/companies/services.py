@@ -0,0 +1,70 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from core.cache import TwoLevelCache
+from .models import Company, ShopifyDomain, extract_shopify_domain
+
+logger = logging.getLogger(__name__)
+
+_shopify_domain_cache = TwoLevelCache(
+    'shopify:domain',
+    ttl=settings.SHOPIFY_DOMAIN_CACHE_TTL,
+    local_ttl=settings.SHOPIFY_DOMAIN_LOCAL_CACHE_TTL,
+    negative_ttl=settings.SHOPIFY_DOMAIN_NEGATIVE_CACHE_TTL,
+)
+
+
+def _load_company_by_shopify_domain(domain):
+    mapping = ShopifyDomain.objects.select_related('company').filter(domain=domain).first()
+    return mapping.company if mapping else None
+
+
+def get_company_by_shopify_domain(hostname, organization_id=None):
+    """
+    Resolves the Company that owns a Shopify shop domain through the indexed
+    ShopifyDomain table, cached in memory and in Redis.
+    When `organization_id` is given, companies of other tenants are ignored.
+    """
+    if not hostname:
+        return None
+
+    company = _shopify_domain_cache.get_or_load(_load_company_by_shopify_domain, hostname.lower())
+    if company is not None and organization_id is not None and str(company.organization_id) != str(organization_id):
+        return None
+    return company
+
+
+def invalidate_shopify_domain(domain):
+    _shopify_domain_cache.invalidate(domain)
+
+
+def sync_shopify_domain(company: Company):
+    """
+    Keeps the ShopifyDomain mapping of a company in line with its metadata.
+    """
+    domain = extract_shopify_domain(company.metadata)
+    stale_domains = list(
+        ShopifyDomain.objects.filter(company=company).exclude(domain=domain).values_list('domain', flat=True)
+    )
+    if stale_domains:
+        ShopifyDomain.objects.filter(company=company, domain__in=stale_domains).delete()
+
+    if domain:
+        mapping, created = ShopifyDomain.objects.get_or_create(
+            domain=domain,
+            defaults={'company': company, 'organization_id': company.organization_id},
+        )
+        if not created and (mapping.company_id != company.id or mapping.organization_id != company.organization_id):
+            logger.warning(f"Shopify domain {domain} moved from company {mapping.company_id} to {company.id}")
+            mapping.company = company
+            mapping.organization_id = company.organization_id
+            mapping.save(update_fields=['company', 'organization', 'updated_at'])
+
+    # The cached Company carries its metadata (e.g. the webhook secret), so the
+    # current domain is invalidated on every save, not only when it changes.
+    # Invalidated again on commit: a concurrent webhook may have cached the old
+    # row in between, which would otherwise stay until the TTL expires.
+    for stale_domain in [*stale_domains, domain]:
+        if stale_domain:
+            invalidate_shopify_domain(stale_domain)
+            transaction.on_commit(lambda stale_domain=stale_domain: invalidate_shopify_domain(stale_domain))
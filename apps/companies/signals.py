@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Company, ShopifyDomain
+from .services import invalidate_shopify_domain, sync_shopify_domain
+
+@receiver(post_save, sender=Company)
+def sync_company_shopify_domain(sender, instance, **kwargs):
+    """
+    Maintains the ShopifyDomain lookup table from Company.metadata.
+    """
+    sync_shopify_domain(instance)
+
+
+@receiver(post_delete, sender=ShopifyDomain)
+def invalidate_deleted_shopify_domain(sender, instance, **kwargs):
+    invalidate_shopify_domain(instance.domain)
+    transaction.on_commit(lambda domain=instance.domain: invalidate_shopify_domain(domain))
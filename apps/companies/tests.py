@@ -1,3 +1,52 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.companies.models import Company, ShopifyDomain
+from apps.companies import services
+from apps.organizations.models import Organization
 
-# Create your tests here.
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ShopifyDomainLookupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        services._shopify_domain_cache.local.clear()
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(
+            organization=self.organization,
+            name="Test Company",
+            metadata={"metadata": {"shopify_domain": "Test-Shop.myshopify.com"}}
+        )
+
+    def test_mapping_is_maintained_from_metadata(self):
+        self.assertEqual(ShopifyDomain.objects.get().domain, "test-shop.myshopify.com")
+
+        self.company.metadata = {"shopify_domain": "other-shop.myshopify.com"}
+        self.company.save()
+
+        self.assertEqual(list(ShopifyDomain.objects.values_list('domain', flat=True)), ["other-shop.myshopify.com"])
+        self.assertIsNone(services.get_company_by_shopify_domain("test-shop.myshopify.com"))
+        self.assertEqual(services.get_company_by_shopify_domain("other-shop.myshopify.com"), self.company)
+
+    def test_lookup_is_cached_and_tenant_scoped(self):
+        self.assertEqual(services.get_company_by_shopify_domain("test-shop.myshopify.com"), self.company)
+        other_organization = Organization.objects.create(slug="other-org", uuid="other-uuid")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                services.get_company_by_shopify_domain("test-shop.myshopify.com", self.organization.id),
+                self.company
+            )
+            self.assertIsNone(services.get_company_by_shopify_domain("test-shop.myshopify.com", other_organization.id))
+
+    def test_metadata_change_invalidates_cache_on_commit(self):
+        stale = services.get_company_by_shopify_domain("test-shop.myshopify.com")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.company.metadata = {"shopify_domain": "test-shop.myshopify.com", "webhook_secret": "new"}
+            self.company.save()
+            # A concurrent webhook caches the old row before the save commits.
+            services._shopify_domain_cache.set(stale, "test-shop.myshopify.com")
+
+        for callback in callbacks:
+            callback()
+        company = services.get_company_by_shopify_domain("test-shop.myshopify.com")
+        self.assertEqual(company.metadata.get("webhook_secret"), "new")
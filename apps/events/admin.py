@@ -1,42 +1,69 @@
+import json
 from django.contrib import admin
 from django.contrib import messages
-from .models import Event
+from .models import Event, EventArchive, RetryJob
+from . import bulk_retry
+
+# Changelist filters that map onto bulk retry filters.
+CHANGELIST_FILTERS = {
+    'status__exact': 'statuses',
+    'source__exact': 'source',
+    'topic__exact': 'topic',
+    'created_at__gte': 'created_after',
+    'created_at__lt': 'created_before',
+}
+IGNORED_CHANGELIST_PARAMS = ('o', 'p', 'all', '_changelist_filters')
+
+
+def _changelist_retry_filters(request):
+    """
+    Bulk retry filters equivalent to the current changelist filters, or None
+    if some of them (e.g. a search) cannot be expressed as such.
+    """
+    data, organization_id = {}, None
+    for param, value in request.GET.items():
+        if param in IGNORED_CHANGELIST_PARAMS:
+            continue
+        if param == 'organization__id__exact':
+            organization_id = value
+        elif param in CHANGELIST_FILTERS:
+            data[CHANGELIST_FILTERS[param]] = value
+        else:
+            return None, None
+    return data, organization_id
+
 
 def retry_events(modeladmin, request, queryset):
     """
-    Admin action to retry failed or pending events.
-    Resets the event status to 'pending' and triggers reprocessing.
+    Admin action to retry failed, dead-lettered or pending events.
+    Starts a bulk retry job that resets the matching events to 'pending' and
+    dispatches them in chunks. Selecting all the results of a filtered
+    changelist retries by those filters instead of listing every event.
     """
-    retriable_events = queryset.filter(status__in=['failed', 'pending'])
-    count = retriable_events.count()
-    
-    if count == 0:
-        modeladmin.message_user(
-            request,
-            "No failed or pending events selected.",
-            level=messages.WARNING
-        )
+    data, organization_id = None, None
+    if request.POST.get('select_across') == '1':
+        data, organization_id = _changelist_retry_filters(request)
+    if data is None:
+        ids = list(queryset.filter(status__in=bulk_retry.RETRIABLE_STATUSES).values_list('id', flat=True))
+        if not ids:
+            modeladmin.message_user(
+                request,
+                "No failed, dead or pending events selected.",
+                level=messages.WARNING
+            )
+            return
+        data = {'ids': ids, 'statuses': list(bulk_retry.RETRIABLE_STATUSES)}
+
+    try:
+        filters = bulk_retry.clean_filters(data)
+    except ValueError as e:
+        modeladmin.message_user(request, str(e), level=messages.ERROR)
         return
-    
-    # Reset status to pending and clear error
-    retriable_events.update(status='pending', error=None)
-    
-    # Trigger reprocessing via signal (or manually dispatch tasks)
-    for event in retriable_events:
-        # Route based on topic
-        if event.topic == 'pos.invoice.received':
-            from .tasks import process_event_async
-            process_event_async(event.id)
-        elif event.topic == 'orders/create':
-            from apps.integrations.erpnext.tasks import create_erpnext_order_from_shopify_event
-            create_erpnext_order_from_shopify_event.delay(event.id)
-        elif event.topic == 'order.create':
-            from apps.integrations.router.tasks import process_order_event
-            process_order_event.delay(event.id)
-    
+
+    job = bulk_retry.create_job(filters, organization_id=organization_id, created_by=request.user.get_username())
     modeladmin.message_user(
         request,
-        f"Successfully queued {count} event(s) for retry.",
+        f"Started retry job {job.id}; its progress is shown under Retry jobs.",
         level=messages.SUCCESS
     )
 
@@ -45,23 +72,53 @@ retry_events.short_description = "Retry selected events"
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('id', 'source', 'topic', 'status', 'organization', 'attempts', 'created_at')
-    search_fields = ('source', 'topic', 'organization__slug', 'id')
+    list_display = ('id', 'source', 'topic', 'external_ref', 'status', 'organization', 'attempts', 'next_attempt_at', 'created_at')
+    search_fields = ('=external_ref', 'source', 'topic', 'organization__slug', 'id')
     list_filter = ('status', 'source', 'topic', 'organization', 'created_at')
-    readonly_fields = ('id', 'created_at', 'updated_at', 'dedup_hash', 'trace_id')
+    readonly_fields = ('id', 'created_at', 'updated_at', 'dedup_hash', 'trace_id', 'full_payload')
     actions = [retry_events]
     
     fieldsets = (
         ('Event Information', {
-            'fields': ('id', 'organization', 'source', 'topic', 'status')
+            'fields': ('id', 'organization', 'source', 'topic', 'external_ref', 'status')
         }),
         ('Processing', {
-            'fields': ('attempts', 'error', 'response')
+            'fields': ('attempts', 'next_attempt_at', 'error', 'response')
         }),
         ('Data', {
-            'fields': ('payload', 'idempotency_key', 'dedup_hash', 'trace_id')
+            'fields': ('payload', 'full_payload', 'idempotency_key', 'dedup_hash', 'trace_id')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
         }),
-    )
\ No newline at end of file
+    )
+
+    @admin.display(description='Full payload')
+    def full_payload(self, obj):
+        try:
+            return json.dumps(obj.get_payload(), indent=2, ensure_ascii=False)
+        except LookupError as e:
+            return str(e)
+
+@admin.register(EventArchive)
+class EventArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'topic', 'status', 'organization', 'created_at', 'archived_at')
+    search_fields = ('id', 'topic', 'idempotency_key')
+    list_filter = ('status', 'source', 'topic')
+    exclude = ('payload', 'response')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RetryJob)
+class RetryJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'organization', 'dispatched', 'total', 'chunks', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'organization')
+    readonly_fields = [field.name for field in RetryJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
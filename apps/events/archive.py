@@ -0,0 +1,152 @@
+"""
+Retention of terminal events.
+
+Old events in a terminal status (EVENT_ARCHIVE_STATUSES) are moved in batches
+from the hot events table to EventArchive, with their payload and response
+compressed, so the hot table only holds active and recent events.
+
+On PostgreSQL the archive is range-partitioned by month on created_at:
+partitions are created on demand and months older than the archive retention
+are dropped with a single DROP TABLE instead of a massive DELETE.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.events.models import Event, EventArchive, OutboxMessage
+from apps.events import payloads
+from apps.events.payloads import compress_json, decompress_json
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = EventArchive._meta.db_table
+
+
+def _month_start(value: datetime) -> datetime:
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{ARCHIVE_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def ensure_partitions(start: datetime, end: datetime):
+    """Creates the monthly archive partitions covering [start, end]."""
+    if not is_partitioned():
+        return
+
+    month = _month_start(start)
+    with connection.cursor() as cursor:
+        while month <= end:
+            upper = _next_month(month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{ARCHIVE_TABLE}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            month = upper
+
+
+def _to_archive(event: Event) -> EventArchive:
+    return EventArchive(
+        id=event.id,
+        organization_id=event.organization_id,
+        source=event.source,
+        topic=event.topic,
+        status=event.status,
+        idempotency_key=event.idempotency_key,
+        attempts=event.attempts,
+        error=event.error,
+        payload=compress_json(event.get_payload()),
+        response=compress_json(event.get_response()),
+        created_at=event.created_at,
+        updated_at=event.updated_at,
+    )
+
+
+def archive_events(older_than_days: int = None, batch_size: int = None) -> int:
+    """
+    Moves terminal events older than `older_than_days` to the archive, one
+    batch per transaction (claimed with SKIP LOCKED). Outbox messages of the
+    archived events are deleted with them. Returns the number of archived events.
+    """
+    older_than_days = settings.EVENT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or settings.EVENT_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                Event.objects.select_for_update(skip_locked=True)
+                .filter(status__in=settings.EVENT_ARCHIVE_STATUSES, created_at__lt=cutoff)
+                .order_by('created_at')[:batch_size]
+            )
+            if not events:
+                break
+
+            ensure_partitions(events[0].created_at, events[-1].created_at)
+            payloads.load_many(events, 'payload')
+            payloads.load_many(events, 'response')
+            EventArchive.objects.bulk_create([_to_archive(event) for event in events], ignore_conflicts=True)
+
+            ids = [event.id for event in events]
+            OutboxMessage.objects.filter(event_id__in=ids).delete()
+            Event.objects.filter(id__in=ids).delete()
+
+        # External bodies go once the move is committed.
+        payloads.delete(events)
+        total += len(events)
+        logger.info(f"Archived {len(events)} event(s).")
+
+    return total
+
+
+def drop_expired_archives(retention_days: int = None) -> int:
+    """
+    Drops the archived events older than `retention_days` (0 keeps them
+    forever). On PostgreSQL whole monthly partitions are dropped, so only
+    months entirely past the retention go. Returns the number of dropped
+    partitions, or of deleted rows on other databases.
+    """
+    retention_days = settings.EVENT_ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    if not retention_days:
+        return 0
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    if not is_partitioned():
+        deleted, _ = EventArchive.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s",
+            [ARCHIVE_TABLE],
+        )
+        partitions = [row[0] for row in cursor.fetchall()]
+
+        dropped = 0
+        prefix = f"{ARCHIVE_TABLE}_p"
+        for name in sorted(partitions):
+            try:
+                month = datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                continue
+            if _next_month(month) <= cutoff:
+                cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+                logger.info(f"Dropped archive partition {name}.")
+                dropped += 1
+
+    return dropped
@@ -0,0 +1,199 @@
+"""
+Bulk retries of events, e.g. to recover everything that failed during an
+ERPNext outage in one operation.
+
+A RetryJob records the filters (organization, source, topic, statuses,
+created_at range or explicit ids) and is run by a worker: matching events are
+claimed in chunks with FOR UPDATE SKIP LOCKED, walking the (created_at, id)
+keyset, reset to 'pending' with a single UPDATE (dead events also get their
+attempts back) and dispatched through the outbox, so each chunk costs one
+broker round trip. The job row records the progress and the keyset position,
+so a failed job resumes where it stopped.
+"""
+import logging
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.events.models import Event, RetryJob
+from apps.events import outbox
+
+logger = logging.getLogger(__name__)
+
+# Pending events are already queued (outbox or retry sweep); retrying them
+# would dispatch them twice.
+RETRIABLE_STATUSES = ('failed', 'dead')
+DEFAULT_STATUSES = ['failed', 'dead']
+
+
+def clean_filters(data) -> dict:
+    """
+    Validates bulk retry filters and returns them in their stored (JSON) form.
+    Raises ValueError on unknown keys or invalid values.
+    """
+    data = dict(data or {})
+    unknown = set(data) - {'source', 'topic', 'statuses', 'created_after', 'created_before', 'ids'}
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}.")
+
+    filters = {}
+    for key in ('source', 'topic'):
+        if data.get(key):
+            filters[key] = str(data[key])
+
+    statuses = data.get('statuses') or DEFAULT_STATUSES
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    invalid = set(statuses) - set(RETRIABLE_STATUSES)
+    if invalid:
+        raise ValueError(f"Events in status {', '.join(sorted(invalid))} cannot be retried.")
+    filters['statuses'] = sorted(set(statuses))
+
+    for key in ('created_after', 'created_before'):
+        if data.get(key):
+            value = data[key] if hasattr(data[key], 'isoformat') else parse_datetime(str(data[key]))
+            if value is None:
+                raise ValueError(f"Invalid datetime for {key}: {data[key]}.")
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            filters[key] = value.isoformat()
+
+    if data.get('ids'):
+        try:
+            filters['ids'] = [str(uuid.UUID(str(event_id))) for event_id in data['ids']]
+        except ValueError:
+            raise ValueError("Invalid event id in ids.") from None
+
+    return filters
+
+
+def matching_events(job: RetryJob):
+    """Events matching the job filters, created before the job itself."""
+    filters = job.filters
+    queryset = Event.objects.filter(status__in=filters.get('statuses', DEFAULT_STATUSES), created_at__lte=job.created_at)
+    if job.organization_id:
+        queryset = queryset.filter(organization_id=job.organization_id)
+    if filters.get('source'):
+        queryset = queryset.filter(source=filters['source'])
+    if filters.get('topic'):
+        queryset = queryset.filter(topic=filters['topic'])
+    if filters.get('created_after'):
+        queryset = queryset.filter(created_at__gte=parse_datetime(filters['created_after']))
+    if filters.get('created_before'):
+        queryset = queryset.filter(created_at__lt=parse_datetime(filters['created_before']))
+    if filters.get('ids'):
+        queryset = queryset.filter(id__in=filters['ids'])
+    return queryset
+
+
+def create_job(filters: dict, organization_id=None, created_by: str = None, chunk_size: int = None,
+               run: bool = True) -> RetryJob:
+    """
+    Records a bulk retry job for the given (already cleaned) filters and,
+    with `run`, hands it to a worker once the current transaction commits.
+    """
+    job = RetryJob.objects.create(
+        organization_id=organization_id,
+        filters=filters,
+        chunk_size=chunk_size or settings.EVENT_BULK_RETRY_CHUNK_SIZE,
+        created_by=created_by,
+    )
+    if run:
+        from apps.events.tasks import run_retry_job_task
+        transaction.on_commit(lambda: run_retry_job_task.delay(str(job.id)))
+    return job
+
+
+def _claim_chunk(job: RetryJob) -> list:
+    queryset = matching_events(job)
+    if job.cursor_created_at is not None:
+        queryset = queryset.filter(
+            Q(created_at__gt=job.cursor_created_at)
+            | Q(created_at=job.cursor_created_at, id__gt=job.cursor_id)
+        )
+    return list(
+        queryset.select_for_update(skip_locked=True)
+        .only('id', 'organization_id', 'topic', 'created_at')
+        .order_by('created_at', 'id')[:job.chunk_size]
+    )
+
+
+def run_job(job_id) -> RetryJob:
+    """
+    Runs (or resumes) a bulk retry job, one transaction per chunk. Events
+    locked by a worker while the job runs are being processed already and
+    are skipped. Returns the job with its final progress.
+    """
+    job = RetryJob.objects.get(id=job_id)
+    if job.status == 'completed':
+        return job
+
+    job.status = 'running'
+    job.started_at = job.started_at or timezone.now()
+    job.error = None
+    if job.total is None:
+        job.total = matching_events(job).count()
+    RetryJob.objects.filter(id=job.id).update(
+        status=job.status, started_at=job.started_at, error=None, total=job.total
+    )
+
+    try:
+        while True:
+            with transaction.atomic():
+                events = _claim_chunk(job)
+                if not events:
+                    break
+
+                # Dead events start over with a full set of attempts (and backoff).
+                Event.objects.filter(id__in=[event.id for event in events]).update(
+                    status='pending',
+                    attempts=Case(
+                        When(status='dead', then=0),
+                        default=F('attempts'),
+                        output_field=PositiveIntegerField(),
+                    ),
+                    error=None,
+                    next_attempt_at=None,
+                    updated_at=timezone.now(),
+                )
+                # Published together from one on_commit hook: one broker round trip per chunk.
+                outbox.enqueue_many(events)
+
+                job.cursor_created_at, job.cursor_id = events[-1].created_at, events[-1].id
+                job.dispatched += len(events)
+                job.chunks += 1
+                RetryJob.objects.filter(id=job.id).update(
+                    dispatched=F('dispatched') + len(events),
+                    chunks=F('chunks') + 1,
+                    cursor_created_at=job.cursor_created_at,
+                    cursor_id=job.cursor_id,
+                )
+
+            logger.info(f"Retry job {job.id}: dispatched {job.dispatched}/{job.total} event(s).")
+    except Exception as e:
+        logger.error(f"Retry job {job.id} failed after {job.dispatched} event(s): {e}", exc_info=True)
+        job.status, job.error, job.finished_at = 'failed', str(e), timezone.now()
+        RetryJob.objects.filter(id=job.id).update(status=job.status, error=job.error, finished_at=job.finished_at)
+        raise
+
+    job.status, job.finished_at = 'completed', timezone.now()
+    RetryJob.objects.filter(id=job.id).update(status=job.status, finished_at=job.finished_at)
+    return job
+
+
+def progress(job: RetryJob) -> dict:
+    return {
+        'id': str(job.id),
+        'status': job.status,
+        'organization_id': str(job.organization_id) if job.organization_id else None,
+        'filters': job.filters,
+        'total': job.total,
+        'dispatched': job.dispatched,
+        'chunks': job.chunks,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,122 @@
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor has no free slot to accept more work."""
+
+
+def _run_event(event_id):
+    """
+    Processes an event by id. Runs inside an executor worker thread, which has
+    its own DB connection that must be closed to avoid connection leaks.
+    """
+    from apps.events.services import process_event_by_id
+    try:
+        process_event_by_id(event_id)
+    finally:
+        connection.close()
+
+
+class ThreadPoolBackend:
+    """
+    In-process executor with a fixed number of worker threads and a bounded
+    queue. Submitting blocks for up to `submit_timeout` seconds when all the
+    slots are taken and then raises ExecutorSaturated (backpressure).
+    """
+
+    def __init__(self, pool_size, queue_limit, submit_timeout=0):
+        self.pool_size = pool_size
+        self.queue_limit = queue_limit
+        self.submit_timeout = submit_timeout
+        self._slots = threading.BoundedSemaphore(pool_size + queue_limit)
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='event-executor')
+
+    def submit(self, event_id):
+        if self.submit_timeout:
+            acquired = self._slots.acquire(timeout=self.submit_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            raise ExecutorSaturated(
+                f"Event executor is saturated ({self.pool_size} workers, {self.queue_limit} queued)."
+            )
+        try:
+            future = self._pool.submit(_run_event, event_id)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        self._slots.release()
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"Unhandled error in event executor: {exc}", exc_info=exc)
+
+    def shutdown(self):
+        # Queued events have not been claimed yet, so they stay 'pending' in the
+        # database and are picked up by the process_events worker. Only the
+        # events that are already running are waited for.
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class CeleryBackend:
+    """
+    Sends events to a Celery queue, so the processing happens in the Celery
+    workers instead of the web process.
+    """
+
+    def __init__(self, queue=None):
+        self.queue = queue
+
+    def submit(self, event_id):
+        from apps.events.tasks import process_event_task
+        options = {'queue': self.queue} if self.queue else {}
+        process_event_task.apply_async(args=[event_id], **options)
+
+    def shutdown(self):
+        pass
+
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the executor backend configured in settings.EVENT_EXECUTOR_BACKEND.
+    The backend is created lazily once per process, so forked workers never
+    inherit the thread pool of their parent.
+    """
+    global _backend, _backend_pid
+    pid = os.getpid()
+    if _backend is not None and _backend_pid == pid:
+        return _backend
+
+    with _backend_lock:
+        if _backend is None or _backend_pid != pid:
+            backend_name = settings.EVENT_EXECUTOR_BACKEND
+            if backend_name == 'celery':
+                _backend = CeleryBackend(queue=settings.EVENT_EXECUTOR_CELERY_QUEUE)
+            elif backend_name == 'thread':
+                _backend = ThreadPoolBackend(
+                    pool_size=settings.EVENT_EXECUTOR_POOL_SIZE,
+                    queue_limit=settings.EVENT_EXECUTOR_QUEUE_LIMIT,
+                    submit_timeout=settings.EVENT_EXECUTOR_SUBMIT_TIMEOUT,
+                )
+                atexit.register(_backend.shutdown)
+            else:
+                raise ValueError(f"Unknown EVENT_EXECUTOR_BACKEND: {backend_name}")
+            _backend_pid = pid
+    return _backend
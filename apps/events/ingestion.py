@@ -0,0 +1,183 @@
+"""
+Ingestion of incoming events with content-hash deduplication.
+
+Every event gets a dedup_hash: the SHA-256 of the canonical JSON (sorted keys,
+compact separators) of its source, topic and payload. A delivery whose hash
+was already seen for the same organization is rejected:
+
+- fast path: an atomic add of the hash in the shared cache (Redis), kept for
+  EVENT_DEDUP_FAST_TTL seconds, rejects retried deliveries before any query;
+- backstop: an indexed lookup of the hash among the organization's events of
+  the last dedup window (TopicPolicy.dedup_window or EVENT_DEDUP_WINDOW).
+
+Events that carry an idempotency key (e.g. X-Shopify-Webhook-Id) get the same
+fast path on the key, kept for EVENT_IDEMPOTENCY_FAST_TTL seconds, ahead of
+the unique constraint on (organization, idempotency_key).
+
+Fast path keys are claimed for EVENT_DEDUP_INFLIGHT_TTL seconds only and get
+their full TTL once the event is committed, so a delivery whose transaction
+rolls back does not block its redeliveries for long.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from apps.events.models import Event
+from apps.events.registry import registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'event-dedup'
+IDEMPOTENCY_KEY_PREFIX = 'event-idempotency'
+
+
+class DuplicateEvent(Exception):
+    """Raised when an incoming event duplicates one already ingested."""
+
+    def __init__(self, dedup_hash, event_id=None):
+        self.dedup_hash = dedup_hash
+        self.event_id = event_id
+        super().__init__(f"Duplicate event {dedup_hash}")
+
+
+def canonical_hash(source: str, topic: str, payload) -> str:
+    canonical = json.dumps(
+        {'source': source, 'topic': topic, 'payload': payload},
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def dedup_window(topic: str) -> int:
+    """Seconds during which an identical event is a duplicate (0 disables dedup)."""
+    policy = registry.get(topic)
+    if policy is not None and policy.dedup_window is not None:
+        return policy.dedup_window
+    return settings.EVENT_DEDUP_WINDOW
+
+
+def _fast_path_keys(organization_id, dedup_hash, window, idempotency_key) -> list[str]:
+    keys = []
+    if idempotency_key:
+        keys.append(f"{IDEMPOTENCY_KEY_PREFIX}:{organization_id}:{idempotency_key}")
+    if window:
+        keys.append(f"{KEY_PREFIX}:{organization_id}:{dedup_hash}")
+    return keys
+
+
+def _ttl(key) -> int:
+    if key.startswith(IDEMPOTENCY_KEY_PREFIX):
+        return settings.EVENT_IDEMPOTENCY_FAST_TTL
+    return settings.EVENT_DEDUP_FAST_TTL
+
+
+def _claim_fast_path(keys) -> bool:
+    """
+    Atomically marks the keys as seen (SET NX) while the event is in flight.
+    Returns False, releasing what it claimed, if any of them already was.
+    """
+    claimed = []
+    for key in keys:
+        try:
+            added = cache.add(key, 1, settings.EVENT_DEDUP_INFLIGHT_TTL)
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable for deduplication, using the database only: {e}")
+            return True
+        if not added:
+            _release_fast_path(claimed)
+            return False
+        claimed.append(key)
+    return True
+
+
+def _confirm_fast_path(keys):
+    """Extends the claimed keys to their full TTL once the event is committed."""
+    for key in keys:
+        try:
+            cache.touch(key, _ttl(key))
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable confirming {key}: {e}")
+
+
+def _release_fast_path(keys):
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Shared cache unavailable releasing {keys}: {e}")
+
+
+def _recent_duplicate(organization_id, dedup_hash, window):
+    return Event.objects.filter(
+        organization_id=organization_id,
+        dedup_hash=dedup_hash,
+        created_at__gte=timezone.now() - timedelta(seconds=window),
+    ).values_list('id', flat=True)
+
+
+def ingest_event(organization_id, source: str, topic: str, payload, **fields) -> Event:
+    """
+    Creates a pending event unless it duplicates a recent one of the same
+    organization, in which case DuplicateEvent is raised before any insert.
+    Extra `fields` (e.g. idempotency_key) are passed to Event.objects.create;
+    an idempotency key is checked in the fast path too, and the unique
+    constraint stays the final guard.
+    """
+    dedup_hash = canonical_hash(source, topic, payload)
+    window = dedup_window(topic)
+    keys = _fast_path_keys(organization_id, dedup_hash, window, fields.get('idempotency_key'))
+
+    if not _claim_fast_path(keys):
+        raise DuplicateEvent(dedup_hash)
+
+    try:
+        if window:
+            existing_id = _recent_duplicate(organization_id, dedup_hash, window).first()
+            if existing_id:
+                raise DuplicateEvent(dedup_hash, existing_id)
+
+        # Savepoint: a violated unique constraint must not break the request's transaction.
+        with transaction.atomic():
+            event = Event.objects.create(
+                organization_id=organization_id,
+                source=source,
+                topic=topic,
+                payload=payload,
+                dedup_hash=dedup_hash,
+                **fields,
+            )
+        transaction.on_commit(lambda: _confirm_fast_path(keys))
+        return event
+    except DuplicateEvent:
+        raise
+    except IntegrityError:
+        if fields.get('idempotency_key'):
+            # Caught by the unique constraint: the fast path missed it (e.g. expired).
+            raise DuplicateEvent(dedup_hash) from None
+        _release_fast_path(keys)
+        raise
+    except Exception:
+        # Let a redelivery through: this one was never stored.
+        _release_fast_path(keys)
+        raise
+
+
+def _ingest_atomically(organization_id, source: str, topic: str, payload, **fields) -> Event:
+    with transaction.atomic():
+        return ingest_event(organization_id, source, topic, payload, **fields)
+
+
+async def aingest_event(organization_id, source: str, topic: str, payload, **fields) -> Event:
+    """
+    Async version of ingest_event, for the ASGI webhook views. Async views run
+    in autocommit mode, so the ingestion runs on a worker thread inside its own
+    transaction: the event, its outbox row and its externalized body are
+    committed together or not at all.
+    """
+    return await sync_to_async(_ingest_atomically)(organization_id, source, topic, payload, **fields)
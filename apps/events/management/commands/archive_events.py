@@ -0,0 +1,54 @@
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.events import archive
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command that enforces the event retention policy.
+
+    Moves old terminal events from the events table to the compressed archive
+    and drops the archive partitions past the retention period. Meant to run
+    daily from cron.
+
+    Example usage:
+        python manage.py archive_events
+        python manage.py archive_events --older-than-days 7 --retention-days 180
+    """
+    help = 'Archives old terminal events and drops expired archive partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.EVENT_ARCHIVE_AFTER_DAYS,
+            help='Archive terminal events created more than this many days ago.',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.EVENT_ARCHIVE_RETENTION_DAYS,
+            help='Drop archived events older than this many days (0 keeps them forever).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EVENT_ARCHIVE_BATCH_SIZE,
+            help='Number of events moved per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            archived = archive.archive_events(
+                older_than_days=options['older_than_days'],
+                batch_size=options['batch_size'],
+            )
+            dropped = archive.drop_expired_archives(retention_days=options['retention_days'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {archived} event(s). Dropped {dropped} expired archive partition(s)/row(s).'
+            ))
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while archiving events: {e}", exc_info=True)
+            self.stderr.write(self.style.ERROR('An error occurred while archiving events. Check logs for details.'))
@@ -0,0 +1,66 @@
+import logging
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from apps.events import export
+from apps.organizations.models import Organization
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command that exports events or Alegra invoices, with
+    their JSON payloads, for month-end reconciliation.
+
+    Rows are streamed from a server-side cursor straight to the output, so
+    exporting millions of rows runs in constant memory.
+
+    Example usage:
+        python manage.py export_events --organization acme --since 2025-11-01 --until 2025-11-30 -o events.ndjson
+        python manage.py export_events --dataset alegra_invoices --format csv --gzip -o invoices.csv.gz
+    """
+    help = 'Streams events or Alegra invoices as NDJSON or CSV, optionally gzipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=sorted(export.DATASETS), default='events')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--organization', help='Slug of the organization to export (default: all).')
+        parser.add_argument('--topic', help='Only events (or invoices of events) of this topic.')
+        parser.add_argument('--status', action='append', default=[], help='Only rows in this status (repeatable).')
+        parser.add_argument('--since', help='Only rows created from this date or datetime.')
+        parser.add_argument('--until', help='Only rows created up to this date (inclusive) or datetime.')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output.')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows fetched per cursor round trip.')
+        parser.add_argument('-o', '--output', default='-', help='Output file (default: standard output).')
+
+    def handle(self, *args, **options):
+        organization_id = None
+        if options['organization']:
+            organization_id = Organization.objects.filter(slug=options['organization']).values_list('id', flat=True).first()
+            if organization_id is None:
+                raise CommandError(f"Organization '{options['organization']}' not found.")
+
+        try:
+            blocks = export.stream(
+                options['dataset'],
+                options['format'],
+                compress=options['gzip'],
+                chunk_size=options['chunk_size'],
+                organization_id=organization_id,
+                topic=options['topic'],
+                statuses=options['status'],
+                created_after=export.parse_bound(options['since']),
+                created_before=export.parse_bound(options['until'], end=True),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for block in blocks:
+                output.write(block)
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while exporting {options['dataset']}: {e}", exc_info=True)
+            self.stderr.write(self.style.ERROR('An error occurred during the export. Check logs for details.'))
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
@@ -1,5 +1,5 @@
-
 import logging
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from apps.events import services as event_services
 
@@ -9,21 +9,39 @@ class Command(BaseCommand):
     """
     A Django management command to process pending events.
     
-    This command finds all events with a 'pending' status and attempts to process them
-    using the logic defined in the events.services module.
+    This command claims pending events in batches (FOR UPDATE SKIP LOCKED) and
+    processes them using the logic defined in the events.services module.
+    Several instances can run at the same time, on one or many nodes.
     
     Example usage:
         python manage.py process_events
+        python manage.py process_events --batch-size 200 --workers 4
     """
     help = 'Processes all pending events from the event queue.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EVENT_WORKER_BATCH_SIZE,
+            help='Number of events claimed per database round trip.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EVENT_WORKER_CONCURRENCY,
+            help='Number of concurrent worker threads draining the queue.',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting event processing...'))
         
         try:
-            event_services.process_pending_events()
-            self.stdout.write(self.style.SUCCESS('Finished event processing successfully.'))
+            processed = event_services.process_pending_events(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Finished event processing successfully. Processed {processed} event(s).'))
         except Exception as e:
             logger.error(f"An unexpected error occurred during event processing: {e}", exc_info=True)
             self.stderr.write(self.style.ERROR('An error occurred during event processing. Check logs for details.'))
-
@@ -0,0 +1,41 @@
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.events import outbox
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command to republish outbox messages that were never sent.
+
+    Messages are normally published right after their transaction commits. This
+    command recovers the ones lost to a crash or a broker outage.
+
+    Example usage:
+        python manage.py sweep_outbox
+        python manage.py sweep_outbox --older-than 120
+    """
+    help = 'Republishes outbox messages that were never published.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_SWEEP_BATCH_SIZE,
+            help='Number of messages published per round trip.',
+        )
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=settings.OUTBOX_SWEEP_AFTER,
+            help='Only republish messages created more than this many seconds ago.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            published = outbox.sweep(batch_size=options['batch_size'], older_than=options['older_than'])
+            self.stdout.write(self.style.SUCCESS(f'Republished {published} outbox message(s).'))
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while sweeping the outbox: {e}", exc_info=True)
+            self.stderr.write(self.style.ERROR('An error occurred while sweeping the outbox. Check logs for details.'))
@@ -0,0 +1,39 @@
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.events import retries
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command to re-dispatch failed events due for a retry.
+
+    Failed events are scheduled with exponential backoff (next_attempt_at) and
+    moved to 'dead' once they exhaust the max attempts of their topic. Pending
+    events rescheduled because of an open circuit are re-dispatched as well
+    once due. Events left in 'processing' by a dead worker
+    (EVENT_STALE_CLAIM_TIMEOUT) are released first. This command is meant to run periodically, e.g. every
+    minute from cron.
+
+    Example usage:
+        python manage.py sweep_retries
+        python manage.py sweep_retries --batch-size 1000
+    """
+    help = 'Re-dispatches failed events whose retry is due.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EVENT_RETRY_SWEEP_BATCH_SIZE,
+            help='Number of events claimed and dispatched per round trip.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            dispatched = retries.sweep(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Re-dispatched {dispatched} event(s) due for retry.'))
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while sweeping retries: {e}", exc_info=True)
+            self.stderr.write(self.style.ERROR('An error occurred while sweeping retries. Check logs for details.'))
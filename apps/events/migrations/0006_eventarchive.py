@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+import django.db.models.deletion
+import django_multitenant.mixins
+from django.db import migrations, models
+
+
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE events_eventarchive (
+    id uuid NOT NULL,
+    organization_id uuid NOT NULL,
+    source varchar(50) NOT NULL,
+    topic varchar(255) NOT NULL,
+    status varchar(20) NOT NULL,
+    idempotency_key varchar(255) NULL,
+    attempts integer NOT NULL CHECK (attempts >= 0),
+    error text NULL,
+    payload bytea NOT NULL,
+    response bytea NULL,
+    created_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE INDEX events_archive_org_created_idx ON events_eventarchive (organization_id, created_at);
+"""
+
+
+def create_archive_table(apps, schema_editor):
+    """
+    Creates the archive table. On PostgreSQL it is range-partitioned by
+    created_at, and the partition key must be part of the primary key, so
+    the key is (id, created_at) there. The migration state keeps id as the
+    sole primary key, which is what the ORM and the admin work with; ids stay
+    unique since they come from the events table.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PARTITIONED_TABLE_SQL)
+    else:
+        schema_editor.create_model(apps.get_model('events', 'EventArchive'))
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('events', 'EventArchive'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_events_retry_due_idx'),
+        ('organizations', '0001_initial'),
+    ]
+
+    operations = [
+        # The table is created by create_archive_table, whose primary key
+        # differs from the state's on PostgreSQL.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='EventArchive',
+                    fields=[
+                        ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                        ('source', models.CharField(max_length=50)),
+                        ('topic', models.CharField(max_length=255)),
+                        ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('dead', 'Dead-letter')], max_length=20)),
+                        ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                        ('attempts', models.PositiveIntegerField(default=0)),
+                        ('error', models.TextField(blank=True, null=True)),
+                        ('payload', models.BinaryField()),
+                        ('response', models.BinaryField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField()),
+                        ('updated_at', models.DateTimeField()),
+                        ('archived_at', models.DateTimeField(auto_now_add=True)),
+                        ('organization', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='organizations.organization')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['organization', 'created_at'], name='events_archive_org_created_idx')],
+                    },
+                    bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+    ]
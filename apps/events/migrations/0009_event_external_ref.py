@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+# Payload key holding the business document reference, per topic.
+EXTERNAL_REF_KEYS = {
+    'pos.invoice.received': 'name',
+    'orders/create': 'name',
+}
+
+
+def backfill_external_refs(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+
+    for topic, key in EXTERNAL_REF_KEYS.items():
+        batch = []
+        for event in Event.objects.filter(topic=topic, external_ref__isnull=True).only('id', 'payload').iterator(chunk_size=1000):
+            value = event.payload.get(key) if isinstance(event.payload, dict) else None
+            if value in (None, ''):
+                continue
+            event.external_ref = str(value)[:255]
+            batch.append(event)
+            if len(batch) >= 1000:
+                Event.objects.bulk_update(batch, ['external_ref'])
+                batch = []
+        Event.objects.bulk_update(batch, ['external_ref'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_events_org_dedup_idx'),
+        ('organizations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='external_ref',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['organization', 'external_ref'], name='events_org_external_ref_idx'),
+        ),
+        migrations.RunPython(backfill_external_refs, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 import uuid, hashlib, json
 from django.db import models
 from django_multitenant.mixins import TenantModelMixin
+from django_multitenant.fields import TenantForeignKey
 
 class Event(TenantModelMixin, models.Model):
     STATUS = (
@@ -23,6 +24,10 @@ class Event(TenantModelMixin, models.Model):
     response = models.JSONField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS, default='pending', db_index=True)
     trace_id = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Business document the event is about (POS invoice name, Shopify order name...).
+    external_ref = models.CharField(max_length=255, null=True, blank=True)
+    # Pending events are not claimed, and failed events not retried, before this time.
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -33,8 +38,139 @@ class Event(TenantModelMixin, models.Model):
         indexes = [
             models.Index(fields=['organization', 'topic', 'status']),
             models.Index(fields=['created_at']),
+            # Backs the keyset-paginated event listing of a tenant.
+            models.Index(fields=['organization', 'created_at', 'id'], name='events_org_created_id_idx'),
+            # Backs the SKIP LOCKED claim query of the event workers.
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'),
+                         name='events_pending_created_idx'),
+            # Backs lookups by business document (resend, admin search, reconciliation).
+            models.Index(fields=['organization', 'external_ref'], name='events_org_external_ref_idx'),
+            # Backs the per-tenant deduplication window at ingestion.
+            models.Index(fields=['organization', 'dedup_hash', 'created_at'], name='events_org_dedup_idx'),
+            # Backs the sweep of failed events due for a retry.
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='failed'),
+                         name='events_retry_due_idx'),
         ]
         constraints = [
             models.UniqueConstraint(fields=['organization', 'idempotency_key'],
                                     name='uniq_org_idempotency_key')
         ]
+
+    def get_payload(self):
+        """Full payload, loaded lazily when the row only keeps its projection."""
+        from apps.events import payloads
+        return payloads.load(self, 'payload')
+
+    def get_response(self):
+        """Full response, loaded lazily when the row only keeps its projection."""
+        from apps.events import payloads
+        return payloads.load(self, 'response')
+
+
+class EventBody(TenantModelMixin, models.Model):
+    """
+    Compressed payload or response of an event, kept off the events row by the
+    database payload store (see apps.events.payloads). There is no foreign key,
+    so the body can be written before the event row within the same transaction.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey('organizations.Organization', on_delete=models.CASCADE)
+    event_id = models.UUIDField()
+    field = models.CharField(max_length=20)
+    body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_id = 'organization_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event_id', 'field'], name='uniq_event_body_field')
+        ]
+
+
+class OutboxMessage(TenantModelMixin, models.Model):
+    """
+    Intent to dispatch an event, recorded in the same transaction that
+    creates (or resets) the event and published once it commits.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey('organizations.Organization', on_delete=models.CASCADE)
+    event = TenantForeignKey(Event, on_delete=models.CASCADE, related_name='outbox_messages')
+    topic = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_id = 'organization_id'
+
+    class Meta:
+        indexes = [
+            # Backs the sweeper query over messages that were never published.
+            models.Index(fields=['created_at'], condition=models.Q(published_at__isnull=True),
+                         name='events_outbox_unpublished_idx'),
+        ]
+
+
+class EventArchive(TenantModelMixin, models.Model):
+    """
+    Terminal event moved out of the hot events table by the retention job.
+    Payload and response are kept zlib-compressed. On PostgreSQL the table is
+    range-partitioned by month on created_at (see apps.events.archive), so
+    expired months are dropped as whole partitions.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    organization = models.ForeignKey('organizations.Organization', on_delete=models.DO_NOTHING, db_constraint=False)
+    source = models.CharField(max_length=50)
+    topic = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=Event.STATUS)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    payload = models.BinaryField()
+    response = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_id = 'organization_id'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'created_at'], name='events_archive_org_created_idx'),
+        ]
+
+
+class RetryJob(models.Model):
+    """
+    Bulk retry of the events matching `filters` (see apps.events.bulk_retry),
+    run in chunks by a worker. Progress is recorded on the row as it goes.
+    """
+    STATUS = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Empty for jobs spanning every organization (e.g. after an ERPNext outage).
+    organization = models.ForeignKey('organizations.Organization', on_delete=models.CASCADE,
+                                     null=True, blank=True, related_name='retry_jobs')
+    filters = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS, default='pending', db_index=True)
+    chunk_size = models.PositiveIntegerField()
+    total = models.PositiveIntegerField(null=True, blank=True)
+    dispatched = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    # Keyset position (created_at, id) of the last claimed event, to resume a job.
+    cursor_created_at = models.DateTimeField(null=True, blank=True)
+    cursor_id = models.UUIDField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_by = models.CharField(max_length=150, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"RetryJob {self.id} - {self.status} ({self.dispatched}/{self.total if self.total is not None else '?'})"
@@ -0,0 +1,134 @@
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from core.celery import app
+from apps.events.models import OutboxMessage
+from apps.events.registry import registry
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _pending_ids() -> list:
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    return _local.pending
+
+
+def enqueue(event) -> OutboxMessage:
+    """
+    Records the intent to dispatch an event in the current transaction.
+    The message is published after the transaction commits.
+    """
+    return enqueue_many([event])[0]
+
+
+def enqueue_many(events) -> list[OutboxMessage]:
+    """
+    Records the intent to dispatch several events with a single insert.
+    All the messages recorded in a transaction are published together from
+    one on_commit hook.
+    """
+    messages = OutboxMessage.objects.bulk_create([
+        OutboxMessage(organization_id=event.organization_id, event_id=event.id, topic=event.topic)
+        for event in events
+    ])
+    _pending_ids().extend(message.id for message in messages)
+    transaction.on_commit(flush)
+    return messages
+
+
+def flush():
+    """
+    Publishes the messages recorded by this thread. Runs from on_commit.
+    Ids left over by rolled back transactions are dropped by the
+    published_at filter, since their rows were never committed.
+    """
+    ids = _pending_ids()
+    if not ids:
+        return
+    _local.pending = []
+
+    messages = list(OutboxMessage.objects.filter(id__in=ids, published_at__isnull=True))
+    publish(messages)
+
+
+def _producer_for(messages):
+    """
+    Acquires a single Celery producer when any of the messages goes to the
+    broker; topics executed in-process do not need a broker connection.
+    """
+    for message in messages:
+        policy = registry.get(message.topic)
+        if policy is not None and hasattr(policy.get_task(), 'apply_async'):
+            return app.producer_or_acquire()
+    return nullcontext()
+
+
+def publish(messages) -> int:
+    """
+    Dispatches the given messages through the topic registry, reusing a single
+    broker connection, and marks them as published. Failed messages keep
+    published_at empty and are retried by the sweeper.
+    Returns the number of published messages.
+    """
+    if not messages:
+        return 0
+
+    published, failed = [], []
+    try:
+        with _producer_for(messages) as producer:
+            for message in messages:
+                try:
+                    registry.dispatch(message.event_id, message.topic, producer=producer)
+                    published.append(message.id)
+                except Exception as e:
+                    logger.error(f"Failed to publish outbox message {message.id}: {e}", exc_info=True)
+                    failed.append((message.id, str(e)))
+    except Exception as e:
+        # The broker connection itself could not be acquired.
+        logger.error(f"Failed to publish {len(messages)} outbox message(s): {e}", exc_info=True)
+        done = set(published)
+        failed.extend((message.id, str(e)) for message in messages if message.id not in done)
+
+    if published:
+        OutboxMessage.objects.filter(id__in=published).update(published_at=timezone.now())
+    for message_id, error in failed:
+        OutboxMessage.objects.filter(id=message_id).update(attempts=F('attempts') + 1, error=error)
+
+    return len(published)
+
+
+def sweep(batch_size: int = None, older_than: int = None) -> int:
+    """
+    Republishes messages that were never published, e.g. because the process
+    died between the commit and the publish or the broker was unavailable.
+    Only messages older than `older_than` seconds are considered, so the
+    on_commit publisher is not raced. Returns the number of published messages.
+    """
+    batch_size = batch_size or settings.OUTBOX_SWEEP_BATCH_SIZE
+    older_than = settings.OUTBOX_SWEEP_AFTER if older_than is None else older_than
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            cutoff = timezone.now() - timedelta(seconds=older_than)
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(published_at__isnull=True, created_at__lte=cutoff)
+                .order_by('created_at')[:batch_size]
+            )
+            if not messages:
+                return total
+            published = publish(messages)
+
+        total += published
+        if published < len(messages):
+            # The broker is failing; let the next sweep retry.
+            return total
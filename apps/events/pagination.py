@@ -0,0 +1,68 @@
+"""
+Keyset pagination of events on (created_at, id), newest first.
+
+The cursor is the position of the last event of a page, so every page is an
+index range scan of a fixed size whatever its depth, and no COUNT is run.
+"""
+import base64
+import uuid
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class EventKeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, settings.EVENT_LIST_PAGE_SIZE))
+        except ValueError:
+            page_size = settings.EVENT_LIST_PAGE_SIZE
+        return max(1, min(page_size, settings.EVENT_LIST_MAX_PAGE_SIZE))
+
+    @staticmethod
+    def encode_cursor(event) -> str:
+        position = f"{event.created_at.isoformat()}|{event.id}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            created_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(cursor)
+            return created_at, uuid.UUID(event_id)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, event_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=event_id))
+
+        # One extra row tells whether there is a next page.
+        events = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        self.has_next = len(events) > page_size
+        events = events[:page_size]
+        self.next_cursor = self.encode_cursor(events[-1]) if self.has_next else None
+        return events
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,191 @@
+"""
+Optional external storage for large event payloads and responses.
+
+When EVENT_PAYLOAD_STORE is set, bodies bigger than EVENT_PAYLOAD_MIN_BYTES
+are compressed and written to the store ("db": EventBody side table,
+"filesystem": files under EVENT_PAYLOAD_STORE_ROOT, written on commit) as
+the event is saved. The event row keeps a small projection of the hot fields (topic
+policy `projection`, or EVENT_PAYLOAD_PROJECTION) plus a marker naming the
+store, and the full body is loaded lazily through Event.get_payload() and
+Event.get_response().
+"""
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from apps.events.models import EventBody
+from apps.events.registry import registry
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_KEY = '_external'
+FIELDS = ('payload', 'response')
+
+
+def compress_json(value) -> bytes:
+    if value is None:
+        return None
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode())
+
+
+def decompress_json(data):
+    if data is None:
+        return None
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+class DatabasePayloadStore:
+    """Keeps the compressed bodies in the EventBody side table."""
+    name = 'db'
+
+    def put(self, event, field, body: bytes):
+        EventBody.objects.update_or_create(
+            event_id=event.id,
+            field=field,
+            defaults={'organization_id': event.organization_id, 'body': body},
+        )
+
+    def get(self, event, field) -> bytes:
+        return EventBody.objects.filter(event_id=event.id, field=field).values_list('body', flat=True).first()
+
+    def get_many(self, events, field) -> dict:
+        rows = EventBody.objects.filter(event_id__in=[event.id for event in events], field=field)
+        return dict(rows.values_list('event_id', 'body'))
+
+    def delete(self, events):
+        EventBody.objects.filter(event_id__in=[event.id for event in events]).delete()
+
+
+class FileSystemPayloadStore:
+    """
+    Keeps the compressed bodies as files, one directory per organization.
+    Files are written once the saving transaction commits, so a rolled back
+    event leaves no orphan file behind; until then the body is only held by
+    the instance.
+    """
+    name = 'filesystem'
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, event, field) -> Path:
+        event_id = str(event.id)
+        return self.root / str(event.organization_id) / event_id[:2] / f"{event_id}.{field}.json.z"
+
+    def put(self, event, field, body: bytes):
+        path = self._path(event, field)
+        transaction.on_commit(lambda: self._write(path, body))
+
+    def _write(self, path: Path, body: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(body)
+        os.replace(tmp_path, path)
+
+    def get(self, event, field) -> bytes:
+        try:
+            return self._path(event, field).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def get_many(self, events, field) -> dict:
+        return {event.id: self.get(event, field) for event in events}
+
+    def delete(self, events):
+        for event in events:
+            for field in FIELDS:
+                self._path(event, field).unlink(missing_ok=True)
+
+
+def get_store(name: str = None):
+    """Returns the payload store named `name` (default: the configured one), or None."""
+    name = settings.EVENT_PAYLOAD_STORE if name is None else name
+    if not name:
+        return None
+    if name == DatabasePayloadStore.name:
+        return DatabasePayloadStore()
+    if name == FileSystemPayloadStore.name:
+        return FileSystemPayloadStore(settings.EVENT_PAYLOAD_STORE_ROOT)
+    raise ValueError(f"Unknown event payload store: {name}")
+
+
+def is_external(value) -> bool:
+    return isinstance(value, dict) and bool(value.get(EXTERNAL_KEY))
+
+
+def projection(topic: str, value) -> dict:
+    """The hot fields of a body that stay on the event row."""
+    policy = registry.get(topic)
+    fields = (policy.projection if policy is not None and policy.projection else None) or settings.EVENT_PAYLOAD_PROJECTION
+    projected = {}
+    if isinstance(value, dict):
+        projected = {
+            key: value[key] for key in fields
+            if isinstance(value.get(key), (str, int, float, bool))
+        }
+    projected[EXTERNAL_KEY] = settings.EVENT_PAYLOAD_STORE
+    return projected
+
+
+def externalize(event, field: str) -> bool:
+    """
+    Moves the body in `event.<field>` to the payload store if it is big
+    enough, leaving its projection on the instance. Returns whether it did.
+    """
+    value = getattr(event, field)
+    store = get_store()
+    if store is None or value is None or is_external(value):
+        return False
+
+    body = compress_json(value)
+    if len(body) < settings.EVENT_PAYLOAD_MIN_BYTES:
+        return False
+
+    store.put(event, field, body)
+    setattr(event, field, projection(event.topic, value))
+    event.__dict__.setdefault('_bodies', {})[field] = value
+    return True
+
+
+def load(event, field: str):
+    """Returns the full body of `event.<field>`, reading the store if needed."""
+    value = getattr(event, field)
+    if not is_external(value):
+        return value
+
+    bodies = event.__dict__.setdefault('_bodies', {})
+    if field not in bodies:
+        body = get_store(value[EXTERNAL_KEY]).get(event, field)
+        if body is None:
+            raise LookupError(f"The {field} of event {event.id} is missing from the payload store.")
+        bodies[field] = decompress_json(body)
+    return bodies[field]
+
+
+def load_many(events, field: str = 'payload'):
+    """Loads the external bodies of several events with one read per store."""
+    by_store = {}
+    for event in events:
+        value = getattr(event, field)
+        if is_external(value) and field not in event.__dict__.get('_bodies', {}):
+            by_store.setdefault(value[EXTERNAL_KEY], []).append(event)
+
+    for name, store_events in by_store.items():
+        bodies = get_store(name).get_many(store_events, field)
+        for event in store_events:
+            if bodies.get(event.id) is not None:
+                event.__dict__.setdefault('_bodies', {})[field] = decompress_json(bodies[event.id])
+
+
+def delete(events):
+    """Removes the external bodies of the given events from every store."""
+    names = {
+        getattr(event, field)[EXTERNAL_KEY]
+        for event in events for field in FIELDS
+        if is_external(getattr(event, field))
+    }
+    for name in names:
+        get_store(name).delete(events)
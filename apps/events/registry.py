@@ -0,0 +1,175 @@
+import fnmatch
+import logging
+import threading
+from contextlib import nullcontext
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class TopicPolicy:
+    """
+    Handler and execution policy for the events of a topic (or topic pattern).
+
+    - handler: callable (or dotted path) that processes an already claimed event
+      synchronously and raises on failure. Used by the cron/worker and retry paths.
+    - task: callable (or dotted path) that schedules the asynchronous processing of
+      an event by id. Celery tasks are sent with the policy's queue and timeout.
+    - queue: broker queue for the task. None means the Celery default queue.
+    - concurrency: max number of events (or batches) of this topic processed at
+      the same time by one worker process. It is not a cluster-wide cap: the
+      effective limit is `concurrency` times the number of worker processes.
+      Upstream quotas shared by every process belong in the Redis rate limiter
+      (settings.INTEGRATION_RATE_LIMITS). None means unbounded.
+    - timeout: hard time limit, in seconds, for the asynchronous task.
+    - max_attempts: attempts before a failing event is moved to 'dead'.
+      None means settings.EVENT_MAX_ATTEMPTS.
+    - projection: payload keys kept on the event row when the body goes to the
+      payload store. None means settings.EVENT_PAYLOAD_PROJECTION.
+    - dedup_window: seconds during which an identical incoming event is dropped
+      as a duplicate. None means settings.EVENT_DEDUP_WINDOW, 0 disables it.
+    - external_ref: payload key (or callable, or dotted path, taking the payload)
+      that gives the business document reference stored in Event.external_ref.
+    - batch_handler: optional callable (or dotted path) that processes a list of
+      claimed events of the topic at once. It returns a dict mapping each event
+      id to the exception it failed with, or None on success. The event worker
+      uses it when it claims several events of the topic in the same batch.
+    """
+
+    def __init__(self, pattern, handler, task=None, queue=None, concurrency=None,
+                 timeout=None, max_attempts=None, projection=None, dedup_window=None,
+                 external_ref=None, batch_handler=None):
+        self.pattern = pattern
+        self.handler = handler
+        self.task = task
+        self.queue = queue
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.projection = projection
+        self.dedup_window = dedup_window
+        self.external_ref = external_ref
+        self.batch_handler = batch_handler
+        self._semaphore = threading.BoundedSemaphore(concurrency) if concurrency else None
+
+    def __repr__(self):
+        return f"<TopicPolicy {self.pattern!r} queue={self.queue!r} concurrency={self.concurrency}>"
+
+    def get_handler(self):
+        if isinstance(self.handler, str):
+            self.handler = import_string(self.handler)
+        return self.handler
+
+    @property
+    def batchable(self):
+        return self.batch_handler is not None
+
+    def get_batch_handler(self):
+        if isinstance(self.batch_handler, str):
+            self.batch_handler = import_string(self.batch_handler)
+        return self.batch_handler
+
+    def get_external_ref(self, payload):
+        """Extracts the business document reference of a payload, or None."""
+        if not self.external_ref or not isinstance(payload, dict):
+            return None
+        if isinstance(self.external_ref, str) and '.' in self.external_ref:
+            self.external_ref = import_string(self.external_ref)
+        if callable(self.external_ref):
+            value = self.external_ref(payload)
+        else:
+            value = payload.get(self.external_ref)
+        return str(value)[:255] if value not in (None, '') else None
+
+    def get_task(self):
+        if isinstance(self.task, str):
+            self.task = import_string(self.task)
+        return self.task
+
+    def process_slot(self):
+        """Context manager that enforces the topic's per-process concurrency cap."""
+        return self._semaphore if self._semaphore else nullcontext()
+
+
+class TopicRegistry:
+    """
+    Maps event topics to their handler and execution policy.
+
+    Exact topics are resolved with a dict lookup. Wildcard patterns
+    (fnmatch syntax, e.g. 'orders/*') are matched once per topic and the
+    result is memoized, so dispatching stays O(1).
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._patterns = []
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def register(self, pattern, handler, **policy):
+        """
+        Registers the handler and policy of a topic pattern.
+        Values in settings.EVENT_TOPIC_POLICIES override the given policy,
+        so throughput can be tuned per deployment.
+        """
+        policy.update(getattr(settings, 'EVENT_TOPIC_POLICIES', {}).get(pattern, {}))
+        topic_policy = TopicPolicy(pattern, handler, **policy)
+
+        with self._lock:
+            if any(char in pattern for char in '*?['):
+                self._patterns = [p for p in self._patterns if p.pattern != pattern]
+                self._patterns.append(topic_policy)
+            else:
+                self._exact[pattern] = topic_policy
+            self._resolved = {}
+
+        logger.debug(f"Registered topic policy {topic_policy!r}")
+        return topic_policy
+
+    def get(self, topic):
+        """Returns the TopicPolicy for a topic, or None if it has no handler."""
+        policy = self._exact.get(topic)
+        if policy is not None:
+            return policy
+
+        try:
+            return self._resolved[topic]
+        except KeyError:
+            pass
+
+        policy = next((p for p in self._patterns if fnmatch.fnmatchcase(topic, p.pattern)), None)
+        self._resolved[topic] = policy
+        return policy
+
+    def topics(self):
+        return list(self._exact) + [p.pattern for p in self._patterns]
+
+    def dispatch(self, event_id, topic, producer=None):
+        """
+        Schedules the asynchronous processing of an event according to its
+        topic policy. Returns False if the topic has no task registered.
+        `producer` lets callers publish many Celery tasks over one connection.
+        """
+        policy = self.get(topic)
+        if policy is None or policy.task is None:
+            logger.warning(f"No task registered for topic '{topic}'. Event {event_id} was not dispatched.")
+            return False
+
+        task = policy.get_task()
+        if hasattr(task, 'apply_async'):
+            options = {}
+            if policy.queue:
+                options['queue'] = policy.queue
+            if policy.timeout:
+                options['time_limit'] = policy.timeout
+            if producer is not None:
+                options['producer'] = producer
+            task.apply_async(args=[event_id], **options)
+        else:
+            task(event_id)
+        return True
+
+
+registry = TopicRegistry()
+register = registry.register
@@ -0,0 +1,122 @@
+import logging
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.events.models import Event
+from apps.events.registry import registry
+from apps.events import outbox
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempts: int, base: float = None, cap: float = None) -> float:
+    """
+    Seconds to wait before retrying after `attempts` failed attempts:
+    exponential backoff with full jitter, so events (or tasks) that failed
+    together don't come back together.
+    """
+    base = settings.EVENT_RETRY_BASE_DELAY if base is None else base
+    cap = settings.EVENT_RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def max_attempts_for(topic: str) -> int:
+    policy = registry.get(topic)
+    if policy is not None and policy.max_attempts:
+        return policy.max_attempts
+    return settings.EVENT_MAX_ATTEMPTS
+
+
+def fail_event(event: Event, error: str) -> str:
+    """
+    Records a failed attempt of an event. The event is scheduled for a retry
+    with backoff, or moved to 'dead' once it has used up the max attempts of
+    its topic. Returns the new status.
+    """
+    event.error = error
+    if event.attempts >= max_attempts_for(event.topic):
+        event.status = 'dead'
+        event.next_attempt_at = None
+        logger.error(f"Event {event.id} moved to dead-letter after {event.attempts} attempt(s).")
+    else:
+        event.status = 'failed'
+        event.next_attempt_at = timezone.now() + timedelta(seconds=backoff_delay(event.attempts))
+        logger.info(f"Event {event.id} will be retried at {event.next_attempt_at.isoformat()}.")
+
+    Event.objects.filter(id=event.id).update(
+        status=event.status,
+        error=event.error,
+        next_attempt_at=event.next_attempt_at,
+        updated_at=timezone.now(),
+    )
+    return event.status
+
+
+def recover_stale_claims(timeout: int = None, batch_size: int = None) -> int:
+    """
+    Releases events left in 'processing' for more than `timeout` seconds,
+    e.g. by a worker that died after claiming them. Each one counts as a
+    failed attempt: it is made due for a retry right away, or dead-lettered
+    if it used up its attempts. Returns the number of recovered events.
+    """
+    timeout = settings.EVENT_STALE_CLAIM_TIMEOUT if timeout is None else timeout
+    batch_size = batch_size or settings.EVENT_RETRY_SWEEP_BATCH_SIZE
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                Event.objects.select_for_update(skip_locked=True)
+                .filter(status='processing', updated_at__lt=timezone.now() - timedelta(seconds=timeout))
+                .order_by('updated_at')[:batch_size]
+            )
+            if not events:
+                return total
+
+            now = timezone.now()
+            error = f"Claim expired: still processing after {timeout}s."
+            dead = [event.id for event in events if event.attempts >= max_attempts_for(event.topic)]
+            Event.objects.filter(id__in=dead).update(status='dead', error=error, next_attempt_at=None, updated_at=now)
+            Event.objects.filter(id__in=[event.id for event in events]).exclude(id__in=dead).update(
+                status='failed', error=error, next_attempt_at=now, updated_at=now,
+            )
+
+        total += len(events)
+        logger.warning(f"Recovered {len(events)} stale claimed event(s), {len(dead)} dead-lettered.")
+
+
+def sweep(batch_size: int = None) -> int:
+    """
+    Re-dispatches failed events whose retry is due, and pending events
+    rescheduled for later (open circuit) that are due now, in batches claimed
+    with FOR UPDATE SKIP LOCKED. Claimed events go back to 'pending' and are
+    dispatched through the outbox, one broker connection per batch, so they
+    are retried even where no process_events worker polls pending events.
+    Stale claims (see recover_stale_claims) are released first.
+    Returns the number of re-dispatched events.
+    """
+    batch_size = batch_size or settings.EVENT_RETRY_SWEEP_BATCH_SIZE
+    recover_stale_claims(batch_size=batch_size)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                Event.objects.select_for_update(skip_locked=True)
+                .filter(status__in=['failed', 'pending'], next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at')[:batch_size]
+            )
+            if not events:
+                return total
+
+            Event.objects.filter(id__in=[event.id for event in events]).update(
+                status='pending',
+                next_attempt_at=None,
+                updated_at=timezone.now(),
+            )
+            outbox.enqueue_many(events)
+
+        total += len(events)
+        logger.info(f"Re-dispatched {len(events)} event(s) due for retry.")
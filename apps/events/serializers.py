@@ -0,0 +1,21 @@
+from rest_framework import serializers
+from apps.events.models import Event
+
+
+class EventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Event
+        fields = (
+            'id', 'source', 'topic', 'external_ref', 'status', 'attempts', 'error',
+            'idempotency_key', 'trace_id', 'next_attempt_at', 'created_at', 'updated_at',
+        )
+
+
+class EventWithPayloadSerializer(EventSerializer):
+    payload = serializers.SerializerMethodField()
+
+    class Meta(EventSerializer.Meta):
+        fields = EventSerializer.Meta.fields + ('payload',)
+
+    def get_payload(self, obj):
+        return obj.get_payload()
@@ -1,23 +1,143 @@
 import logging
 import json
-from django.db import transaction
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from apps.events.models import Event
+from apps.events.registry import registry
+from apps.events import retries
+from apps.events.signals import events_succeeded
+from apps.integrations import transport
+from apps.integrations.circuitbreaker import CircuitOpenError
 from apps.integrations.alegra import services as alegra_services
 
 logger = logging.getLogger(__name__)
 
 
 
-def process_pending_events():
+def claim_pending_events(batch_size: int) -> list[Event]:
     """
-    Fetches and processes all pending events.
+    Claims up to `batch_size` pending events in a single round trip.
+    Events rescheduled for later (next_attempt_at) are skipped until they are due.
+
+    Rows are locked with FOR UPDATE SKIP LOCKED, so concurrent workers (threads,
+    processes or other nodes) never block on each other nor claim the same event.
+    Claimed events are moved to 'processing' before the lock is released.
     """
-    pending_events = Event.objects.filter(status='pending').order_by('created_at')
-    logger.info(f"Found {pending_events.count()} pending events to process.")
-    
-    for event in pending_events:
-        process_event(event)
+    with transaction.atomic():
+        claimed = list(
+            Event.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+            .order_by('created_at')[:batch_size]
+        )
+        if not claimed:
+            return []
 
+        Event.objects.filter(id__in=[event.id for event in claimed]).update(
+            status='processing',
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+
+    for event in claimed:
+        event.status = 'processing'
+        event.attempts += 1
+    return claimed
+
+
+def _renew_claim(event: Event) -> bool:
+    """
+    Refreshes the claim of an event right before it runs, so one waiting
+    behind a long batch is not taken for a stale claim. Returns False if the
+    claim was lost meanwhile (released by recover_stale_claims), in which
+    case the event must not run here.
+    """
+    renewed = Event.objects.filter(id=event.id, status='processing', attempts=event.attempts).update(
+        updated_at=timezone.now()
+    )
+    if not renewed:
+        logger.warning(f"Claim of event {event.id} was lost before it ran; skipping it.")
+    return bool(renewed)
+
+
+def _drain_pending_events(batch_size: int) -> int:
+    """
+    Claims and processes batches of pending events until none are left.
+    Each claim is renewed just before its event runs.
+    Returns the number of events processed.
+    """
+    processed = 0
+    while True:
+        events = claim_pending_events(batch_size)
+        if not events:
+            return processed
+
+        logger.info(f"Claimed {len(events)} pending events.")
+        for topic, topic_events in _group_by_topic(events).items():
+            policy = registry.get(topic)
+            if policy is not None and policy.batchable and len(topic_events) > 1:
+                topic_events = [event for event in topic_events if _renew_claim(event)]
+                if topic_events:
+                    _execute_batch(policy, topic_events)
+            else:
+                for event in topic_events:
+                    if _renew_claim(event):
+                        _execute_event(event)
+        processed += len(events)
+
+
+def _group_by_topic(events: list[Event]) -> dict[str, list[Event]]:
+    groups = {}
+    for event in events:
+        groups.setdefault(event.topic, []).append(event)
+    return groups
+
+
+def _drain_worker(batch_size: int) -> int:
+    """
+    Entry point for a worker thread. Each thread gets its own DB connection,
+    which must be closed once it is done to avoid connection leaks.
+    """
+    try:
+        return _drain_pending_events(batch_size)
+    finally:
+        connection.close()
+
+
+def process_pending_events(batch_size: int = None, workers: int = None) -> int:
+    """
+    Drains the pending event queue using `workers` concurrent claim loops,
+    each claiming `batch_size` events per round trip.
+    Returns the number of events processed.
+    """
+    batch_size = batch_size or settings.EVENT_WORKER_BATCH_SIZE
+    workers = workers or settings.EVENT_WORKER_CONCURRENCY
+
+    if workers <= 1:
+        processed = _drain_pending_events(batch_size)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='event-worker') as pool:
+            futures = [pool.submit(_drain_worker, batch_size) for _ in range(workers)]
+            processed = sum(future.result() for future in futures)
+
+    logger.info(f"Processed {processed} pending events.")
+    return processed
+
+
+
+def find_events_by_external_ref(organization_id, external_ref: str, topic: str = None):
+    """
+    Events of an organization about a business document (POS invoice name,
+    Shopify order name...). Served by the (organization, external_ref) index.
+    """
+    events = Event.objects.filter(organization_id=organization_id, external_ref=external_ref)
+    if topic:
+        events = events.filter(topic=topic)
+    return events
 
 
 def process_event(event: Event):
@@ -37,91 +157,118 @@ def process_event(event: Event):
 
         locked_event.status = 'processing'
         locked_event.attempts += 1
-        locked_event.save()
+        locked_event.save(update_fields=['status', 'attempts', 'updated_at'])
+
+    _execute_event(locked_event)
 
+
+def process_event_by_id(event_id):
+    """
+    Loads an event by id and processes it. Used by the executor backends.
+    """
     try:
-        if locked_event.topic == 'pos.invoice.received':
-            handle_invoice_event(locked_event)
-        
-        elif locked_event.topic == 'order.create':
-            # We delegate to the Celery task, but since we are already in a processing loop here,
-            # we might want to call the logic directly or trigger the task.
-            # However, process_event seems to be designed for synchronous processing (e.g. cron).
-            # If we want to reuse the task logic, we should probably import the logic or call the task synchronously.
-            # Calling .delay() here would just queue it again, which might be fine but redundant if we want to process now.
-            # But wait, the task ITSELF handles status updates (processing -> success/failed).
-            # The current process_event ALSO handles status updates.
-            # This creates a conflict if we just call the task.
-            
-            # Option 1: Call the task synchronously (apply).
-            # Option 2: Refactor process_event to just dispatch tasks.
-            
-            # Given the existing code structure, process_event wraps the handler in try/except and updates status.
-            # So the handler should just DO the work and raise exception on failure.
-            # The new task I created `process_manual_order_event` does EVERYTHING (locking, status update).
-            # So if I call it here, I should probably just trigger it and let it run, 
-            # OR I should extract the logic.
-            
-            # To avoid code duplication and conflicts, let's just trigger the task asynchronously here 
-            # and let this function return. 
-            # BUT this function `process_event` sets status to 'processing' then 'success'.
-            # If I trigger a task, this function will finish and set status to 'success' immediately, 
-            # while the task is still running or queued. That's bad.
-            
-            # BETTER APPROACH:
-            # Create a handler function `handle_manual_order_event` here that calls the backend synchronously,
-            # similar to `handle_invoice_event`.
-            # The Celery task `process_manual_order_event` can ALSO call this handler or similar logic.
-            
-            # Let's import the logic from the task I just created? 
-            # Actually, I should have put the logic in a service and called it from both.
-            
-            # For now, to be safe and quick: I will implement `handle_manual_order_event` here 
-            # which does the actual HTTP request.
-            # And I will update the task I just created to use this handler or just keep them separate for now 
-            # if they have different lifecycles.
-            
-            # Wait, the user wants me to use the task.
-            # If `process_pending_events` is running, it picks up pending events.
-            # If the view calls `.delay()`, the event is picked up by Celery.
-            # We have a race condition if both run.
-            # The view creates the event.
-            # If I add the topic here, `process_pending_events` (cron) might pick it up.
-            
-            # I will add the handler here to support the "Cron/Script" way of processing,
-            # just in case Celery is down or we want to run it manually.
-            
-            handle_order_event(locked_event)
-        
-        else:
-            logger.warning(f"No handler for topic: {locked_event.topic}")
-            locked_event.status = 'failed'
-            locked_event.error = f"No handler for topic: {locked_event.topic}"
+        event = Event.objects.get(id=event_id)
+    except Event.DoesNotExist:
+        logger.error(f"Event with id {event_id} not found.")
+        return
+    process_event(event)
+
+
+def _execute_event(locked_event: Event):
+    """
+    Runs the handler for an event that has already been claimed
+    (status 'processing') and records the outcome.
+    """
+    try:
+        policy = registry.get(locked_event.topic)
+        if policy is None:
+            raise ValueError(f"No handler for topic: {locked_event.topic}")
+
+        with policy.process_slot():
+            policy.get_handler()(locked_event)
 
         # If successful, update status and clear previous errors
         locked_event.status = 'success'
         locked_event.error = None
-        locked_event.save()
+        locked_event.save(update_fields=['status', 'error', 'response', 'updated_at'])
         logger.info(f"Event {locked_event.id} processed successfully.")
+        _notify_succeeded([locked_event])
+
+    except CircuitOpenError as e:
+        reschedule_event(locked_event, e.retry_after, str(e))
 
     except Exception as e:
         logger.error(f"Failed to process event {locked_event.id}: {e}", exc_info=True)
         
-        error_message = str(e)
-        # Check if it's a requests.exceptions.HTTPError and extract the response
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_detail = e.response.json()
-                error_message = f"Alegra API Error: {json.dumps(error_detail)}"
-            except json.JSONDecodeError:
-                error_message = f"Alegra API Error: {e.response.text}"
-        
-        # Update the event with the failure status and detailed error
-        with transaction.atomic():
-            failed_event = Event.objects.select_for_update().get(id=locked_event.id)
-            failed_event.status = 'failed'
-            failed_event.error = error_message
-            failed_event.save()
+        # Record the failure; the event is retried with backoff or dead-lettered
+        retries.fail_event(locked_event, _error_message(e))
+
+
+def _execute_batch(policy, events: list[Event]):
+    """
+    Runs the batch handler of a topic over events that have already been
+    claimed and records the outcome of each one. Successes are saved with a
+    single UPDATE; failures keep their own error message.
+    """
+    try:
+        with policy.process_slot():
+            results = policy.get_batch_handler()(events)
+    except Exception as e:
+        logger.error(f"Batch handler for topic '{policy.pattern}' failed: {e}", exc_info=True)
+        results = {event.id: e for event in events}
+
+    now = timezone.now()
+    succeeded = [event.id for event in events if results.get(event.id) is None]
+    Event.objects.filter(id__in=succeeded).update(status='success', error=None, updated_at=now)
+    _notify_succeeded([event for event in events if results.get(event.id) is None])
+
+    for event in events:
+        error = results.get(event.id)
+        if isinstance(error, CircuitOpenError):
+            reschedule_event(event, error.retry_after, str(error))
+        elif error is not None:
+            logger.error(f"Failed to process event {event.id}: {error}")
+            retries.fail_event(event, _error_message(error))
+
+    logger.info(f"Processed a batch of {len(events)} '{policy.pattern}' events, {len(succeeded)} succeeded.")
+
+
+def _notify_succeeded(events: list[Event]):
+    """Sends events_succeeded for events of the same topic; receiver errors are only logged."""
+    if not events:
+        return
+    for receiver, response in events_succeeded.send_robust(sender=events[0].topic, events=events):
+        if isinstance(response, Exception):
+            logger.error(f"events_succeeded receiver {receiver} failed: {response}", exc_info=response)
+
+
+def reschedule_event(event: Event, delay: float, reason: str):
+    """
+    Puts a claimed event back to 'pending' to be retried in `delay` seconds,
+    giving back the attempt it consumed. Used when the upstream is known to be
+    down (open circuit), which says nothing about the event itself.
+    """
+    next_attempt_at = timezone.now() + timedelta(seconds=max(delay, 1))
+    Event.objects.filter(id=event.id).update(
+        status='pending',
+        attempts=F('attempts') - 1,
+        next_attempt_at=next_attempt_at,
+        error=reason,
+        updated_at=timezone.now(),
+    )
+    logger.warning(f"Event {event.id} rescheduled for {next_attempt_at.isoformat()}: {reason}")
+
+
+def _error_message(error: Exception) -> str:
+    error_message = str(error)
+    # Check if it's a requests.exceptions.HTTPError and extract the response
+    if hasattr(error, 'response') and error.response is not None:
+        try:
+            error_detail = error.response.json()
+            error_message = f"Alegra API Error: {json.dumps(error_detail)}"
+        except json.JSONDecodeError:
+            error_message = f"Alegra API Error: {error.response.text}"
+    return error_message
 
 
 
@@ -133,16 +280,24 @@ def handle_invoice_event(event: Event):
     logger.info(f"Successfully handed off event {event.id} to Alegra service.")
 
 
+def handle_invoice_events(events: list[Event]) -> dict:
+    """
+    Batch handler for invoice events: sends a burst of POS invoices to Alegra
+    in bulk mode. Returns the per-event outcome expected by the event worker.
+    """
+    results = alegra_services.send_invoices_from_events(events)
+    logger.info(f"Handed off {len(events)} events to Alegra bulk invoicing.")
+    return results
+
+
 def handle_order_event(event: Event):
     """
     Handles the logic for an order event by sending it to the Core Backend.
     Maps the gateway store_id to the backend store_id.
     """
-    import requests
-    from django.conf import settings
     from apps.companies.models import Company
     
-    payload = event.payload.copy()  # Create a copy to avoid mutating the original
+    payload = event.get_payload().copy()  # Create a copy to avoid mutating the original
     core_url = settings.CORE_BACKEND_URL
     api_key = settings.CORE_BACKEND_API_KEY
     
@@ -172,11 +327,11 @@ def handle_order_event(event: Event):
 
     logger.info(f"Sending order event {event.id} to {target_url}")
     
-    response = requests.post(
+    response = transport.post(
+        'core_backend',
         target_url,
         json=payload,
         headers=headers,
-        timeout=30
     )
     
     response.raise_for_status()
@@ -1,27 +1,40 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal, receiver
 from .models import Event
+from .registry import registry
+
+# Sent by the event workers with the events of a topic that just succeeded
+# (sender: the topic, events: the list of events). Receivers must not raise.
+events_succeeded = Signal()
+
+@receiver(pre_save, sender=Event)
+def externalize_event_bodies(sender, instance, update_fields=None, **kwargs):
+    """
+    Extracts the external reference of new events from their payload, then
+    moves large payloads and responses to the payload store (if configured)
+    before they are written, so the row only keeps their projection.
+    """
+    from . import payloads
+    if instance._state.adding and not instance.external_ref:
+        policy = registry.get(instance.topic)
+        if policy is not None:
+            instance.external_ref = policy.get_external_ref(instance.payload)
+
+    for field in payloads.FIELDS:
+        if update_fields is None or field in update_fields:
+            payloads.externalize(instance, field)
+
 
 @receiver(post_save, sender=Event)
 def trigger_event_processing(sender, instance, created, **kwargs):
     """
     Signal receiver that triggers asynchronous event processing
     when a new Event is created with a 'pending' status.
-    Routes to appropriate task based on topic.
-    """
-    if created and instance.status == 'pending':
-        # Route based on topic to avoid conflicts
-        if instance.topic == 'pos.invoice.received':
-            # Use threading for invoice events (legacy)
-            from .tasks import process_event_async
-            process_event_async(instance.id)
-        elif instance.topic == 'orders/create':
-            # Shopify orders use Celery
-            from apps.integrations.erpnext.tasks import create_erpnext_order_from_shopify_event
-            create_erpnext_order_from_shopify_event.delay(instance.id)
-        elif instance.topic == 'order.create':
-            # Generic order creation uses Celery
-            from apps.integrations.router.tasks import process_order_event
-            process_order_event.delay(instance.id)
-        # Add more topics as needed
 
+    The dispatch is recorded in the transactional outbox and published once
+    the transaction commits, so workers never race the commit. Routing and
+    execution policy come from the topic registry.
+    """
+    if created and instance.status == 'pending' and registry.get(instance.topic):
+        from . import outbox
+        outbox.enqueue(instance)
@@ -1,27 +1,36 @@
+import logging
+from core.celery import app
+from .executors import ExecutorSaturated, get_backend
 
-import threading
-from django.db import connection
-from .models import Event
-from .services import handle_invoice_event
+logger = logging.getLogger(__name__)
 
-def _run_event_processing(event_id: str):
+
+@app.task
+def process_event_task(event_id):
     """
-    This function runs in a separate thread.
-    It fetches the event and calls the main processing service.
+    Celery entry point of the executor backend. Processes a single event by id.
     """
-    try:
-        event = Event.objects.get(id=event_id)
-        handle_invoice_event(event)
-    finally:
-        # Django opens a DB connection per thread. It's crucial to close it
-        # when the thread is done to avoid connection leaks.
-        connection.close()
+    from .services import process_event_by_id
+    process_event_by_id(event_id)
+
 
 def process_event_async(event_id: str):
     """
     This function is called by the signal handler.
-    It starts the background thread to process the event.
+    It submits the event to the configured executor backend (bounded thread
+    pool or Celery queue). When the backend is saturated the event is left
+    'pending' and the process_events worker picks it up later.
+    """
+    try:
+        get_backend().submit(event_id)
+    except ExecutorSaturated as e:
+        logger.warning(f"Event {event_id} left pending for the event worker: {e}")
+
+
+@app.task
+def run_retry_job_task(job_id):
+    """
+    Runs a bulk retry job (see apps.events.bulk_retry) by id.
     """
-    thread = threading.Thread(target=_run_event_processing, args=(event_id,))
-    thread.daemon = True  # Allows the main application to exit even if threads are running
-    thread.start()
+    from .bulk_retry import run_job
+    run_job(job_id)
@@ -1,3 +1,473 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+import threading
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+from datetime import timedelta
+from pathlib import Path
+from django.db import connection
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.accounts.models import Membership, User
+from apps.companies.models import Company
+from apps.integrations.alegra.models import AlegraInvoice
+from apps.organizations.models import Organization
+from apps.events.models import Event, EventArchive, EventBody, OutboxMessage, RetryJob
+from apps.events.executors import ExecutorSaturated, ThreadPoolBackend
+from apps.events.registry import TopicRegistry, registry
+from apps.events import archive, bulk_retry, export, outbox, payloads, retries
+from apps.events.services import claim_pending_events, process_pending_events
+from apps.integrations.circuitbreaker import CircuitOpenError
 
-# Create your tests here.
+
+def _member_headers(organization, username='member'):
+    """JWT Authorization header of a new user who is a member of `organization`."""
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="x")
+    Membership.objects.create(user=user, organization=organization)
+    return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+
+class ClaimPendingEventsTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def _create_event(self, status='pending'):
+        return Event.objects.create(
+            organization=self.organization,
+            source='test',
+            topic='test.topic',
+            payload={},
+            status=status
+        )
+
+    def test_claims_in_batches_and_marks_processing(self):
+        for _ in range(3):
+            self._create_event()
+        self._create_event(status='success')
+
+        first = claim_pending_events(2)
+        second = claim_pending_events(2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(claim_pending_events(2), [])
+        self.assertEqual(Event.objects.filter(status='processing', attempts=1).count(), 3)
+
+    def test_claim_recovered_mid_batch_is_not_run_again(self):
+        first, second = self._create_event(), self._create_event()
+        executed = []
+
+        def execute(event):
+            executed.append(event.id)
+            if event.id == first.id:
+                # The worker is stuck on the first event long enough for the sweeper to release the second.
+                Event.objects.filter(id=second.id).update(updated_at=timezone.now() - timedelta(hours=1))
+                retries.recover_stale_claims(timeout=600)
+
+        with patch('apps.events.services._execute_event', side_effect=execute):
+            process_pending_events(batch_size=2, workers=1)
+
+        self.assertEqual(executed, [first.id])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'failed')
+
+    def test_open_circuit_reschedules_without_consuming_attempts(self):
+        event = self._create_event()
+        topic_registry = TopicRegistry()
+        topic_registry.register('test.topic', handler=MagicMock(side_effect=CircuitOpenError('erp.example.com', 30)))
+
+        with patch('apps.events.services.registry', topic_registry):
+            process_pending_events(batch_size=10, workers=1)
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('pending', 0))
+        self.assertIsNotNone(event.next_attempt_at)
+        self.assertEqual(claim_pending_events(10), [])
+
+
+class TopicRegistryTest(TestCase):
+    def test_builtin_topics_are_registered(self):
+        for topic in ('pos.invoice.received', 'orders/create', 'order.create'):
+            self.assertIsNotNone(registry.get(topic))
+
+    def test_exact_topics_take_precedence_over_patterns(self):
+        topic_registry = TopicRegistry()
+        wildcard = topic_registry.register('orders/*', handler='x.wildcard')
+        exact = topic_registry.register('orders/create', handler='x.exact', queue='shopify')
+
+        self.assertIs(topic_registry.get('orders/create'), exact)
+        self.assertIs(topic_registry.get('orders/updated'), wildcard)
+        self.assertIsNone(topic_registry.get('products/create'))
+
+    def test_dispatch_calls_plain_task_with_event_id(self):
+        calls = []
+        topic_registry = TopicRegistry()
+        topic_registry.register('test.topic', handler='x.handler', task=calls.append)
+
+        self.assertTrue(topic_registry.dispatch('event-id', 'test.topic'))
+        self.assertFalse(topic_registry.dispatch('event-id', 'unknown.topic'))
+        self.assertEqual(calls, ['event-id'])
+
+
+class ThreadPoolBackendTest(SimpleTestCase):
+    def test_rejects_work_beyond_pool_and_queue_limit(self):
+        release = threading.Event()
+        backend = ThreadPoolBackend(pool_size=1, queue_limit=1)
+
+        with patch('apps.events.executors._run_event', side_effect=lambda event_id: release.wait(5)):
+            backend.submit('event-1')
+            backend.submit('event-2')
+            with self.assertRaises(ExecutorSaturated):
+                backend.submit('event-3')
+
+            release.set()
+            backend.shutdown()
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    @patch('apps.events.outbox.registry.dispatch')
+    def test_dispatch_is_published_after_commit(self, mock_dispatch):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            event = Event.objects.create(
+                organization=self.organization,
+                source='erpnext',
+                topic='pos.invoice.received',
+                payload={}
+            )
+            mock_dispatch.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+
+        mock_dispatch.assert_called_once()
+        self.assertEqual(mock_dispatch.call_args.args[:2], (event.id, 'pos.invoice.received'))
+        self.assertIsNotNone(OutboxMessage.objects.get(event=event).published_at)
+
+    def test_events_without_handler_are_not_recorded(self):
+        Event.objects.create(organization=self.organization, source='test', topic='test.topic', payload={})
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+@override_settings(EVENT_MAX_ATTEMPTS=2)
+class RetrySchedulingTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def _create_event(self, **fields):
+        return Event.objects.create(
+            organization=self.organization, source='erpnext', topic='pos.invoice.received', payload={}, **fields
+        )
+
+    def test_failures_are_scheduled_then_dead_lettered(self):
+        event = self._create_event(status='processing', attempts=1)
+        self.assertEqual(retries.fail_event(event, "boom"), 'failed')
+        event.refresh_from_db()
+        self.assertGreater(event.next_attempt_at, timezone.now() - timedelta(seconds=1))
+
+        event.attempts = 2
+        self.assertEqual(retries.fail_event(event, "boom"), 'dead')
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.next_attempt_at), ('dead', None))
+
+    def test_sweep_redispatches_only_due_events(self):
+        due = self._create_event(status='failed', attempts=1, next_attempt_at=timezone.now() - timedelta(seconds=5))
+        self._create_event(status='failed', attempts=1, next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(retries.sweep(batch_size=10), 1)
+
+        due.refresh_from_db()
+        self.assertEqual(due.status, 'pending')
+        self.assertEqual(list(OutboxMessage.objects.values_list('event_id', flat=True)), [due.id])
+
+    def test_sweep_redispatches_due_rescheduled_events(self):
+        rescheduled = self._create_event(status='processing', attempts=1)
+        Event.objects.filter(id=rescheduled.id).update(
+            status='pending', next_attempt_at=timezone.now() - timedelta(seconds=5)
+        )
+
+        self.assertEqual(retries.sweep(batch_size=10), 1)
+
+        rescheduled.refresh_from_db()
+        self.assertIsNone(rescheduled.next_attempt_at)
+        self.assertEqual(list(OutboxMessage.objects.values_list('event_id', flat=True)), [rescheduled.id])
+
+    def test_sweep_releases_stale_claims(self):
+        stale = self._create_event(status='processing', attempts=1)
+        exhausted = self._create_event(status='processing', attempts=5)
+        active = self._create_event(status='processing', attempts=1)
+        Event.objects.filter(id__in=[stale.id, exhausted.id]).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with override_settings(EVENT_STALE_CLAIM_TIMEOUT=600):
+            self.assertEqual(retries.sweep(batch_size=10), 1)
+
+        statuses = dict(Event.objects.values_list('id', 'status'))
+        self.assertEqual(
+            (statuses[stale.id], statuses[exhausted.id], statuses[active.id]),
+            ('pending', 'dead', 'processing'),
+        )
+
+
+class BulkRetryTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def _create_event(self, topic='orders/create', **fields):
+        return Event.objects.create(organization=self.organization, source='erpnext', topic=topic, payload={}, **fields)
+
+    def test_matching_events_are_dispatched_in_chunks(self):
+        failed = [self._create_event(status='failed', error='ERPNext down') for _ in range(5)]
+        self._create_event(status='dead', topic='pos.invoice.received')
+        self._create_event(status='success')
+
+        filters = bulk_retry.clean_filters({'topic': 'orders/create', 'statuses': ['failed', 'dead']})
+        job = bulk_retry.create_job(filters, organization_id=self.organization.id, chunk_size=2, run=False)
+        with patch('apps.events.outbox.enqueue_many', wraps=outbox.enqueue_many) as mock_enqueue:
+            bulk_retry.run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.dispatched, job.chunks), ('completed', 5, 5, 3))
+        self.assertEqual(mock_enqueue.call_count, 3)
+        self.assertEqual(
+            set(Event.objects.filter(status='pending').values_list('id', flat=True)),
+            {event.id for event in failed},
+        )
+
+    def test_dead_events_get_their_attempts_back(self):
+        dead = self._create_event(status='dead', attempts=5, next_attempt_at=timezone.now())
+        failed = self._create_event(status='failed', attempts=2, next_attempt_at=timezone.now())
+
+        job = bulk_retry.create_job(bulk_retry.clean_filters({}), organization_id=self.organization.id, run=False)
+        bulk_retry.run_job(job.id)
+
+        dead.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((dead.status, dead.attempts, dead.next_attempt_at), ('pending', 0, None))
+        self.assertEqual((failed.status, failed.attempts, failed.next_attempt_at), ('pending', 2, None))
+
+    def test_filters_are_validated(self):
+        with self.assertRaises(ValueError):
+            bulk_retry.clean_filters({'statuses': ['success']})
+        with self.assertRaises(ValueError):
+            bulk_retry.clean_filters({'statuses': ['pending']})
+        with self.assertRaises(ValueError):
+            bulk_retry.clean_filters({'tenant': 'x'})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BulkRetryViewTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.other = Organization.objects.create(slug="other-org", uuid="other-uuid")
+        self.user = User.objects.create_user(username="member", email="member@example.com", password="x")
+        Membership.objects.create(user=self.user, organization=self.organization)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _start(self, slug=None, **data):
+        headers = {'X-Organization-Slug': slug} if slug else {}
+        return self.client.post('/api/events/retry/bulk/', data=data, format='json', headers=headers)
+
+    def test_anonymous_requests_are_rejected(self):
+        self.client.force_authenticate(None)
+        self.assertIn(self._start('test-org').status_code, (401, 403))
+        self.assertFalse(RetryJob.objects.exists())
+
+    def test_jobs_are_scoped_to_the_member_organizations(self):
+        response = self._start('test-org', organization_id=str(self.other.id))
+        self.assertEqual(response.status_code, 202)
+        job = RetryJob.objects.get()
+        self.assertEqual(job.organization_id, self.organization.id)
+        self.assertEqual(self.client.get(f'/api/events/retry-jobs/{job.id}/').status_code, 200)
+
+        self.assertEqual(self._start('other-org').status_code, 403)
+        self.assertEqual(self._start(organization_id=str(self.other.id)).status_code, 400)
+
+        other_job = bulk_retry.create_job({}, organization_id=self.other.id, run=False)
+        global_job = bulk_retry.create_job({}, run=False)
+        self.assertEqual(self.client.get(f'/api/events/retry-jobs/{other_job.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/events/retry-jobs/{global_job.id}/').status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EventListViewTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        other = Organization.objects.create(slug="other-org", uuid="other-uuid")
+        now = timezone.now()
+        self.events = []
+        for minutes in range(5):
+            event = Event.objects.create(
+                organization=self.organization, source='shopify', topic='orders/create', payload={"n": minutes}
+            )
+            Event.objects.filter(id=event.id).update(created_at=now - timedelta(minutes=minutes))
+            self.events.append(event)
+        Event.objects.create(organization=other, source='shopify', topic='orders/create', payload={})
+        self.auth = _member_headers(self.organization)
+
+    def _get(self, url, **headers):
+        return self.client.get(url, headers={'X-Organization-Slug': 'test-org', **self.auth, **headers})
+
+    def test_pages_by_keyset_cursor_without_counting(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self._get('/api/events/?page_size=3').json()
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+        self.assertNotIn('payload', first['results'][0])
+
+        second = self._get(first['next']).json()
+        self.assertIsNone(second['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, [str(event.id) for event in self.events])
+
+    def test_payload_is_included_on_request(self):
+        response = self._get('/api/events/?include_payload=true&page_size=1').json()
+        self.assertEqual(response['results'][0]['payload'], {"n": 0})
+
+    def test_anonymous_and_non_member_callers_are_rejected(self):
+        self.auth = {}
+        self.assertEqual(self._get('/api/events/?include_payload=true').status_code, 401)
+
+        outsider = _member_headers(Organization.objects.get(slug='other-org'), username='outsider')
+        self.assertEqual(self._get('/api/events/?include_payload=true', **outsider).status_code, 403)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EventExportTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        other = Organization.objects.create(slug="other-org", uuid="other-uuid")
+        for name in ("POS-0001", "POS-0002"):
+            Event.objects.create(organization=self.organization, source='erpnext', topic='pos.invoice.received',
+                                 payload={"name": name}, status='success')
+        Event.objects.create(organization=other, source='erpnext', topic='pos.invoice.received', payload={"name": "X"})
+        self.headers = {'X-Organization-Slug': 'test-org', **_member_headers(self.organization)}
+
+    def test_streams_tenant_events_as_ndjson(self):
+        response = self.client.get('/api/events/export/?status=success', headers=self.headers)
+
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['payload']['name'] for row in rows], ["POS-0001", "POS-0002"])
+
+    def test_anonymous_and_non_member_exports_are_denied(self):
+        outsider = _member_headers(Organization.objects.get(slug='other-org'), username='outsider')
+        for dataset in ('events', 'alegra_invoices'):
+            url = f'/api/events/export/?dataset={dataset}'
+            response = self.client.get(url, headers={'X-Organization-Slug': 'test-org', **outsider})
+            self.assertEqual(response.status_code, 403)
+        # Last: the export runs outside request transactions, so DRF's rollback
+        # on the authentication error marks the test transaction itself.
+        for dataset in ('events', 'alegra_invoices'):
+            url = f'/api/events/export/?dataset={dataset}'
+            self.assertEqual(self.client.get(url, headers={'X-Organization-Slug': 'test-org'}).status_code, 401)
+
+    def test_gzipped_csv_export(self):
+        blocks = export.stream('events', 'csv', compress=True, organization_id=self.organization.id, chunk_size=1)
+
+        lines = gzip.decompress(b''.join(blocks)).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'organization_id', 'source'])
+        self.assertEqual(len(lines), 3)
+
+    def test_alegra_invoices_export_includes_archived_events(self):
+        company = Company.objects.create(organization=self.organization, name="Test Company")
+        live, archived = Event.objects.filter(organization=self.organization).order_by('created_at')
+        for alegra_id, event in (("1", live), ("2", archived)):
+            AlegraInvoice.objects.create(company=company, event=event, alegra_id=alegra_id, status="open", payload_sent={})
+        Event.objects.filter(id=archived.id).update(created_at=timezone.now() - timedelta(days=60))
+        archive.archive_events(older_than_days=30)
+
+        blocks = export.stream('alegra_invoices', organization_id=self.organization.id, topic='pos.invoice.received')
+
+        rows = [json.loads(line) for line in b''.join(blocks).decode().splitlines()]
+        self.assertEqual(
+            sorted((row['alegra_id'], row['event__external_ref']) for row in rows),
+            [("1", "POS-0001"), ("2", None)],
+        )
+
+    async def test_streams_asynchronously_under_asgi(self):
+        response = await self.async_client.get('/api/events/export/?status=success', headers=self.headers)
+
+        self.assertTrue(response.is_async)
+        body = b''.join([block async for block in response.streaming_content])
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+
+class EventArchiveTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def test_old_terminal_events_are_moved_to_the_archive(self):
+        old = Event.objects.create(
+            organization=self.organization, source='shopify', topic='orders/create',
+            payload={"name": "#1001"}, status='success'
+        )
+        recent = Event.objects.create(
+            organization=self.organization, source='shopify', topic='orders/create', payload={}, status='success'
+        )
+        failed = Event.objects.create(
+            organization=self.organization, source='shopify', topic='orders/create', payload={}, status='failed'
+        )
+        Event.objects.filter(id__in=[old.id, failed.id]).update(created_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(archive.archive_events(older_than_days=30), 1)
+
+        self.assertEqual(set(Event.objects.values_list('id', flat=True)), {recent.id, failed.id})
+        self.assertEqual(archive.decompress_json(EventArchive.objects.get(id=old.id).payload), {"name": "#1001"})
+
+    @skipUnless(connection.vendor == 'postgresql', "The archive is only partitioned on PostgreSQL.")
+    def test_archive_is_partitioned_with_the_partition_key_in_the_primary_key(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT a.attname FROM pg_index i "
+                "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+                "WHERE i.indrelid = %s::regclass AND i.indisprimary ORDER BY a.attname",
+                [EventArchive._meta.db_table],
+            )
+            self.assertEqual([row[0] for row in cursor.fetchall()], ['created_at', 'id'])
+            cursor.execute("SELECT count(*) FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+                           [EventArchive._meta.db_table])
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        event = Event.objects.create(
+            organization=self.organization, source='shopify', topic='orders/create', payload={}, status='success'
+        )
+        Event.objects.filter(id=event.id).update(created_at=timezone.now() - timedelta(days=35))
+        self.assertEqual(archive.archive_events(older_than_days=30), 1)
+
+
+@override_settings(EVENT_PAYLOAD_STORE='db', EVENT_PAYLOAD_MIN_BYTES=0)
+class PayloadStoreTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def test_bodies_are_externalized_and_loaded_lazily(self):
+        payload = {"name": "POS-0001", "company": "Test Company", "items": [{"qty": 1}]}
+        event = Event.objects.create(
+            organization=self.organization, source='erpnext', topic='pos.invoice.received', payload=payload
+        )
+
+        stored = Event.objects.get(id=event.id)
+        self.assertEqual(stored.payload, {"name": "POS-0001", "company": "Test Company", "_external": "db"})
+        self.assertEqual(stored.get_payload(), payload)
+        self.assertEqual(payloads.decompress_json(EventBody.objects.get(event_id=event.id).body), payload)
+
+    def test_files_are_written_on_commit(self):
+        payload = {"name": "POS-0001", "items": [{"qty": 1}]}
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(EVENT_PAYLOAD_STORE='filesystem', EVENT_PAYLOAD_STORE_ROOT=root):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                event = Event.objects.create(
+                    organization=self.organization, source='erpnext', topic='pos.invoice.received', payload=payload
+                )
+            self.assertEqual(list(Path(root).rglob('*.json.z')), [])
+            self.assertEqual(event.get_payload(), payload)
+
+            for callback in callbacks:
+                callback()
+            self.assertEqual(Event.objects.get(id=event.id).get_payload(), payload)
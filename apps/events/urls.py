@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import RetryEventView
+from .views import BulkRetryView, EventExportView, EventListView, RetryEventView, RetryJobView
 
 urlpatterns = [
+    path('', EventListView.as_view(), name='event-list'),
+    path('export/', EventExportView.as_view(), name='event-export'),
     path('retry/<uuid:event_id>/', RetryEventView.as_view(), name='retry-event'),
+    path('retry/bulk/', BulkRetryView.as_view(), name='bulk-retry'),
+    path('retry-jobs/<uuid:job_id>/', RetryJobView.as_view(), name='retry-job'),
 ]
@@ -1,9 +1,19 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from apps.events.models import Event
-from apps.events import services as event_services
+from apps.accounts.models import Membership
+from apps.events.models import Event, RetryJob
+from apps.events import bulk_retry, export, payloads, services as event_services
+from apps.events.pagination import EventKeysetPagination
+from apps.events.serializers import EventSerializer, EventWithPayloadSerializer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,7 +29,7 @@ class RetryEventView(APIView):
             return Response({'status': 'error', 'message': 'Event not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Optionally, you might want to restrict which statuses can be retried
-        if event.status not in ['failed', 'pending']:
+        if event.status not in ['failed', 'dead', 'pending']:
             return Response(
                 {'status': 'error', 'message': f'Event in status "{event.status}" cannot be retried.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -27,6 +37,7 @@ class RetryEventView(APIView):
         
         # Reset status to pending to allow processing
         event.status = 'pending'
+        event.next_attempt_at = None
         event.save()
 
         try:
@@ -34,4 +45,178 @@ class RetryEventView(APIView):
             return Response({'status': 'success', 'message': 'Event is being processed.'}, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"An unexpected error occurred during event retry: {e}", exc_info=True)
-            return Response({'status': 'error', 'message': 'An error occurred during event processing.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'status': 'error', 'message': 'An error occurred during event processing.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _member_organization_ids(user) -> set:
+    """Organizations the user is an active member of."""
+    return set(Membership.objects.filter(user=user, is_active=True).values_list('organization_id', flat=True))
+
+
+def _can_access(user, organization) -> bool:
+    """Whether the user may read or act on the events of an organization."""
+    return user.is_staff or organization.id in _member_organization_ids(user)
+
+
+class BulkRetryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Starts a bulk retry of the events matching the given filters
+        (source, topic, statuses, created_after, created_before, ids).
+        Scoped to the request organization, of which the user must be a
+        member. Staff users may instead pass `organization_id`, or omit both
+        to retry across every organization.
+        """
+        data = dict(request.data)
+        organization = getattr(request, 'organization', None)
+        requested_id = data.pop('organization_id', None)
+        if organization:
+            organization_id = organization.id
+            if not _can_access(request.user, organization):
+                return Response(
+                    {'status': 'error', 'message': 'Not a member of this organization.'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif request.user.is_staff:
+            organization_id = requested_id
+        else:
+            return Response(
+                {'status': 'error', 'message': 'An organization is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            filters = bulk_retry.clean_filters(data)
+        except ValueError as e:
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = bulk_retry.create_job(filters, organization_id=organization_id, created_by=request.user.get_username())
+        return Response(bulk_retry.progress(job), status=status.HTTP_202_ACCEPTED)
+
+
+class RetryJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Returns the progress of a bulk retry job. Users other than staff
+        only see the jobs of the organizations they are members of.
+        """
+        jobs = RetryJob.objects.all()
+        organization = getattr(request, 'organization', None)
+        if organization:
+            jobs = jobs.filter(organization=organization)
+        if not request.user.is_staff:
+            jobs = jobs.filter(organization_id__in=_member_organization_ids(request.user))
+        try:
+            job = jobs.get(id=job_id)
+        except RetryJob.DoesNotExist:
+            return Response({'status': 'error', 'message': 'Retry job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(bulk_retry.progress(job), status=status.HTTP_200_OK)
+
+
+class EventListView(ListAPIView):
+    """
+    Lists the events of the request organization, newest first, paged by
+    (created_at, id) keyset cursors. Filters: status, topic, source,
+    external_ref, created_after and created_before. Payloads are left out
+    unless `include_payload=true`. Only members of the organization (and
+    staff) may list its events.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = EventKeysetPagination
+    filter_backends = []
+    list_filters = ('status', 'topic', 'source', 'external_ref')
+
+    def include_payload(self) -> bool:
+        return self.request.query_params.get('include_payload', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        return EventWithPayloadSerializer if self.include_payload() else EventSerializer
+
+    def get_queryset(self):
+        organization = getattr(self.request, 'organization', None)
+        if not organization:
+            raise ValidationError(
+                {'error': 'Organization context not found. Please provide the X-Organization-Slug header.'}
+            )
+        if not _can_access(self.request.user, organization):
+            raise PermissionDenied('Not a member of this organization.')
+
+        params = self.request.query_params
+        queryset = Event.objects.filter(organization=organization)
+        for field in self.list_filters:
+            if params.get(field):
+                queryset = queryset.filter(**{field: params[field]})
+        for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+            if params.get(param):
+                value = parse_datetime(params[param])
+                if value is None:
+                    raise ValidationError({param: 'Invalid datetime.'})
+                queryset = queryset.filter(**{lookup: value})
+
+        if not self.include_payload():
+            queryset = queryset.defer('payload', 'response')
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        events = super().paginate_queryset(queryset)
+        if self.include_payload():
+            payloads.load_many(events, 'payload')
+        return events
+
+
+class EventExportView(APIView):
+    """
+    Streams the events (or, with dataset=alegra_invoices, the Alegra invoices)
+    of the request organization as NDJSON or CSV (export_format; `format` is
+    DRF's content negotiation parameter), optionally gzipped (gzip=true). Filters: topic, status (comma-separated), created_after and
+    created_before (dates or datetimes). Rows are read with a server-side
+    cursor, so the export runs in constant memory; under ASGI the body is an
+    async iterator, which Django streams instead of buffering. Only members
+    of the organization (and staff) may export its data.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # The body is streamed after the view returns, outside any request transaction.
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
+
+    def get(self, request, *args, **kwargs):
+        organization = getattr(request, 'organization', None)
+        if not organization:
+            return Response(
+                {'error': 'Organization context not found. Please provide the X-Organization-Slug header.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not _can_access(request.user, organization):
+            return Response({'error': 'Not a member of this organization.'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        dataset = params.get('dataset', 'events')
+        export_format = params.get('export_format', 'ndjson')
+        compress = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        try:
+            blocks = export.stream(
+                dataset,
+                export_format,
+                compress=compress,
+                organization_id=organization.id,
+                topic=params.get('topic'),
+                statuses=[value for value in params.get('status', '').split(',') if value],
+                created_after=export.parse_bound(params.get('created_after')),
+                created_before=export.parse_bound(params.get('created_before'), end=True),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(request._request, ASGIRequest):
+            blocks = export.aiter_blocks(blocks)
+        response = StreamingHttpResponse(
+            blocks,
+            content_type='application/gzip' if compress else export.FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(dataset, export_format, compress)}"'
+        return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AlegraCredential, AlegraInvoice
+from .models import AlegraContact, AlegraCredential, AlegraInvoice, AlegraNumberSequence
 
 @admin.register(AlegraCredential)
 class AlegraCredentialAdmin(admin.ModelAdmin):
@@ -13,4 +13,18 @@ class AlegraInvoiceAdmin(admin.ModelAdmin):
     list_display = ('company', 'status', 'alegra_id', 'created_at')
     search_fields = ('company__name', 'alegra_id')
     list_filter = ('status', 'company')
-    readonly_fields = ('id', 'created_at', 'updated_at', 'payload_sent', 'response_received')
\ No newline at end of file
+    readonly_fields = ('id', 'created_at', 'updated_at', 'payload_sent', 'response_received')
+
+@admin.register(AlegraContact)
+class AlegraContactAdmin(admin.ModelAdmin):
+    list_display = ('identification', 'alegra_contact_id', 'name', 'company', 'updated_at')
+    search_fields = ('identification', 'alegra_contact_id', 'name')
+    list_filter = ('company',)
+    readonly_fields = ('id', 'created_at', 'updated_at')
+
+@admin.register(AlegraNumberSequence)
+class AlegraNumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('company', 'template_id', 'next_number', 'synced_at', 'updated_at')
+    search_fields = ('company__name',)
+    list_filter = ('company',)
+    readonly_fields = ('id', 'synced_at', 'updated_at')
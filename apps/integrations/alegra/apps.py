@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class AlegraConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.integrations.alegra'
+
+    def ready(self):
+        from apps.events.registry import register
+        register(
+            'pos.invoice.received',
+            handler='apps.events.services.handle_invoice_event',
+            task='apps.events.tasks.process_event_async',
+            external_ref='name',
+            batch_handler='apps.events.services.handle_invoice_events',
+        )
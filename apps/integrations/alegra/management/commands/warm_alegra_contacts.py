@@ -0,0 +1,36 @@
+import logging
+from django.core.management.base import BaseCommand
+from apps.integrations.alegra.models import AlegraCredential
+from apps.integrations.alegra import services as alegra_services
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command to preload the Alegra contact mapping.
+
+    Lists the contacts of each active Alegra credential and stores their
+    identification -> contact ID mapping, so POS invoices of known customers
+    don't need to search Alegra.
+
+    Example usage:
+        python manage.py warm_alegra_contacts
+        python manage.py warm_alegra_contacts --company <company_id>
+    """
+    help = 'Preloads the Alegra contact mapping from Alegra contact listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', help='Only warm the contacts of this company ID.')
+
+    def handle(self, *args, **options):
+        credentials = AlegraCredential.objects.filter(is_active=True).select_related('company')
+        if options['company']:
+            credentials = credentials.filter(company_id=options['company'])
+
+        for credential in credentials:
+            try:
+                stored = alegra_services.warm_alegra_contacts(credential)
+                self.stdout.write(self.style.SUCCESS(f'Stored {stored} contact(s) for {credential.company.name}.'))
+            except Exception as e:
+                logger.error(f"Failed to warm Alegra contacts for company {credential.company_id}: {e}", exc_info=True)
+                self.stderr.write(self.style.ERROR(f'Failed to warm contacts for {credential.company.name}. Check logs for details.'))
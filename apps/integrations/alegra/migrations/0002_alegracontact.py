@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+import django.db.models.deletion
+import django_multitenant.mixins
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alegra', '0001_initial'),
+        ('companies', '0003_backfill_shopify_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlegraContact',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('identification', models.CharField(max_length=64)),
+                ('alegra_contact_id', models.CharField(max_length=64)),
+                ('name', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alegra_contacts', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'identification'), name='uniq_alegra_contact_per_company')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+import django.db.models.deletion
+import django_multitenant.mixins
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alegra', '0002_alegracontact'),
+        ('companies', '0003_backfill_shopify_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlegraNumberSequence',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('template_id', models.PositiveIntegerField()),
+                ('next_number', models.PositiveBigIntegerField(default=0)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alegra_number_sequences', to='companies.company')),
+                ('credential', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_sequences', to='alegra.alegracredential')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('credential', 'template_id'), name='uniq_alegra_number_sequence')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+    ]
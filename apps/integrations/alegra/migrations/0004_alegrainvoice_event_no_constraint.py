@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+import django.db.models.deletion
+import django_multitenant.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alegra', '0003_alegranumbersequence'),
+        ('events', '0006_eventarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alegrainvoice',
+            name='event',
+            field=django_multitenant.fields.TenantForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='alegra_invoice', to='events.event'),
+        ),
+    ]
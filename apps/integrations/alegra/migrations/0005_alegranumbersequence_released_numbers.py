@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alegra', '0004_alegrainvoice_event_no_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alegranumbersequence',
+            name='released_numbers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -17,7 +17,9 @@ class AlegraCredential(TenantModelMixin, models.Model):
 class AlegraInvoice(TenantModelMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='alegra_invoices')
-    event = TenantForeignKey('events.Event', on_delete=models.CASCADE, related_name='alegra_invoice')
+    # No database constraint: the audit row outlives the event once it is archived.
+    event = TenantForeignKey('events.Event', on_delete=models.DO_NOTHING, db_constraint=False,
+                             related_name='alegra_invoice')
     alegra_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     status = models.CharField(max_length=50, db_index=True)
     payload_sent = models.JSONField()
@@ -31,4 +33,51 @@ class AlegraInvoice(TenantModelMixin, models.Model):
         constraints = [
             models.UniqueConstraint(fields=['company', 'alegra_id'],
                                     name='uniq_alegra_id_per_company')
-        ]
\ No newline at end of file
+        ]
+
+class AlegraContact(TenantModelMixin, models.Model):
+    """
+    Local mapping of a customer identification number to its Alegra contact,
+    filled from Alegra's search/create responses and from bulk warm-ups.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='alegra_contacts')
+    identification = models.CharField(max_length=64)
+    alegra_contact_id = models.CharField(max_length=64)
+    name = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'identification'],
+                                    name='uniq_alegra_contact_per_company')
+        ]
+
+
+class AlegraNumberSequence(TenantModelMixin, models.Model):
+    """
+    Local counter of the next invoice number of an Alegra number template.
+    Numbers are reserved atomically from this row and the counter is only
+    resynchronized with Alegra periodically or after a numbering conflict.
+    Numbers given back below the counter are kept in `released_numbers` and
+    handed out again before any newer number.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='alegra_number_sequences')
+    credential = models.ForeignKey(AlegraCredential, on_delete=models.CASCADE, related_name='number_sequences')
+    template_id = models.PositiveIntegerField()
+    next_number = models.PositiveBigIntegerField(default=0)
+    released_numbers = models.JSONField(default=list, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['credential', 'template_id'],
+                                    name='uniq_alegra_number_sequence')
+        ]
@@ -1,9 +1,16 @@
 import requests
 import logging
 import json
-from datetime import date
-from .models import AlegraCredential, AlegraInvoice, Company
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from apps.integrations import transport
+from .models import AlegraContact, AlegraCredential, AlegraInvoice, AlegraNumberSequence, Company
 from apps.events.models import Event
+from apps.events import payloads
 
 logger = logging.getLogger(__name__)
 
@@ -13,19 +20,16 @@ def _get_alegra_auth(credential: AlegraCredential):
     """Returns the authentication tuple for Alegra API requests."""
     return (credential.api_key, credential.api_secret)
 
-def _get_next_invoice_number(credential: AlegraCredential, template_id: int) -> int:
+def _fetch_next_invoice_number(credential: AlegraCredential, template_id: int) -> int:
     """
-    Fetches the next available invoice number for a given number template.
+    Fetches the next available invoice number for a given number template from Alegra.
     """
-    if not template_id:
-        raise ValueError("Alegra Number Template ID is not configured in company metadata.")
-
     auth = _get_alegra_auth(credential)
     headers = {"Accept": "application/json"}
     url = f"{ALEGRA_API_BASE_URL}number-templates/{template_id}"
     
     logger.info(f"Fetching next invoice number for template ID: {template_id}")
-    response = requests.get(url, auth=auth, headers=headers, timeout=10)
+    response = transport.get('alegra', url, auth=auth, headers=headers)
     response.raise_for_status()
     
     template_data = response.json()
@@ -34,29 +38,197 @@ def _get_next_invoice_number(credential: AlegraCredential, template_id: int) ->
         raise ValueError(f"Could not determine next invoice number from Alegra's response for template {template_id}")
 
     logger.info(f"Got next invoice number: {next_number}")
+    return int(next_number)
+
+
+# Numbers reserved by this process and not used yet, per (credential, template).
+_local_number_blocks = {}
+_local_number_lock = threading.Lock()
+# Sequences already resynchronized with Alegra since this process started.
+_synced_sequences = set()
+
+
+def allocate_invoice_numbers(credential: AlegraCredential, template_id: int, count: int = 1, force_resync: bool = False) -> list[int]:
+    """
+    Atomically reserves `count` invoice numbers of a template from the
+    AlegraNumberSequence row (locked with SELECT FOR UPDATE). Released numbers
+    are handed out first, the rest are consecutive numbers of the counter.
+
+    The counter is resynchronized with Alegra the first time this process uses
+    it, after ALEGRA_NUMBER_RESYNC_INTERVAL seconds, or when `force_resync` is
+    set after a numbering conflict. Alegra is queried before the row is locked,
+    so a slow response does not block the other workers, and a resync never
+    moves the counter backwards, so numbers reserved by in-flight invoices are
+    not handed out twice.
+    """
+    if not template_id:
+        raise ValueError("Alegra Number Template ID is not configured in company metadata.")
+
+    key = (credential.id, int(template_id))
+    sequence, _ = AlegraNumberSequence.objects.get_or_create(
+        credential=credential,
+        template_id=template_id,
+        defaults={'company_id': credential.company_id},
+    )
+    resync_due = (
+        sequence.synced_at is None
+        or sequence.synced_at <= timezone.now() - timedelta(seconds=settings.ALEGRA_NUMBER_RESYNC_INTERVAL)
+    )
+    remote_next = None
+    if force_resync or resync_due or key not in _synced_sequences:
+        remote_next = _fetch_next_invoice_number(credential, template_id)
+
+    with transaction.atomic():
+        sequence = AlegraNumberSequence.objects.select_for_update().get(pk=sequence.pk)
+        if remote_next is not None:
+            sequence.next_number = max(remote_next, sequence.next_number)
+            sequence.synced_at = timezone.now()
+
+        released = sorted(sequence.released_numbers)
+        numbers = released[:count]
+        new_count = count - len(numbers)
+        numbers += range(sequence.next_number, sequence.next_number + new_count)
+        AlegraNumberSequence.objects.filter(pk=sequence.pk).update(
+            next_number=sequence.next_number + new_count,
+            released_numbers=released[count:],
+            synced_at=sequence.synced_at,
+            updated_at=timezone.now(),
+        )
+
+    if remote_next is not None:
+        _synced_sequences.add(key)
+    return numbers
+
+
+def _get_next_invoice_number(credential: AlegraCredential, template_id: int, force_resync: bool = False) -> int:
+    """
+    Returns the next invoice number for a given number template.
+
+    Numbers are reserved from the local counter in blocks of
+    ALEGRA_NUMBER_BLOCK_SIZE and served from memory until the block runs out.
+    Blocks bigger than 1 trade numbering gaps (unused numbers are lost when the
+    process stops) for fewer database round trips.
+    """
+    key = (credential.id, int(template_id or 0))
+    with _local_number_lock:
+        if force_resync:
+            _local_number_blocks.pop(key, None)
+        block = _local_number_blocks.get(key)
+        if block:
+            return block.pop(0)
+
+    block = allocate_invoice_numbers(credential, template_id, settings.ALEGRA_NUMBER_BLOCK_SIZE, force_resync)
+    next_number = block.pop(0)
+    if block:
+        with _local_number_lock:
+            _local_number_blocks.setdefault(key, []).extend(block)
     return next_number
 
+
+def release_invoice_number(credential: AlegraCredential, template_id: int, number: int):
+    """
+    Gives back a reserved number that Alegra rejected without using it. It is
+    returned to the counter when it was the last one handed out, otherwise it
+    is stored in the sequence row and handed out before any newer number, by
+    whichever process reserves next.
+    """
+    with transaction.atomic():
+        sequence = AlegraNumberSequence.objects.select_for_update().filter(
+            credential=credential, template_id=template_id
+        ).first()
+        if sequence is None or number >= sequence.next_number:
+            return
+        if number == sequence.next_number - 1:
+            changes = {'next_number': number}
+        elif number not in sequence.released_numbers:
+            changes = {'released_numbers': sorted([*sequence.released_numbers, number])}
+        else:
+            return
+        AlegraNumberSequence.objects.filter(pk=sequence.pk).update(**changes, updated_at=timezone.now())
+
+
+def _alegra_error(response) -> tuple:
+    """(code, message) of an Alegra error response, either at the top level or under 'error'."""
+    try:
+        body = response.json()
+    except ValueError:
+        return None, response.text
+    if isinstance(body, dict) and isinstance(body.get('error'), dict):
+        body = body['error']
+    if not isinstance(body, dict):
+        return None, response.text
+    return body.get('code'), str(body.get('message') or '')
+
+
+def _is_number_conflict(response, number) -> bool:
+    """
+    Tells whether an Alegra error response rejects `number` as already used,
+    which means the local counter fell behind Alegra. The error code is
+    matched against ALEGRA_NUMBER_CONFLICT_CODES; with none configured the
+    message has to name the rejected number itself.
+    """
+    if response is None or response.status_code not in (400, 409):
+        return False
+    code, message = _alegra_error(response)
+    if settings.ALEGRA_NUMBER_CONFLICT_CODES:
+        return str(code) in settings.ALEGRA_NUMBER_CONFLICT_CODES
+    message = message.lower()
+    return str(number) in message and ('exist' in message or 'en uso' in message or 'already used' in message)
+
+def _remember_alegra_contact(credential: AlegraCredential, identification, contact_id, name=None):
+    """Stores the identification -> Alegra contact mapping of the credential's company."""
+    AlegraContact.objects.update_or_create(
+        company_id=credential.company_id,
+        identification=str(identification),
+        defaults={'alegra_contact_id': str(contact_id), 'name': name},
+    )
+
+
+def _contact_identification(contact: dict):
+    """Extracts the identification number from an Alegra contact representation."""
+    identification = contact.get('identification')
+    if isinstance(identification, dict):
+        identification = identification.get('number')
+    if not identification and isinstance(contact.get('identificationObject'), dict):
+        identification = contact['identificationObject'].get('number')
+    return str(identification).strip() if identification else None
+
+
 def find_or_create_alegra_contact(credential: AlegraCredential, customer_payload: dict) -> int:
     """
     Finds a contact in Alegra by identification number. If not found, creates it.
     Returns the Alegra contact ID.
+
+    The local AlegraContact mapping is checked first, so known customers
+    don't cost a call to Alegra.
     """
     if not customer_payload or not customer_payload.get('identification'):
         raise ValueError("Customer identification data is missing from payload.")
 
     identification_number = customer_payload['identification']
+
+    known_contact_id = (
+        AlegraContact.objects.filter(company_id=credential.company_id, identification=str(identification_number))
+        .values_list('alegra_contact_id', flat=True)
+        .first()
+    )
+    if known_contact_id:
+        logger.info(f"Found mapped Alegra contact. ID: {known_contact_id}")
+        return int(known_contact_id)
+
     auth = _get_alegra_auth(credential)
     headers = {"Accept": "application/json"}
     search_url = f"{ALEGRA_API_BASE_URL}contacts?identification={identification_number}"
 
     logger.info(f"Searching for Alegra contact with identification: {identification_number}")
-    response = requests.get(search_url, auth=auth, headers=headers, timeout=10)
+    response = transport.get('alegra', search_url, auth=auth, headers=headers)
     response.raise_for_status()
     
     results = response.json()
     if results and isinstance(results, list):
         contact_id = results[0]['id']
         logger.info(f"Found existing Alegra contact. ID: {contact_id}")
+        _remember_alegra_contact(credential, identification_number, contact_id, results[0].get('name'))
         return contact_id
 
     logger.info("Alegra contact not found. Creating new contact.")
@@ -81,7 +253,7 @@ def find_or_create_alegra_contact(credential: AlegraCredential, customer_payload
     print(json.dumps(contact_payload, indent=2))
     print(f"------------------------------\n")
 
-    response = requests.post(create_url, auth=auth, headers=headers, json=contact_payload, timeout=15)
+    response = transport.post('alegra', create_url, auth=auth, headers=headers, json=contact_payload)
     response.raise_for_status()
     new_contact = response.json()
 
@@ -91,12 +263,60 @@ def find_or_create_alegra_contact(credential: AlegraCredential, customer_payload
     
     new_contact_id = new_contact['id']
     logger.info(f"Successfully created new Alegra contact. ID: {new_contact_id}")
+    _remember_alegra_contact(credential, identification_number, new_contact_id, new_contact.get('name'))
     
     return new_contact_id
 
-def create_alegra_invoice(credential: AlegraCredential, event_payload: dict, alegra_contact_id: int, company_metadata: dict) -> tuple[dict, dict]:
+
+def warm_alegra_contacts(credential: AlegraCredential, page_size: int = 30) -> int:
+    """
+    Bulk-loads the AlegraContact mapping of the credential's company from
+    Alegra's contact listing, one page per call.
+    Returns the number of contacts stored.
+    """
+    auth = _get_alegra_auth(credential)
+    headers = {"Accept": "application/json"}
+    url = f"{ALEGRA_API_BASE_URL}contacts"
+
+    stored = 0
+    start = 0
+    while True:
+        response = transport.get('alegra', url, auth=auth, headers=headers, params={'start': start, 'limit': page_size})
+        response.raise_for_status()
+        contacts = response.json()
+        if not isinstance(contacts, list) or not contacts:
+            break
+
+        mappings = {}
+        for contact in contacts:
+            identification = _contact_identification(contact)
+            if identification and contact.get('id'):
+                mappings[identification] = AlegraContact(
+                    company_id=credential.company_id,
+                    identification=identification,
+                    alegra_contact_id=str(contact['id']),
+                    name=contact.get('name'),
+                )
+        AlegraContact.objects.bulk_create(
+            mappings.values(),
+            update_conflicts=True,
+            unique_fields=['company', 'identification'],
+            update_fields=['alegra_contact_id', 'name', 'updated_at'],
+        )
+        stored += len(mappings)
+
+        if len(contacts) < page_size:
+            break
+        start += page_size
+
+    logger.info(f"Warmed {stored} Alegra contacts for company {credential.company_id}")
+    return stored
+
+def create_alegra_invoice(credential: AlegraCredential, event_payload: dict, alegra_contact_id: int, company_metadata: dict, invoice_number: int = None) -> tuple[dict, dict]:
     """
     Creates an invoice in Alegra using the transformed payload from an event.
+    `invoice_number` is a number already reserved by the caller; when omitted
+    the next one is taken from the local allocator.
     Returns a tuple containing the Alegra API response and the payload that was sent.
     """
     auth = _get_alegra_auth(credential)
@@ -111,8 +331,8 @@ def create_alegra_invoice(credential: AlegraCredential, event_payload: dict, ale
     default_bank_id = alegra_config.get("default_bank_id", 1)
     electronic_invoicing = alegra_config.get("electronic_invoicing", True)
 
-    # --- Get Next Invoice Number ---
-    next_invoice_number = _get_next_invoice_number(credential, template_id)
+    # --- Get Next Invoice Number (from the local allocator) ---
+    next_invoice_number = invoice_number or _get_next_invoice_number(credential, template_id)
     
     # --- Use current date as required by Alegra for electronic invoices ---
     current_date = date.today().strftime('%Y-%m-%d')
@@ -181,7 +401,16 @@ def create_alegra_invoice(credential: AlegraCredential, event_payload: dict, ale
 
     logger.info(f"Sending new invoice to Alegra for contact ID: {alegra_contact_id}")
     try:
-        response = requests.post(invoice_url, auth=auth, headers=headers, json=invoice_payload, timeout=20)
+        response = transport.post('alegra', invoice_url, auth=auth, headers=headers, json=invoice_payload)
+        if _is_number_conflict(response, next_invoice_number):
+            # The number was already used: resync the counter with Alegra and retry once.
+            logger.warning(f"Invoice number {next_invoice_number} rejected by Alegra. Resynchronizing template {template_id}.")
+            next_invoice_number = _get_next_invoice_number(credential, template_id, force_resync=True)
+            invoice_payload["numberTemplate"]["number"] = next_invoice_number
+            response = transport.post('alegra', invoice_url, auth=auth, headers=headers, json=invoice_payload)
+        if 400 <= response.status_code < 500 and not _is_number_conflict(response, next_invoice_number):
+            # Rejected before being created: the number is still free.
+            release_invoice_number(credential, template_id, next_invoice_number)
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
         print("\n--- Alegra API Error Response ---")
@@ -201,19 +430,25 @@ def create_alegra_invoice(credential: AlegraCredential, event_payload: dict, ale
     logger.info("Successfully created Alegra invoice.")
     return alegra_response, invoice_payload
 
+def _get_company_credential(event: Event) -> tuple[Company, AlegraCredential]:
+    """Returns the company named in an invoice event and its active Alegra credential."""
+    try:
+        company = Company.objects.get(organization_id=event.organization_id, name__iexact=event.get_payload().get('company'))
+        credential = AlegraCredential.objects.get(company=company, is_active=True)
+    except (Company.DoesNotExist, AlegraCredential.DoesNotExist) as e:
+        raise ValueError(f"Active Alegra credentials not found for company specified in event. Error: {e}")
+    return company, credential
+
+
 def send_invoice_from_event(event: Event):
     """
     Orchestrator function that processes an event and sends the invoice to Alegra.
     """
     logger.info(f"Starting to process event {event.id} for Alegra integration.")
-    payload = event.payload
+    payload = event.get_payload()
     
     # 1. Get credentials and company metadata
-    try:
-        company = Company.objects.get(organization=event.organization, name__iexact=payload.get('company'))
-        credential = AlegraCredential.objects.get(company=company, is_active=True)
-    except (Company.DoesNotExist, AlegraCredential.DoesNotExist) as e:
-        raise ValueError(f"Active Alegra credentials not found for company specified in event. Error: {e}")
+    company, credential = _get_company_credential(event)
 
     # 2. Find or create contact
     alegra_contact_id = find_or_create_alegra_contact(credential, payload.get('customer'))
@@ -232,4 +467,117 @@ def send_invoice_from_event(event: Event):
     )
     logger.info(f"Alegra transaction logged for event {event.id}")
 
-    return alegra_response
\ No newline at end of file
+    return alegra_response
+
+def _submit_invoice(credential: AlegraCredential, event: Event, alegra_contact_id, company_metadata: dict, invoice_number: int):
+    """
+    Entry point for a bulk submission thread. Each thread gets its own DB
+    connection, which must be closed once it is done.
+    """
+    try:
+        return create_alegra_invoice(credential, event.get_payload(), alegra_contact_id, company_metadata, invoice_number)
+    finally:
+        connection.close()
+
+
+def _write_audit_rows(audit_rows: list):
+    """
+    Writes the AlegraInvoice audit rows of a group. The invoices already exist
+    in Alegra, so if the bulk insert fails the rows are written one by one and
+    only the failing ones are lost, each reported with its Alegra id.
+    """
+    try:
+        with transaction.atomic():
+            AlegraInvoice.objects.bulk_create(audit_rows)
+        return
+    except IntegrityError as e:
+        logger.warning(f"Bulk audit of {len(audit_rows)} Alegra invoices failed, writing them one by one: {e}")
+    for row in audit_rows:
+        try:
+            with transaction.atomic():
+                row.save(force_insert=True)
+        except IntegrityError as e:
+            logger.error(f"Audit of Alegra invoice {row.alegra_id} (event {row.event_id}) could not be written: {e}")
+
+
+def _send_invoice_group(group: list[Event], results: dict):
+    """Sends the invoices of one company's events and audits those created."""
+    company, credential = _get_company_credential(group[0])
+
+    # Contacts are resolved once per customer and reused across the group.
+    contacts = {}
+    pending = []
+    for event in group:
+        customer = event.get_payload().get('customer') or {}
+        identification = _contact_identification(customer)
+        try:
+            if identification not in contacts:
+                contacts[identification] = find_or_create_alegra_contact(credential, customer)
+        except Exception as e:
+            results[event.id] = e
+            continue
+        pending.append((event, contacts[identification]))
+    if not pending:
+        return
+
+    alegra_config = company.metadata.get("metadata", {}).get("alegra_config", {})
+    numbers = allocate_invoice_numbers(credential, alegra_config.get("number_template_id"), len(pending))
+
+    concurrency = alegra_config.get("bulk_concurrency") or settings.ALEGRA_BULK_CONCURRENCY
+    logger.info(f"Sending {len(pending)} invoices to Alegra for company {company.id} with concurrency {concurrency}")
+    audit_rows = []
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(pending)), thread_name_prefix='alegra-bulk') as pool:
+        futures = [
+            (event, pool.submit(_submit_invoice, credential, event, contact_id, company.metadata, number))
+            for (event, contact_id), number in zip(pending, numbers)
+        ]
+        for event, future in futures:
+            try:
+                alegra_response, invoice_payload = future.result()
+            except Exception as e:
+                results[event.id] = e
+                continue
+            results[event.id] = None
+            audit_rows.append(AlegraInvoice(
+                company=company,
+                event=event,
+                alegra_id=alegra_response.get('id'),
+                status=alegra_response.get('status'),
+                payload_sent=invoice_payload,
+                response_received=alegra_response
+            ))
+    _write_audit_rows(audit_rows)
+
+
+def send_invoices_from_events(events: list[Event]) -> dict:
+    """
+    Bulk version of send_invoice_from_event, meant for bursts of POS invoices.
+
+    Events are grouped by company. For each group the company, the credential,
+    the contacts and the invoice numbers are resolved once, then the invoices
+    are submitted concurrently, up to the credential's `bulk_concurrency`
+    (alegra_config) or ALEGRA_BULK_CONCURRENCY. The AlegraInvoice audit rows of
+    a group are written with one bulk_create as soon as its submissions are
+    done, and an error in one group does not affect the others.
+
+    Returns a dict mapping each event id to the exception it failed with, or
+    None when its invoice was created.
+    """
+    payloads.load_many(events)
+    groups = {}
+    for event in events:
+        key = (event.organization_id, (event.get_payload().get('company') or '').lower())
+        groups.setdefault(key, []).append(event)
+
+    results = {}
+    for group in groups.values():
+        try:
+            _send_invoice_group(group, results)
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                logger.error(f"Alegra bulk invoicing failed for a group of {len(group)} events: {e}", exc_info=True)
+            results.update({event.id: e for event in group if event.id not in results})
+
+    created = sum(1 for error in results.values() if error is None)
+    logger.info(f"Alegra bulk invoicing: {created} of {len(events)} invoices created.")
+    return results
@@ -1,3 +1,211 @@
-from django.test import TestCase
+from unittest.mock import patch, MagicMock
+import requests
+from django.test import TestCase, override_settings
+from apps.companies.models import Company
+from apps.organizations.models import Organization
+from apps.events.models import Event
+from apps.integrations.alegra.models import AlegraContact, AlegraCredential, AlegraInvoice, AlegraNumberSequence
+from apps.integrations.alegra import services as alegra_services
 
-# Create your tests here.
+
+class AlegraContactMappingTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(organization=self.organization, name="Test Company")
+        self.credential = AlegraCredential.objects.create(company=self.company, api_key="key", api_secret="secret")
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_searched_contact_is_mapped_and_reused(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value=[{"id": 42, "name": "Jane"}]))
+        customer = {"identification": "900123", "name": "Jane"}
+
+        self.assertEqual(alegra_services.find_or_create_alegra_contact(self.credential, customer), 42)
+        self.assertEqual(alegra_services.find_or_create_alegra_contact(self.credential, customer), 42)
+
+        mock_transport.get.assert_called_once()
+        self.assertEqual(AlegraContact.objects.get().alegra_contact_id, "42")
+
+
+class AlegraNumberAllocatorTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(organization=self.organization, name="Test Company")
+        self.credential = AlegraCredential.objects.create(company=self.company, api_key="key", api_secret="secret")
+        alegra_services._local_number_blocks.clear()
+        alegra_services._synced_sequences.clear()
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_numbers_are_allocated_locally_after_sync(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+
+        self.assertEqual(alegra_services._get_next_invoice_number(self.credential, 7), 100)
+        self.assertEqual(alegra_services._get_next_invoice_number(self.credential, 7), 101)
+
+        mock_transport.get.assert_called_once()
+        self.assertEqual(AlegraNumberSequence.objects.get().next_number, 102)
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_resync_never_moves_the_counter_backwards(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+        alegra_services._get_next_invoice_number(self.credential, 7)
+        alegra_services._get_next_invoice_number(self.credential, 7)
+
+        self.assertEqual(alegra_services._get_next_invoice_number(self.credential, 7, force_resync=True), 102)
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 150}))
+        self.assertEqual(alegra_services._get_next_invoice_number(self.credential, 7, force_resync=True), 150)
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_released_numbers_survive_a_restart(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+        self.assertEqual(alegra_services.allocate_invoice_numbers(self.credential, 7, 3), [100, 101, 102])
+        alegra_services.release_invoice_number(self.credential, 7, 101)
+        self.assertEqual(AlegraNumberSequence.objects.get().released_numbers, [101])
+
+        # A new process has no memory of the release.
+        alegra_services._local_number_blocks.clear()
+        self.assertEqual(alegra_services.allocate_invoice_numbers(self.credential, 7, 2), [101, 103])
+        sequence = AlegraNumberSequence.objects.get()
+        self.assertEqual((sequence.next_number, sequence.released_numbers), (104, []))
+
+
+class AlegraNumberConflictTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(organization=self.organization, name="Test Company")
+        self.credential = AlegraCredential.objects.create(company=self.company, api_key="key", api_secret="secret")
+        self.metadata = {"metadata": {"alegra_config": {"number_template_id": 7}}}
+        self.payload = {"items": [{"alegra_product_id": 1, "rate": 10, "qty": 1}]}
+        alegra_services._local_number_blocks.clear()
+        alegra_services._synced_sequences.clear()
+
+    def _error(self, body, status_code=400):
+        return MagicMock(status_code=status_code, json=MagicMock(return_value=body), text=str(body))
+
+    @override_settings(ALEGRA_NUMBER_CONFLICT_CODES=['3061'])
+    @patch('apps.integrations.alegra.services.transport')
+    def test_conflict_code_resyncs_and_retries(self, mock_transport):
+        mock_transport.get.side_effect = [
+            MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100})),
+            MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 120})),
+        ]
+        responses = [
+            self._error({"code": 3061, "message": "Duplicated"}),
+            MagicMock(status_code=201, json=MagicMock(return_value={"id": "1"})),
+        ]
+        sent_numbers = []
+
+        def post(*args, json, **kwargs):
+            sent_numbers.append(json['numberTemplate']['number'])
+            return responses.pop(0)
+        mock_transport.post.side_effect = post
+
+        alegra_services.create_alegra_invoice(self.credential, self.payload, 42, self.metadata)
+
+        self.assertEqual(sent_numbers, [100, 120])
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_other_rejections_give_the_number_back(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+        mock_transport.post.return_value = self._error(
+            {"code": 2006, "message": "The number of items in use exceeds the plan"}
+        )
+        mock_transport.post.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=mock_transport.post.return_value
+        )
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            alegra_services.create_alegra_invoice(self.credential, self.payload, 42, self.metadata)
+
+        mock_transport.get.assert_called_once()
+        mock_transport.post.assert_called_once()
+        self.assertEqual(alegra_services._get_next_invoice_number(self.credential, 7), 100)
+
+
+class AlegraBulkInvoicingTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(
+            organization=self.organization,
+            name="Test Company",
+            metadata={"metadata": {"alegra_config": {"number_template_id": 7}}}
+        )
+        self.credential = AlegraCredential.objects.create(company=self.company, api_key="key", api_secret="secret")
+        AlegraContact.objects.create(company=self.company, identification="900123", alegra_contact_id="42")
+        alegra_services._local_number_blocks.clear()
+        alegra_services._synced_sequences.clear()
+
+    def _create_event(self, company="Test Company"):
+        return Event.objects.create(
+            organization=self.organization,
+            source='erpnext',
+            topic='pos.invoice.received',
+            status='processing',
+            payload={
+                "company": company,
+                "customer": {"identification": "900123"},
+                "items": [{"alegra_product_id": 1, "rate": 10, "qty": 1}],
+            }
+        )
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_groups_are_numbered_once_and_audited_in_bulk(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+        mock_transport.post.side_effect = [
+            MagicMock(status_code=201, json=MagicMock(return_value={"id": str(alegra_id), "status": "open"}))
+            for alegra_id in range(3)
+        ]
+        events = [self._create_event() for _ in range(3)]
+        unknown = self._create_event(company="Unknown")
+
+        results = alegra_services.send_invoices_from_events(events + [unknown])
+
+        self.assertEqual([results[event.id] for event in events], [None, None, None])
+        self.assertIsInstance(results[unknown.id], ValueError)
+        mock_transport.get.assert_called_once()
+        sent_numbers = sorted(call.kwargs['json']['numberTemplate']['number'] for call in mock_transport.post.call_args_list)
+        self.assertEqual(sent_numbers, [100, 101, 102])
+        self.assertEqual(AlegraInvoice.objects.count(), 3)
+
+    @patch('apps.integrations.alegra.services.transport')
+    def test_conflicting_audit_row_does_not_discard_the_others(self, mock_transport):
+        mock_transport.get.return_value = MagicMock(json=MagicMock(return_value={"nextInvoiceNumber": 100}))
+        mock_transport.post.side_effect = [
+            MagicMock(status_code=201, json=MagicMock(return_value={"id": str(alegra_id), "status": "open"}))
+            for alegra_id in range(2)
+        ]
+        earlier = self._create_event()
+        AlegraInvoice.objects.create(company=self.company, event=earlier, alegra_id="0", status="open", payload_sent={})
+        events = [self._create_event() for _ in range(2)]
+
+        results = alegra_services.send_invoices_from_events(events)
+
+        self.assertEqual([results[event.id] for event in events], [None, None])
+        self.assertEqual(
+            sorted(AlegraInvoice.objects.values_list('alegra_id', flat=True)), ["0", "1"]
+        )
+
+
+class ResendInvoiceLookupTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    @patch('apps.integrations.alegra.views.process_event')
+    def test_event_is_found_by_its_external_reference(self, mock_process_event):
+        event = Event.objects.create(
+            organization=self.organization,
+            source='erpnext',
+            topic='pos.invoice.received',
+            payload={"name": "POS-0001"},
+            status='failed'
+        )
+        self.assertEqual(event.external_ref, "POS-0001")
+
+        response = self.client.post(
+            '/api/integrations/alegra/resend-invoice/',
+            data={"pos_invoice_name": "POS-0001"},
+            content_type='application/json',
+            headers={'X-Organization-Slug': 'test-org'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_process_event.call_args.args[0].id, event.id)
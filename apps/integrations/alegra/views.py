@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import ResendInvoiceSerializer
 from apps.events.models import Event
-from apps.events.services import process_event
+from apps.events.services import find_events_by_external_ref, process_event
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,8 +20,8 @@ class ResendInvoiceAPIView(APIView):
         pos_invoice_name = serializer.validated_data['pos_invoice_name']
         logger.info(f"Received request to resend invoice: {pos_invoice_name}")
 
-        # Find the original event associated with this POS invoice name.
-        # We search within the JSON payload for the 'name' field.
+        # Find the original event associated with this POS invoice name
+        # through its indexed external reference.
         try:
             # Note: This assumes the organization is available on the request, 
             # which requires the TenantMiddleware to run for this endpoint.
@@ -31,10 +31,11 @@ class ResendInvoiceAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            event_to_resend = Event.objects.get(
-                organization=request.organization,
-                payload__name=pos_invoice_name
-            )
+            event_to_resend = find_events_by_external_ref(
+                request.organization.id,
+                pos_invoice_name,
+                topic='pos.invoice.received'
+            ).get()
         except Event.DoesNotExist:
             logger.warning(f"Could not find an event for invoice name: {pos_invoice_name}")
             return Response(
@@ -0,0 +1,146 @@
+"""
+Per-host circuit breaker for the integration clients, with its state in Redis.
+
+- closed: calls go through. Consecutive failures (network errors, timeouts and
+  502/503/504 answers) are counted; reaching the threshold opens the circuit.
+- open: calls fail fast with CircuitOpenError until the reset timeout elapses.
+- half-open: a limited number of probe calls go through. A successful probe
+  closes the circuit, a failed one opens it again.
+
+The state is shared by every web and worker process, so once a host is known
+to be down nobody waits out its timeouts. If Redis is unavailable the breaker
+fails open (calls go through).
+"""
+import logging
+import threading
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'circuit'
+
+FAILURE_STATUS_CODES = (502, 503, 504)
+
+# Returns {decision, retry_after_ms}. decision: 0 rejected, 1 closed and
+# healthy, 2 allowed but the outcome must be reported (failures or probe).
+_ALLOW_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'state', 'opened_until', 'failures', 'probes', 'probes_until')
+local status = state[1] or 'closed'
+if status == 'closed' then
+    if (tonumber(state[3]) or 0) > 0 then return {2, 0} end
+    return {1, 0}
+end
+local opened_until = tonumber(state[2]) or 0
+if status == 'open' and now < opened_until then
+    return {0, opened_until - now}
+end
+local probes = tonumber(state[4]) or 0
+if status == 'open' or now > (tonumber(state[5]) or 0) then
+    probes = 0
+end
+if probes >= tonumber(ARGV[1]) then
+    return {0, tonumber(ARGV[2])}
+end
+redis.call('HSET', KEYS[1], 'state', 'half_open', 'probes', probes + 1, 'probes_until', now + tonumber(ARGV[2]))
+return {2, 0}
+"""
+
+# Records a failure and opens the circuit if needed. Returns 1 if it is open.
+_FAILURE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local status = redis.call('HGET', KEYS[1], 'state') or 'closed'
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local opened = 0
+if status == 'half_open' or failures >= tonumber(ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_until', now + tonumber(ARGV[2]), 'probes', 0)
+    opened = 1
+end
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]) + 600000)
+return opened
+"""
+
+_scripts = {}
+_scripts_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling a host whose circuit is open. `retry_after` is
+    the number of seconds until the host may be probed again.
+    """
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {host}, retry in {retry_after:.0f}s.")
+
+
+def _get_script(name, source):
+    script = _scripts.get(name)
+    if script is None:
+        from django_redis import get_redis_connection
+        with _scripts_lock:
+            script = _scripts.get(name)
+            if script is None:
+                script = _scripts[name] = get_redis_connection('default').register_script(source)
+    return script
+
+
+def circuit_key(host: str) -> str:
+    return f"{KEY_PREFIX}:{host.lower()}"
+
+
+def before_call(host: str) -> bool:
+    """
+    Raises CircuitOpenError if `host` must not be called right now.
+    Returns whether the outcome of the call has to be reported with
+    record_success, so healthy hosts cost a single Redis round trip.
+    """
+    try:
+        decision, retry_after_ms = _get_script('allow', _ALLOW_SCRIPT)(
+            keys=[circuit_key(host)],
+            args=[settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES, int(settings.CIRCUIT_BREAKER_RESET_TIMEOUT * 1000)],
+        )
+    except Exception as e:
+        logger.warning(f"Circuit breaker unavailable for {host}, letting the call through: {e}")
+        return False
+
+    if not decision:
+        raise CircuitOpenError(host, int(retry_after_ms) / 1000)
+    return decision == 2
+
+
+def record_success(host: str):
+    """Closes the circuit of `host` and forgets its failures."""
+    try:
+        from django_redis import get_redis_connection
+        get_redis_connection('default').delete(circuit_key(host))
+    except Exception as e:
+        logger.warning(f"Circuit breaker unavailable recording a success for {host}: {e}")
+
+
+def record_failure(host: str):
+    """Counts a failed call to `host`, opening its circuit past the threshold."""
+    try:
+        opened = _get_script('failure', _FAILURE_SCRIPT)(
+            keys=[circuit_key(host)],
+            args=[settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, int(settings.CIRCUIT_BREAKER_RESET_TIMEOUT * 1000)],
+        )
+    except Exception as e:
+        logger.warning(f"Circuit breaker unavailable recording a failure for {host}: {e}")
+        return
+
+    if opened:
+        logger.warning(f"Circuit opened for {host} for {settings.CIRCUIT_BREAKER_RESET_TIMEOUT}s.")
+
+
+def is_failure(response=None, error=None) -> bool:
+    """Tells whether a call outcome means the host is unhealthy."""
+    if error is not None:
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    return response is not None and response.status_code in FAILURE_STATUS_CODES
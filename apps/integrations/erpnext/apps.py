@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ErpnextConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.integrations.erpnext'
+
+    def ready(self):
+        from apps.events.registry import register
+        from apps.events.signals import events_succeeded
+        from . import kpis
+        events_succeeded.connect(kpis.on_events_succeeded, dispatch_uid='erpnext-pos-kpis')
+        register(
+            'orders/create',
+            handler='apps.integrations.erpnext.tasks.handle_shopify_order_event',
+            task='apps.integrations.erpnext.tasks.create_erpnext_order_from_shopify_event',
+            external_ref='name',
+        )
@@ -0,0 +1,320 @@
+"""
+POS invoice KPIs, maintained incrementally.
+
+When 'pos.invoice.received' events succeed, each invoice is recorded once as a
+PosInvoiceFact and its revenue, items and payments are added to the per-company
+daily rollups (PosDailyKpi, PosDailyItemKpi, PosDailyPaymentKpi) with
+in-place increments. The KPI endpoint only reads the rollups, through a
+two-level cache keyed by a per-organization data version that every rollup
+update bumps; the same version makes the ETag, so unchanged KPIs are answered
+with a 304 without touching the database.
+"""
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from core.cache import TwoLevelCache
+from apps.companies.models import Company
+from apps.events import payloads
+from apps.integrations.alegra.models import AlegraInvoice
+from .models import PosDailyItemKpi, PosDailyKpi, PosDailyPaymentKpi, PosInvoiceFact
+
+logger = logging.getLogger(__name__)
+
+TOPIC = 'pos.invoice.received'
+VERSION_KEY_PREFIX = 'pos-kpis-version'
+
+_kpi_cache = TwoLevelCache(
+    'pos-kpis',
+    ttl=settings.POS_KPI_CACHE_TTL,
+    local_ttl=settings.POS_KPI_LOCAL_CACHE_TTL,
+    negative_ttl=0,
+)
+
+
+def _decimal(value) -> Decimal:
+    try:
+        return Decimal(str(value)) if value not in (None, '') else Decimal(0)
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+
+
+def _customer_name(payload):
+    name = payload.get('customer_name') or payload.get('customer')
+    if isinstance(name, dict):
+        name = name.get('name')
+    return str(name)[:255] if name else None
+
+
+def _posted_at(payload, event) -> datetime:
+    posting_date = parse_date(str(payload.get('posting_date') or ''))
+    if posting_date is None:
+        return event.created_at
+    posting_time = parse_time(str(payload.get('posting_time') or '').split('.')[0]) or datetime.min.time()
+    return timezone.make_aware(datetime.combine(posting_date, posting_time))
+
+
+def _parse_invoice(payload) -> dict:
+    """Revenue, items and payments of a POS invoice payload."""
+    items = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for item in payload.get('items') or []:
+        name = str(item.get('item_name') or item.get('item_code') or 'Unknown')[:255]
+        qty = _decimal(item.get('qty'))
+        amount = _decimal(item.get('amount')) if item.get('amount') is not None else qty * _decimal(item.get('rate'))
+        items[name][0] += qty
+        items[name][1] += amount
+
+    payments = defaultdict(lambda: [Decimal(0), 0])
+    for payment in payload.get('payments') or []:
+        method = str(payment.get('mode_of_payment') or 'Unknown')[:255]
+        payments[method][0] += _decimal(payment.get('amount'))
+        payments[method][1] += 1
+
+    total = payload.get('grand_total', payload.get('rounded_total'))
+    if total is None:
+        total = sum((amount for amount, _ in payments.values()), Decimal(0)) or sum(
+            (amount for _, amount in items.values()), Decimal(0))
+    return {
+        'total': _decimal(total),
+        'items_sold': sum((qty for qty, _ in items.values()), Decimal(0)),
+        'items': items,
+        'payments': payments,
+    }
+
+
+def _increment(model, key_fields, increments: dict):
+    """Adds `increments` ({key: {field: delta}}) to the rollup rows, creating missing ones."""
+    if not increments:
+        return
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in increments],
+        ignore_conflicts=True,
+    )
+    for key, deltas in increments.items():
+        model.objects.filter(**dict(zip(key_fields, key))).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+
+def record_invoices(events) -> int:
+    """
+    Records the POS invoices of succeeded events and adds them to the daily
+    rollups. Invoices already recorded (e.g. resent) are not counted again.
+    Returns the number of newly counted invoices.
+    """
+    payloads.load_many(events)
+    organization_ids = {event.organization_id for event in events}
+    companies = {
+        (organization_id, name.lower()): company_id
+        for company_id, organization_id, name in Company.objects.filter(
+            organization_id__in=organization_ids
+        ).values_list('id', 'organization_id', 'name')
+    }
+    alegra = {
+        event_id: (alegra_id, status)
+        for event_id, alegra_id, status in AlegraInvoice.objects.filter(
+            event_id__in=[event.id for event in events]
+        ).values_list('event_id', 'alegra_id', 'status')
+    }
+
+    facts, details = [], {}
+    for event in events:
+        payload = event.get_payload() or {}
+        company_id = companies.get((event.organization_id, str(payload.get('company') or '').lower()))
+        if not payload.get('name') or company_id is None:
+            logger.warning(f"Event {event.id} has no invoice name or known company; left out of the POS KPIs.")
+            continue
+        invoice = _parse_invoice(payload)
+        posted_at = _posted_at(payload, event)
+        alegra_id, alegra_status = alegra.get(event.id, (None, None))
+        fact = PosInvoiceFact(
+            company_id=company_id,
+            event_id=event.id,
+            invoice_name=str(payload['name'])[:255],
+            customer_name=_customer_name(payload),
+            day=timezone.localdate(posted_at),
+            posted_at=posted_at,
+            total=invoice['total'],
+            items_sold=invoice['items_sold'],
+            alegra_id=alegra_id,
+            alegra_status=alegra_status,
+        )
+        facts.append(fact)
+        details[fact.id] = (event.organization_id, invoice)
+    if not facts:
+        return 0
+
+    with transaction.atomic():
+        PosInvoiceFact.objects.bulk_create(facts, ignore_conflicts=True)
+        # Conflicting rows keep their own id: only the facts inserted now are counted.
+        inserted = set(PosInvoiceFact.objects.filter(id__in=[fact.id for fact in facts]).values_list('id', flat=True))
+
+        daily = defaultdict(lambda: {'revenue': Decimal(0), 'invoices': 0, 'items_sold': Decimal(0)})
+        items = defaultdict(lambda: {'quantity': Decimal(0), 'revenue': Decimal(0)})
+        payments = defaultdict(lambda: {'amount': Decimal(0), 'transactions': 0})
+        for fact in facts:
+            if fact.id not in inserted:
+                continue
+            invoice = details[fact.id][1]
+            key = (fact.company_id, fact.day)
+            daily[key]['revenue'] += invoice['total']
+            daily[key]['invoices'] += 1
+            daily[key]['items_sold'] += invoice['items_sold']
+            for name, (qty, amount) in invoice['items'].items():
+                items[key + (name,)]['quantity'] += qty
+                items[key + (name,)]['revenue'] += amount
+            for method, (amount, count) in invoice['payments'].items():
+                payments[key + (method,)]['amount'] += amount
+                payments[key + (method,)]['transactions'] += count
+
+        _increment(PosDailyKpi, ('company_id', 'day'), daily)
+        _increment(PosDailyItemKpi, ('company_id', 'day', 'item_name'), items)
+        _increment(PosDailyPaymentKpi, ('company_id', 'day', 'method'), payments)
+
+    for organization_id in {details[fact_id][0] for fact_id in inserted}:
+        transaction.on_commit(lambda organization_id=organization_id: bump_version(organization_id))
+    logger.info(f"Counted {len(inserted)} of {len(events)} POS invoice(s) in the KPI rollups.")
+    return len(inserted)
+
+
+def on_events_succeeded(sender, events, **kwargs):
+    """events_succeeded receiver: feeds the rollups with succeeded POS invoice events."""
+    if sender == TOPIC:
+        record_invoices(events)
+
+
+def _version_key(organization_id) -> str:
+    return f"{VERSION_KEY_PREFIX}:{organization_id}"
+
+
+def bump_version(organization_id):
+    """Marks the KPIs of an organization as changed, retiring cached responses and ETags."""
+    try:
+        cache.set(_version_key(organization_id), str(time.time_ns()), None)
+    except Exception as e:
+        logger.warning(f"Shared cache unavailable bumping the POS KPI version of {organization_id}: {e}")
+
+
+def data_version(organization_id):
+    """Current KPI data version of an organization, or None if the shared cache is unavailable."""
+    key = _version_key(organization_id)
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, str(time.time_ns()), None)
+            version = cache.get(key)
+        return version
+    except Exception as e:
+        logger.warning(f"Shared cache unavailable reading the POS KPI version of {organization_id}: {e}")
+        return None
+
+
+def etag(organization_id, company, start, end, version) -> str:
+    """ETag of a KPI response: changes with the query and the data version only."""
+    key = f"{organization_id}:{company}:{start}:{end}:{version}"
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def _money(value) -> float:
+    return round(float(value or 0), 2)
+
+
+def _share(value, total) -> float:
+    return round(float(value) * 100 / float(total), 2) if total else 0.0
+
+
+def compute_kpis(company_ids, start, end) -> dict:
+    """Builds the KPI response from the daily rollups of the given companies."""
+    days = PosDailyKpi.objects.filter(company_id__in=company_ids, day__range=(start, end))
+    by_day = {
+        row['day']: row
+        for row in days.values('day').annotate(
+            revenue_sum=Sum('revenue'), invoices_sum=Sum('invoices'), items_sum=Sum('items_sold')
+        ).order_by()
+    }
+    total_revenue = sum((row['revenue_sum'] for row in by_day.values()), Decimal(0))
+    total_invoices = sum(row['invoices_sum'] for row in by_day.values())
+    total_items = sum((row['items_sum'] for row in by_day.values()), Decimal(0))
+
+    labels, revenue, invoices = [], [], []
+    day = start
+    while day <= end:
+        row = by_day.get(day, {})
+        labels.append(day.isoformat())
+        revenue.append(_money(row.get('revenue_sum')))
+        invoices.append(row.get('invoices_sum') or 0)
+        day += timedelta(days=1)
+
+    top_items = (
+        PosDailyItemKpi.objects.filter(company_id__in=company_ids, day__range=(start, end))
+        .values('item_name')
+        .annotate(quantity_sum=Sum('quantity'), revenue_sum=Sum('revenue'))
+        .order_by('-revenue_sum', 'item_name')[:settings.POS_KPI_TOP_ITEMS]
+    )
+    payment_methods = (
+        PosDailyPaymentKpi.objects.filter(company_id__in=company_ids, day__range=(start, end))
+        .values('method')
+        .annotate(amount_sum=Sum('amount'), transactions_sum=Sum('transactions'))
+        .order_by('-amount_sum', 'method')
+    )
+    payments_total = sum((row['amount_sum'] for row in payment_methods), Decimal(0))
+    recent = (
+        PosInvoiceFact.objects.filter(company_id__in=company_ids, day__range=(start, end))
+        .order_by('-posted_at')[:settings.POS_KPI_RECENT_INVOICES]
+    )
+
+    return {
+        "summary": {
+            "total_revenue": _money(total_revenue),
+            "total_invoices": total_invoices,
+            "average_invoice_value": _money(total_revenue / total_invoices) if total_invoices else 0.0,
+            "total_items_sold": float(total_items),
+        },
+        "sales_over_time": {"labels": labels, "revenue": revenue, "invoices": invoices},
+        "top_items": [
+            {
+                "item_name": row['item_name'],
+                "quantity_sold": float(row['quantity_sum']),
+                "total_revenue": _money(row['revenue_sum']),
+                "percentage_of_total_revenue": _share(row['revenue_sum'], total_revenue),
+            }
+            for row in top_items
+        ],
+        "payment_methods": [
+            {
+                "method": row['method'],
+                "total_revenue": _money(row['amount_sum']),
+                "transaction_count": row['transactions_sum'],
+                "percentage_of_total_revenue": _share(row['amount_sum'], payments_total),
+            }
+            for row in payment_methods
+        ],
+        "recent_invoices": [
+            {
+                "invoice_id": fact.invoice_name,
+                "customer_name": fact.customer_name,
+                "timestamp": fact.posted_at.isoformat(),
+                "total_amount": _money(fact.total),
+                "status": fact.alegra_status,
+            }
+            for fact in recent
+        ],
+    }
+
+
+def get_kpis(organization_id, company_ids, start, end, version=None) -> dict:
+    """KPIs of the given companies, cached per data version when one is known."""
+    if version is None:
+        return compute_kpis(company_ids, start, end)
+    return _kpi_cache.get_or_load(
+        lambda *key_parts: compute_kpis(company_ids, start, end),
+        organization_id, ','.join(sorted(map(str, company_ids))), start, end, version,
+    )
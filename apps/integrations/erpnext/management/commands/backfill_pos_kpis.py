@@ -0,0 +1,47 @@
+import logging
+from django.core.management.base import BaseCommand
+from apps.events.models import Event
+from apps.integrations.erpnext import kpis
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    """
+    A Django management command that feeds the POS KPI rollups with the POS
+    invoice events that succeeded before the rollups existed.
+
+    New invoices are counted as their events succeed; invoices already
+    counted are skipped, so the command can be re-run safely.
+
+    Example usage:
+        python manage.py backfill_pos_kpis
+        python manage.py backfill_pos_kpis --batch-size 1000
+    """
+    help = 'Counts the already processed POS invoice events in the KPI rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of events recorded per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        events = Event.objects.filter(topic=kpis.TOPIC, status='success').order_by('created_at', 'id')
+
+        try:
+            counted = 0
+            batch = []
+            for event in events.iterator(chunk_size=batch_size):
+                batch.append(event)
+                if len(batch) >= batch_size:
+                    counted += kpis.record_invoices(batch)
+                    batch = []
+            if batch:
+                counted += kpis.record_invoices(batch)
+            self.stdout.write(self.style.SUCCESS(f'Counted {counted} POS invoice(s) in the KPI rollups.'))
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while backfilling the POS KPIs: {e}", exc_info=True)
+            self.stderr.write(self.style.ERROR('An error occurred while backfilling the POS KPIs. Check logs for details.'))
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:20
+
+import django.db.models.deletion
+import django_multitenant.mixins
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_backfill_shopify_domains'),
+        ('erpnext', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosDailyItemKpi',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('item_name', models.CharField(max_length=255)),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_item_kpis', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'day', 'item_name'), name='uniq_pos_daily_item_kpi')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='PosDailyKpi',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('invoices', models.PositiveIntegerField(default=0)),
+                ('items_sold', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_kpis', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'day'), name='uniq_pos_daily_kpi')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='PosDailyPaymentKpi',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('method', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_payment_kpis', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'day', 'method'), name='uniq_pos_daily_payment_kpi')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='PosInvoiceFact',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('event_id', models.UUIDField()),
+                ('invoice_name', models.CharField(max_length=255)),
+                ('customer_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('day', models.DateField()),
+                ('posted_at', models.DateTimeField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('items_sold', models.DecimalField(decimal_places=3, default=0, max_digits=18)),
+                ('alegra_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('alegra_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_invoice_facts', to='companies.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'posted_at'], name='erpnext_pos_fact_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'invoice_name'), name='uniq_pos_invoice_fact')],
+            },
+            bases=(django_multitenant.mixins.TenantModelMixin, models.Model),
+        ),
+    ]
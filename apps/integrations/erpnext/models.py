@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from django_multitenant.mixins import TenantModelMixin
+from apps.companies.models import Company
 
 class ErpnextCredential(TenantModelMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -11,4 +12,85 @@ class ErpnextCredential(TenantModelMixin, models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    tenant_id = 'organization_id'
\ No newline at end of file
+    tenant_id = 'organization_id'
+
+class PosInvoiceFact(TenantModelMixin, models.Model):
+    """
+    One processed POS invoice, recorded once when its event succeeds. The
+    unique (company, invoice_name) pair keeps a reprocessed invoice from being
+    counted twice in the KPI rollups; the rows also back the recent invoices.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_invoice_facts')
+    event_id = models.UUIDField()
+    invoice_name = models.CharField(max_length=255)
+    customer_name = models.CharField(max_length=255, null=True, blank=True)
+    day = models.DateField()
+    posted_at = models.DateTimeField()
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    items_sold = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    alegra_id = models.CharField(max_length=255, null=True, blank=True)
+    alegra_status = models.CharField(max_length=50, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'invoice_name'], name='uniq_pos_invoice_fact')
+        ]
+        indexes = [
+            models.Index(fields=['company', 'posted_at'], name='erpnext_pos_fact_recent_idx'),
+        ]
+
+
+class PosDailyKpi(TenantModelMixin, models.Model):
+    """Revenue, invoice count and items sold of a company on a day."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_daily_kpis')
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    invoices = models.PositiveIntegerField(default=0)
+    items_sold = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'day'], name='uniq_pos_daily_kpi')
+        ]
+
+
+class PosDailyItemKpi(TenantModelMixin, models.Model):
+    """Quantity sold and revenue of an item for a company on a day."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_daily_item_kpis')
+    day = models.DateField()
+    item_name = models.CharField(max_length=255)
+    quantity = models.DecimalField(max_digits=18, decimal_places=3, default=0)
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'day', 'item_name'], name='uniq_pos_daily_item_kpi')
+        ]
+
+
+class PosDailyPaymentKpi(TenantModelMixin, models.Model):
+    """Amount and transaction count of a payment method for a company on a day."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_daily_payment_kpis')
+    day = models.DateField()
+    method = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    transactions = models.PositiveIntegerField(default=0)
+
+    tenant_id = 'company_id'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'day', 'method'], name='uniq_pos_daily_payment_kpi')
+        ]
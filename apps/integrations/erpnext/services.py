@@ -1,8 +1,58 @@
+import hashlib
 import requests
 import logging
+from urllib.parse import urlparse
+from django.conf import settings
+from apps.integrations import transport
+from core.cache import TwoLevelCache
 
 logger = logging.getLogger(__name__)
 
+_customer_cache = TwoLevelCache(
+    'erpnext:customer',
+    ttl=settings.ERPNEXT_CUSTOMER_CACHE_TTL,
+    local_ttl=settings.ERPNEXT_CUSTOMER_LOCAL_CACHE_TTL,
+    # Every miss is followed by a create: a cached miss would make the next
+    # call create the customer again if that create failed after ERPNext stored it.
+    negative_ttl=0,
+)
+
+
+def _customer_cache_key(organization_id, site_url, email):
+    site = urlparse(site_url).netloc or site_url
+    email_hash = hashlib.sha1(email.strip().lower().encode('utf-8')).hexdigest()
+    return organization_id, site, email_hash
+
+
+def resolve_customer_name(client, organization_id, site_url, email, build_customer_data):
+    """
+    Returns the ERPNext customer name for an email, creating the customer when
+    it does not exist yet.
+
+    Resolutions are cached per (tenant, ERPNext site, email): repeat customers
+    resolve without a network call and the cache is filled straight from the
+    create_customer response. "Not found" answers are never cached, so a
+    create that failed is preceded by a fresh lookup on the next call.
+    `build_customer_data` is called only when the customer has to be created.
+    """
+    key = _customer_cache_key(organization_id, site_url, email)
+
+    def load(*_):
+        record = client.get_customer(email)
+        return record.get('name') if record else None
+
+    customer_name = _customer_cache.get_or_load(load, *key)
+    if customer_name:
+        return customer_name
+
+    logger.info(f"Customer {email} not found in ERPNext. Creating them.")
+    created = client.create_customer(build_customer_data())
+    # ERPNext wraps created documents in 'data'
+    customer_name = (created.get('data') or created).get('name')
+    if customer_name:
+        _customer_cache.set(customer_name, *key)
+    return customer_name
+
 class ERPNextService:
     """
     A service for interacting with the ERPNext API.
@@ -24,7 +74,7 @@ class ERPNextService:
         """Helper method to make POST requests."""
         url = f"{self.base_url}{endpoint}"
         try:
-            response = requests.post(url, headers=self.headers, json=data)
+            response = transport.post('erpnext', url, headers=self.headers, json=data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -60,7 +110,7 @@ class ERPNextService:
         }
         url = f"{self.base_url}/api/resource/Customer"
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = transport.get('erpnext', url, headers=self.headers, params=params)
             response.raise_for_status()
             customers = response.json().get('data', [])
             return customers[0] if customers else None
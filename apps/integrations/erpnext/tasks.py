@@ -4,8 +4,13 @@ from django.db import transaction
 from urllib.parse import urlparse
 from core.celery import app
 from apps.events.models import Event
+from apps.events.retries import fail_event
+from apps.events.services import reschedule_event
 from apps.companies.models import Company
+from apps.companies.services import get_company_by_shopify_domain
+from apps.integrations.circuitbreaker import CircuitOpenError
 from apps.integrations.erpnext.models import ErpnextCredential
+from apps.integrations.erpnext.services import resolve_customer_name
 from apps.organizations.models import Organization
 from apps.workflows.services import ERPNextClient
 
@@ -84,6 +89,97 @@ def _transform_shopify_to_erpnext_customer(shopify_customer_data):
     }
 
 
+def handle_shopify_order_event(event: Event):
+    """
+    Creates and submits the ERPNext Sales Invoice for a claimed Shopify order event.
+    Stores the ERPNext response on the event (without saving it) and raises on failure.
+    """
+    payload = event.get_payload()
+
+    # Extract hostname from order_status_url in the payload
+    order_status_url = payload.get('order_status_url')
+    if not order_status_url:
+        raise ValueError("Shopify payload is missing order_status_url for company identification.")
+    hostname = urlparse(order_status_url).hostname
+
+    # Find the Company using the hostname, mirroring the view's logic
+    company = get_company_by_shopify_domain(hostname, organization_id=event.organization_id)
+    if not company:
+        raise Company.DoesNotExist(f"Company with Shopify domain {hostname} not found for organization {event.organization_id}")
+    
+    # Retrieve ERPNext credentials from ErpnextCredential model
+    erp_creds = ErpnextCredential.objects.get(organization=event.organization, is_active=True)
+
+    # Retrieve ERPNext config from company metadata, handling potential nesting
+    erpnext_config = company.metadata.get('erpnext_config')
+    if not erpnext_config and isinstance(company.metadata.get('metadata'), dict):
+        erpnext_config = company.metadata.get('metadata').get('erpnext_config')
+    erpnext_config = erpnext_config or {}  # Default to an empty dict if still not found
+
+    # Get source_warehouse from the config
+    source_warehouse = erpnext_config.get('source_warehouse')
+
+    # Get default_payment_mode from the config
+    default_payment_mode = erpnext_config.get('default_payment_mode')
+
+    # Get the company name for ERPNext from the Company model's name field
+    erpnext_company_name = company.name
+
+    missing_config = []
+    if not erp_creds.erpnext_site_url: missing_config.append('erpnext_site_url')
+    if not erp_creds.api_key: missing_config.append('api_key')
+    if not erp_creds.api_secret: missing_config.append('api_secret')
+    if not erpnext_company_name: missing_config.append('company_name (Company model)')
+    if not source_warehouse: missing_config.append('source_warehouse (metadata)')
+    if not default_payment_mode: missing_config.append('default_payment_mode (metadata)')
+
+    if missing_config:
+        raise ValueError(f"Missing ERPNext configuration for Company {company.id}: {', '.join(missing_config)}")
+
+    erp_client = ERPNextClient(
+        api_url=erp_creds.erpnext_site_url,
+        api_key=erp_creds.api_key,
+        api_secret=erp_creds.api_secret
+    )
+
+    shopify_customer = payload.get('customer')
+    if not shopify_customer or not shopify_customer.get('email'):
+        raise ValueError("Customer email not found in Shopify payload.")
+    
+    customer_email = shopify_customer['email']
+    
+    # Check if customer exists (through the customer cache), if not, create them.
+    erpnext_customer_name_for_invoice = resolve_customer_name(
+        erp_client,
+        event.organization_id,
+        erp_creds.erpnext_site_url,
+        customer_email,
+        lambda: _transform_shopify_to_erpnext_customer(shopify_customer),
+    )
+
+
+    invoice_data = _transform_shopify_to_erpnext(
+        payload,
+        erpnext_customer_name_for_invoice,
+        erpnext_company_name,
+        source_warehouse,
+        default_payment_mode
+    )
+    
+    logger.info(f"Creating Sales Invoice in ERPNext for Shopify order: {payload.get('name')}")
+    erpnext_response = erp_client.create_document("Sales Invoice", invoice_data)
+    
+    # Extract the name of the created invoice to submit it
+    invoice_name = erpnext_response.get('data', {}).get('name')
+    if not invoice_name:
+        raise ValueError("ERPNext did not return a name for the created Sales Invoice.")
+    
+    logger.info(f"Submitting Sales Invoice {invoice_name} in ERPNext.")
+    erp_client.submit_document("Sales Invoice", invoice_name)
+
+    event.response = erpnext_response
+
+
 @app.task(bind=True, max_retries=3, default_retry_delay=60)
 def create_erpnext_order_from_shopify_event(self, event_id):
     """
@@ -101,112 +197,26 @@ def create_erpnext_order_from_shopify_event(self, event_id):
 
             event.status = 'processing'
             event.attempts += 1
-            event.save()
+            event.save(update_fields=['status', 'attempts', 'updated_at'])
 
     except Event.DoesNotExist:
         logger.error(f"Event with id {event_id} not found.")
         return
 
     try:
-        # Extract hostname from order_status_url in the payload
-        order_status_url = event.payload.get('order_status_url')
-        if not order_status_url:
-            raise ValueError("Shopify payload is missing order_status_url for company identification.")
-        hostname = urlparse(order_status_url).hostname
-
-        # Find the Company using the hostname, mirroring the view's logic
-        company = Company.objects.filter(organization_id=event.organization_id, metadata__shopify_domain=hostname).first()
-        if not company:
-            company = Company.objects.filter(organization_id=event.organization_id, metadata__metadata__shopify_domain=hostname).first()
-        if not company:
-            raise Company.DoesNotExist(f"Company with Shopify domain {hostname} not found for organization {event.organization_id}")
-        
-        # Retrieve ERPNext credentials from ErpnextCredential model
-        erp_creds = ErpnextCredential.objects.get(organization=event.organization, is_active=True)
-
-        # Retrieve ERPNext config from company metadata, handling potential nesting
-        erpnext_config = company.metadata.get('erpnext_config')
-        if not erpnext_config and isinstance(company.metadata.get('metadata'), dict):
-            erpnext_config = company.metadata.get('metadata').get('erpnext_config')
-        erpnext_config = erpnext_config or {}  # Default to an empty dict if still not found
-
-        # Get source_warehouse from the config
-        source_warehouse = erpnext_config.get('source_warehouse')
-
-        # Get default_payment_mode from the config
-        default_payment_mode = erpnext_config.get('default_payment_mode')
-
-        # Get the company name for ERPNext from the Company model's name field
-        erpnext_company_name = company.name
-
-        missing_config = []
-        if not erp_creds.erpnext_site_url: missing_config.append('erpnext_site_url')
-        if not erp_creds.api_key: missing_config.append('api_key')
-        if not erp_creds.api_secret: missing_config.append('api_secret')
-        if not erpnext_company_name: missing_config.append('company_name (Company model)')
-        if not source_warehouse: missing_config.append('source_warehouse (metadata)')
-        if not default_payment_mode: missing_config.append('default_payment_mode (metadata)')
-
-        if missing_config:
-            raise ValueError(f"Missing ERPNext configuration for Company {company.id}: {', '.join(missing_config)}")
-
-        erp_client = ERPNextClient(
-            api_url=erp_creds.erpnext_site_url,
-            api_key=erp_creds.api_key,
-            api_secret=erp_creds.api_secret
-        )
-
-        shopify_customer = event.payload.get('customer')
-        if not shopify_customer or not shopify_customer.get('email'):
-            raise ValueError("Customer email not found in Shopify payload.")
-        
-        customer_email = shopify_customer['email']
-        
-        # Check if customer exists, if not, create them.
-        erpnext_customer_record = erp_client.get_customer(customer_email)
-        if not erpnext_customer_record:
-            logger.info(f"Customer {customer_email} not found in ERPNext. Creating them.")
-            customer_data = _transform_shopify_to_erpnext_customer(shopify_customer)
-            erpnext_customer_record = erp_client.create_customer(customer_data)
-            # ERPNext create_customer returns a dict with 'name' (the customer ID/name)
-            erpnext_customer_name_for_invoice = erpnext_customer_record.get('name')
-        else:
-            erpnext_customer_name_for_invoice = erpnext_customer_record.get('name')
-
-
-        invoice_data = _transform_shopify_to_erpnext(
-            event.payload,
-            erpnext_customer_name_for_invoice,
-            erpnext_company_name,
-            source_warehouse,
-            default_payment_mode
-        )
-        
-        logger.info(f"Creating Sales Invoice in ERPNext for Shopify order: {event.payload.get('name')}")
-        erpnext_response = erp_client.create_document("Sales Invoice", invoice_data)
-        
-        # Extract the name of the created invoice to submit it
-        invoice_name = erpnext_response.get('data', {}).get('name')
-        if not invoice_name:
-            raise ValueError("ERPNext did not return a name for the created Sales Invoice.")
-        
-        logger.info(f"Submitting Sales Invoice {invoice_name} in ERPNext.")
-        erp_client.submit_document("Sales Invoice", invoice_name)
-        
+        handle_shopify_order_event(event)
+
         event.status = 'success'
-        event.response = erpnext_response
-        event.save()
-        logger.info(f"Successfully processed event {event_id}. ERPNext response: {erpnext_response}")
+        event.save(update_fields=['status', 'response', 'updated_at'])
+        logger.info(f"Successfully processed event {event_id}. ERPNext response: {event.response}")
 
+    except CircuitOpenError as e:
+        reschedule_event(event, e.retry_after, str(e))
     except (ErpnextCredential.DoesNotExist, Organization.DoesNotExist, Company.DoesNotExist) as e:
         logger.error(f"Configuration error for event {event_id}: {e}", exc_info=True)
-        event.status = 'failed'
-        event.error = f"Configuration error: {e}"
-        event.save()
-        raise # Re-raise to allow Celery to handle retries if configured
+        fail_event(event, f"Configuration error: {e}")
+        raise
     except Exception as e:
         logger.error(f"Failed to process event {event_id}: {str(e)}", exc_info=True)
-        event.status = 'failed'
-        event.error = str(e)
-        event.save()
-        # self.retry(exc=e) # Consider retrying for transient API errors
\ No newline at end of file
+        # Retried with backoff by the retry sweep, or dead-lettered
+        fail_event(event, str(e))
\ No newline at end of file
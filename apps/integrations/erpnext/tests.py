@@ -1,10 +1,14 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from unittest.mock import patch, MagicMock
+from requests.exceptions import Timeout
 from apps.companies.models import Company
 from apps.organizations.models import Organization
 from apps.events.models import Event
 from apps.integrations.erpnext.tasks import create_erpnext_order_from_shopify_event
 from apps.integrations.erpnext.models import ErpnextCredential
+from apps.integrations.erpnext import services as erpnext_services
+from apps.integrations.erpnext import kpis
 import json
 
 class ShopifyToErpNextTest(TestCase):
@@ -114,3 +118,94 @@ class ShopifyToErpNextTest(TestCase):
         self.assertEqual(event.status, 'failed')
         self.assertIn("No valid line items", event.error)
 
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CustomerResolutionCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        erpnext_services._customer_cache.local.clear()
+        self.client_mock = MagicMock()
+
+    def _resolve(self):
+        return erpnext_services.resolve_customer_name(
+            self.client_mock, "org-id", "https://erpnext.example.com", "Customer@Example.com",
+            lambda: {"email_id": "customer@example.com"}
+        )
+
+    def test_repeat_customers_skip_erpnext(self):
+        self.client_mock.get_customer.return_value = {"name": "CUST-0001"}
+
+        self.assertEqual(self._resolve(), "CUST-0001")
+        self.assertEqual(self._resolve(), "CUST-0001")
+        self.client_mock.get_customer.assert_called_once()
+
+    def test_created_customer_is_cached(self):
+        self.client_mock.get_customer.return_value = None
+        self.client_mock.create_customer.return_value = {"data": {"name": "CUST-0002"}}
+
+        self.assertEqual(self._resolve(), "CUST-0002")
+        self.assertEqual(self._resolve(), "CUST-0002")
+        self.client_mock.get_customer.assert_called_once()
+        self.client_mock.create_customer.assert_called_once()
+
+    def test_failed_create_is_looked_up_again(self):
+        self.client_mock.get_customer.side_effect = [None, {"name": "CUST-0003"}]
+        self.client_mock.create_customer.side_effect = Timeout("read timed out")
+
+        with self.assertRaises(Timeout):
+            self._resolve()
+        # ERPNext stored the customer before the timeout: found, not created twice.
+        self.assertEqual(self._resolve(), "CUST-0003")
+        self.client_mock.create_customer.assert_called_once()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PosInvoiceKpiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        self.company = Company.objects.create(organization=self.organization, name="Test Company")
+
+    def _create_event(self, name, **payload):
+        return Event.objects.create(
+            organization=self.organization, source='erpnext', topic='pos.invoice.received', status='success',
+            payload={
+                "name": name, "company": "Test Company", "customer_name": "John Doe",
+                "posting_date": "2025-11-01", "posting_time": "10:00:00", "grand_total": 30,
+                "items": [{"item_name": "Croissant", "qty": 2, "amount": 20}, {"item_name": "Cafe", "qty": 1, "amount": 10}],
+                "payments": [{"mode_of_payment": "Cash", "amount": 30}],
+                **payload,
+            },
+        )
+
+    def _get(self, **headers):
+        return self.client.get(
+            '/api/integrations/erpnext/pos-invoice-kpis/?start_date=2025-11-01&end_date=2025-11-02',
+            headers={'X-Organization-Slug': 'test-org', **headers},
+        )
+
+    def test_rollups_are_incremented_once_per_invoice(self):
+        first = self._create_event("POS-0001")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(kpis.record_invoices([first, self._create_event("POS-0002", grand_total=12)]), 2)
+        # A resent invoice is not counted twice.
+        self.assertEqual(kpis.record_invoices([first]), 0)
+
+        response = self._get()
+        data = response.json()
+        self.assertEqual(data['summary']['total_revenue'], 42.0)
+        self.assertEqual(data['summary']['total_invoices'], 2)
+        self.assertEqual(data['sales_over_time']['invoices'], [2, 0])
+        self.assertEqual(data['top_items'][0], {
+            "item_name": "Croissant", "quantity_sold": 4.0, "total_revenue": 40.0, "percentage_of_total_revenue": 95.24,
+        })
+        self.assertEqual(data['payment_methods'][0]['transaction_count'], 2)
+        self.assertEqual(data['recent_invoices'][0]['invoice_id'], "POS-0002")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(**{'If-None-Match': response['ETag']}).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kpis.record_invoices([self._create_event("POS-0003")])
+        self.assertEqual(self._get(**{'If-None-Match': response['ETag']}).json()['summary']['total_invoices'], 3)
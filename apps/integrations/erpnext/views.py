@@ -1,78 +1,67 @@
+from datetime import date
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from apps.companies.models import Company
+from . import kpis
+
+def _date_param(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
 
 class PosInvoiceKpiView(APIView):
     """
     API View to retrieve Key Performance Indicators (KPIs) for POS Invoices from ERPNext.
     """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Read-only: no request transaction, so a 304 costs no database round trip.
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
     def get(self, request, *args, **kwargs):
         """
-        Returns a summary of POS invoice data.
+        Returns a summary of POS invoice data (see main/ERPNext_POS_INVOICE_API.md),
+        read from the daily KPI rollups of the request organization, optionally
+        restricted to one company (`company`, by name). Supports If-None-Match.
         """
-        # TODO: Replace this dummy data with actual data from an ERPNext service call.
-        # The data structure is based on main/ERPNext_POS_INVOICE_API.md
-        
-        # Extract query params
-        start_date = request.query_params.get('start_date', '2025-11-01')
-        end_date = request.query_params.get('end_date', '2025-11-15')
+        organization = getattr(request, 'organization', None)
+        if not organization:
+            return Response(
+                {"error": "Organization context not found. Please provide the X-Organization-Slug header."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        today = timezone.localdate()
+        start_date = _date_param(request, 'start_date', date(today.year, today.month, 1))
+        end_date = _date_param(request, 'end_date', today)
+        if start_date is None or end_date is None or start_date > end_date:
+            return Response(
+                {"error": "start_date and end_date must be YYYY-MM-DD dates, start_date not after end_date."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        company = request.query_params.get('company', '').strip().lower()
+        version = kpis.data_version(organization.id)
+        etag = kpis.etag(organization.id, company, start_date, end_date, version) if version else None
+        if etag and etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        companies = Company.objects.filter(organization=organization)
+        if company:
+            companies = companies.filter(name__iexact=company)
+        company_ids = list(companies.values_list('id', flat=True))
 
-        dummy_data = {
-          "summary": {
-            "total_revenue": 15250.75,
-            "total_invoices": 350,
-            "average_invoice_value": 43.57,
-            "total_items_sold": 890
-          },
-          "sales_over_time": {
-            "labels": ["2025-11-01", "2025-11-02", "2025-11-03"],
-            "revenue": [1200.50, 1500.00, 1350.25],
-            "invoices": [25, 30, 28]
-          },
-          "top_items": [
-            {
-              "item_name": "Cafe Americano",
-              "quantity_sold": 150,
-              "total_revenue": 450.00,
-              "percentage_of_total_revenue": 2.95
-            },
-            {
-              "item_name": "Croissant",
-              "quantity_sold": 120,
-              "total_revenue": 360.00,
-              "percentage_of_total_revenue": 2.36
-            }
-          ],
-          "payment_methods": [
-            {
-              "method": "Credit Card",
-              "total_revenue": 9500.00,
-              "transaction_count": 210,
-              "percentage_of_total_revenue": 62.29
-            },
-            {
-              "method": "Cash",
-              "total_revenue": 5750.75,
-              "transaction_count": 140,
-              "percentage_of_total_revenue": 37.71
-            }
-          ],
-          "recent_invoices": [
-            {
-              "invoice_id": "POS-00350",
-              "customer_name": "John Doe",
-              "timestamp": "2025-11-15T14:30:00Z",
-              "total_amount": 55.25,
-              "status": "Paid"
-            },
-            {
-              "invoice_id": "POS-00349",
-              "customer_name": "Jane Smith",
-              "timestamp": "2025-11-15T14:25:10Z",
-              "total_amount": 32.00,
-              "status": "Paid"
-            }
-          ]
-        }
-        
-        return Response(dummy_data, status=status.HTTP_200_OK)
+        data = kpis.get_kpis(organization.id, company_ids, start_date, end_date, version)
+        headers = {'Cache-Control': 'private, no-cache'}
+        if etag:
+            headers['ETag'] = etag
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
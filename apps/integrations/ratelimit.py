@@ -0,0 +1,150 @@
+"""
+Distributed token-bucket rate limiter for the integration clients.
+
+Buckets live in Redis, so every web and worker process shares the quota of an
+upstream API. A bucket is keyed per integration and per credential (or host),
+refills at `rate` tokens per second up to `burst`, and can be paused when the
+upstream answers with a Retry-After header. Redis' own clock is used, so hosts
+with skewed clocks see the same bucket state.
+
+If Redis is unavailable the limiter fails open: calls go through unthrottled.
+"""
+import hashlib
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ratelimit'
+
+# Takes a token. Returns 0 when granted, otherwise the milliseconds to wait.
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'blocked_until')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+if blocked_until > now then
+    return blocked_until - now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 60000)
+return wait
+"""
+
+# Pauses a bucket for ARGV[1] milliseconds (never shortens an existing pause).
+_PAUSE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local until_ms = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+if until_ms > current then
+    redis.call('HSET', KEYS[1], 'blocked_until', until_ms)
+end
+redis.call('PEXPIRE', KEYS[1], math.max(tonumber(ARGV[1]) + 60000, redis.call('PTTL', KEYS[1])))
+return until_ms
+"""
+
+_scripts = {}
+_scripts_lock = threading.Lock()
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no token became available within the maximum wait."""
+
+
+def _get_script(name, source):
+    script = _scripts.get(name)
+    if script is None:
+        from django_redis import get_redis_connection
+        with _scripts_lock:
+            script = _scripts.get(name)
+            if script is None:
+                script = _scripts[name] = get_redis_connection('default').register_script(source)
+    return script
+
+
+def get_limit(integration: str):
+    """Returns the {'rate', 'burst'} limit of an integration, or None if it is unlimited."""
+    limit = settings.INTEGRATION_RATE_LIMITS.get(integration)
+    if not limit or not limit.get('rate'):
+        return None
+    return limit
+
+
+def bucket_key(integration: str, key: str) -> str:
+    # Credentials must not end up in Redis keys.
+    digest = hashlib.sha1(str(key).encode()).hexdigest()[:16]
+    return f"{KEY_PREFIX}:{integration}:{digest}"
+
+
+def acquire(integration: str, key: str, max_wait: float = None):
+    """
+    Blocks until the bucket of (integration, key) grants a token.
+    Raises RateLimitExceeded if that would take longer than `max_wait` seconds.
+    """
+    limit = get_limit(integration)
+    if limit is None:
+        return
+
+    max_wait = settings.INTEGRATION_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    redis_key = bucket_key(integration, key)
+    rate = limit['rate']
+    burst = limit.get('burst') or max(1, int(rate))
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        try:
+            wait_ms = _get_script('acquire', _ACQUIRE_SCRIPT)(keys=[redis_key], args=[rate, burst])
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable for {integration}, letting the call through: {e}")
+            return
+
+        if not wait_ms:
+            return
+
+        wait = int(wait_ms) / 1000
+        if time.monotonic() + wait > deadline:
+            raise RateLimitExceeded(f"Rate limit of {integration} exhausted, next token in {wait:.1f}s.")
+        logger.debug(f"Rate limit of {integration} reached, waiting {wait:.2f}s.")
+        time.sleep(wait)
+
+
+def pause(integration: str, key: str, seconds: float):
+    """Stops handing out tokens for (integration, key) during `seconds`."""
+    try:
+        _get_script('pause', _PAUSE_SCRIPT)(keys=[bucket_key(integration, key)], args=[int(seconds * 1000)])
+    except Exception as e:
+        logger.warning(f"Rate limiter unavailable pausing {integration}: {e}")
+
+
+def parse_retry_after(value) -> float:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+    Returns the delay in seconds, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class RouterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.integrations.router'
+
+    def ready(self):
+        from apps.events.registry import register
+        register(
+            'order.create',
+            handler='apps.events.services.handle_order_event',
+            task='apps.integrations.router.tasks.process_order_event',
+            # Identical orders are legitimate (a customer ordering the same again).
+            dedup_window=0,
+        )
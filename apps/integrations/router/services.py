@@ -1,6 +1,7 @@
 import requests
 import logging
 from django.conf import settings
+from apps.integrations import transport
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +35,7 @@ class CoreBackendService:
             print(f"📡 [ROUTER] SENDING TO CORE BACKEND: {url}")
             print(f"Payload outgoing: {data}")
             logger.info(f"Sending bulk register request to {url}")
-            response = requests.post(url, json=data, headers=self.headers)
+            response = transport.post('core_backend', url, json=data, headers=self.headers)
             response.raise_for_status()
             
             response_data = response.json()
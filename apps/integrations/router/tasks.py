@@ -4,6 +4,9 @@ from django.conf import settings
 from django.db import transaction
 from core.celery import app
 from apps.events.models import Event
+from apps.events.retries import fail_event
+from apps.events.services import reschedule_event
+from apps.integrations.circuitbreaker import CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +27,7 @@ def process_order_event(self, event_id):
 
             event.status = 'processing'
             event.attempts += 1
-            event.save()
+            event.save(update_fields=['status', 'attempts', 'updated_at'])
 
     except Event.DoesNotExist:
         logger.error(f"Event with id {event_id} not found.")
@@ -38,9 +41,12 @@ def process_order_event(self, event_id):
         
         # Success
         event.status = 'success'
-        event.save()
+        event.save(update_fields=['status', 'response', 'updated_at'])
         logger.info(f"Successfully processed order event {event_id}. Response: {event.response}")
 
+    except CircuitOpenError as e:
+        # The backend is known to be down: retried once the circuit may close, without using an attempt
+        reschedule_event(event, e.retry_after, str(e))
     except Exception as e:
         logger.error(f"Failed to process order event {event_id}: {e}", exc_info=True)
         
@@ -52,12 +58,5 @@ def process_order_event(self, event_id):
              except:
                  pass
 
-        event.status = 'failed'
-        event.error = error_msg
-        event.save()
-        
-        # Retry if appropriate (e.g. connection error)
-        # We need to import requests to check type if we want to be specific, 
-        # or just retry on any exception that isn't a permanent failure.
-        # For now, let's just log and fail, or retry blindly.
-        # raise self.retry(exc=e)
+        # Retried with backoff by the retry sweep, or dead-lettered
+        fail_event(event, error_msg)
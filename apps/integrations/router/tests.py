@@ -1,3 +1,25 @@
+from unittest.mock import patch
 from django.test import TestCase
+from django.utils import timezone
+from apps.events.models import Event
+from apps.integrations.circuitbreaker import CircuitOpenError
+from apps.integrations.router.tasks import process_order_event
+from apps.organizations.models import Organization
 
-# Create your tests here.
+
+class ProcessOrderEventTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    @patch('apps.events.services.handle_order_event')
+    def test_open_circuit_reschedules_without_failing(self, mock_handle):
+        mock_handle.side_effect = CircuitOpenError('core-backend', 30)
+        event = Event.objects.create(
+            organization=self.organization, source='shopify', topic='order.create', payload={}, status='failed'
+        )
+
+        process_order_event(str(event.id))
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('pending', 0))
+        self.assertGreater(event.next_attempt_at, timezone.now())
@@ -0,0 +1,68 @@
+from unittest.mock import patch, MagicMock
+import requests
+from django.test import SimpleTestCase, override_settings
+from apps.integrations import ratelimit, transport
+
+
+class TransportRateLimitTest(SimpleTestCase):
+    @patch('apps.integrations.transport.time.sleep')
+    @patch('apps.integrations.transport.ratelimit.pause')
+    @patch('apps.integrations.transport.ratelimit.acquire')
+    @patch('apps.integrations.transport.get_session')
+    def test_throttled_calls_honour_retry_after(self, mock_session, mock_acquire, mock_pause, mock_sleep):
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '3'})
+        ok = MagicMock(status_code=200, headers={})
+        mock_session.return_value.request.side_effect = [throttled, ok]
+
+        response = transport.post('alegra', 'https://api.alegra.com/api/v1/invoices', auth=('user', 'token'))
+
+        self.assertIs(response, ok)
+        self.assertEqual(mock_acquire.call_count, 2)
+        mock_acquire.assert_called_with('alegra', 'user')
+        mock_pause.assert_called_once_with('alegra', 'user', 3.0)
+        mock_sleep.assert_called_once_with(3.0)
+
+    def test_retry_after_accepts_seconds_and_http_dates(self):
+        self.assertEqual(ratelimit.parse_retry_after('120'), 120.0)
+        self.assertEqual(ratelimit.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(ratelimit.parse_retry_after('soon'))
+
+
+@patch.object(transport, '_sessions_pid', None)
+@patch.object(transport, '_sessions', {})
+class TransportSessionTest(SimpleTestCase):
+    def test_sessions_are_reused_per_integration(self):
+        session = transport.get_session('alegra')
+
+        self.assertIs(transport.get_session('alegra'), session)
+        self.assertIsNot(transport.get_session('erpnext'), session)
+        with patch('apps.integrations.transport.os.getpid', return_value=-1):
+            self.assertIsNot(transport.get_session('alegra'), session)
+
+    @override_settings(INTEGRATION_HTTP_POOL_CONNECTIONS=3, INTEGRATION_HTTP_POOL_MAXSIZE=7)
+    def test_pool_sizes_come_from_settings(self):
+        session = transport.get_session('alegra')
+
+        for url in ('https://api.alegra.com', 'http://erp.local'):
+            adapter = session.get_adapter(url)
+            self.assertEqual((adapter._pool_connections, adapter._pool_maxsize), (3, 7))
+
+    @patch('apps.integrations.transport.ratelimit.acquire')
+    @patch('apps.integrations.transport.get_session')
+    def test_latency_hooks_see_successes_and_errors(self, mock_session, mock_acquire):
+        hook = MagicMock()
+        ok = MagicMock(status_code=200, headers={})
+        error = requests.exceptions.ConnectionError("refused")
+        mock_session.return_value.request.side_effect = [ok, error]
+        url = 'https://erp.local/api/resource/Customer'
+
+        with patch.object(transport, '_latency_hooks', [hook]):
+            transport.get('erpnext', url)
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                transport.get('erpnext', url)
+
+        self.assertEqual(hook.call_count, 2)
+        self.assertEqual(hook.call_args_list[0].args[:4], ('erpnext', 'GET', url, ok))
+        self.assertIsNone(hook.call_args_list[0].args[5])
+        self.assertIsNone(hook.call_args_list[1].args[3])
+        self.assertIs(hook.call_args_list[1].args[5], error)
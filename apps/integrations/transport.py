@@ -0,0 +1,174 @@
+"""
+Shared HTTP transport for the integration clients (ERPNext, Alegra, Core Backend).
+
+Each integration gets its own requests.Session with a keep-alive connection
+pool per host, so consecutive calls to the same site reuse the TCP/TLS
+connection instead of paying a new handshake. Every call gets the
+integration's default timeout, goes through the host's circuit breaker and the
+integration's rate limiter, and reports its latency to the registered hooks.
+"""
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from apps.integrations import circuitbreaker, ratelimit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = (5, 30)
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+_latency_hooks = []
+
+
+def register_latency_hook(hook):
+    """
+    Registers a callable invoked after every call as
+    hook(integration, method, url, response, elapsed, error).
+    `response` is None when the call raised, `elapsed` is in seconds.
+    """
+    _latency_hooks.append(hook)
+    return hook
+
+
+def _log_latency(integration, method, url, response, elapsed, error):
+    status_code = response.status_code if response is not None else type(error).__name__
+    logger.debug(f"[{integration}] {method} {urlparse(url).netloc} -> {status_code} in {elapsed * 1000:.0f} ms")
+
+
+register_latency_hook(_log_latency)
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.INTEGRATION_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.INTEGRATION_HTTP_POOL_MAXSIZE,
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(integration: str) -> requests.Session:
+    """
+    Returns the pooled session of an integration. Sessions are created once per
+    process, so forked workers never share sockets with their parent.
+    """
+    global _sessions, _sessions_pid
+    pid = os.getpid()
+    if _sessions_pid != pid:
+        with _sessions_lock:
+            if _sessions_pid != pid:
+                _sessions = {}
+                _sessions_pid = pid
+
+    session = _sessions.get(integration)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(integration)
+            if session is None:
+                session = _sessions[integration] = _build_session()
+    return session
+
+
+def get_timeout(integration: str):
+    """Returns the (connect, read) timeout configured for an integration."""
+    timeout = settings.INTEGRATION_HTTP_TIMEOUTS.get(integration, DEFAULT_TIMEOUT)
+    return tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+
+
+def _rate_key(url: str, kwargs: dict) -> str:
+    """
+    Identifies the quota a call counts against: the basic-auth user (Alegra
+    credentials) when given, otherwise the upstream host (one ERPNext site or
+    Core Backend per host).
+    """
+    auth = kwargs.get('auth')
+    if isinstance(auth, (list, tuple)) and auth:
+        return str(auth[0])
+    return urlparse(url).netloc
+
+
+def _send(integration: str, method: str, url: str, **kwargs) -> requests.Response:
+    response = None
+    error = None
+    start = time.monotonic()
+    try:
+        response = get_session(integration).request(method, url, **kwargs)
+        return response
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.monotonic() - start
+        for hook in _latency_hooks:
+            try:
+                hook(integration, method, url, response, elapsed, error)
+            except Exception:
+                logger.exception(f"Latency hook {hook!r} failed.")
+
+
+def request(integration: str, method: str, url: str, rate_key: str = None, **kwargs) -> requests.Response:
+    """
+    Sends a request through the shared session of `integration`.
+    Accepts the same keyword arguments as requests.request.
+
+    Calls to a host whose circuit is open fail fast with CircuitOpenError.
+    Calls are throttled by the integration's distributed rate limiter, keyed by
+    `rate_key` (derived from the credentials or host by default). A 429 answer
+    pauses the bucket for its Retry-After and the call is retried up to
+    INTEGRATION_RATE_LIMIT_RETRIES times, so it doesn't cost the event an attempt.
+    """
+    kwargs.setdefault('timeout', get_timeout(integration))
+    rate_key = rate_key or _rate_key(url, kwargs)
+    host = urlparse(url).netloc
+
+    retries = settings.INTEGRATION_RATE_LIMIT_RETRIES
+    for attempt in range(retries + 1):
+        report = circuitbreaker.before_call(host)
+        ratelimit.acquire(integration, rate_key)
+        try:
+            response = _send(integration, method, url, **kwargs)
+        except Exception as e:
+            if circuitbreaker.is_failure(error=e):
+                circuitbreaker.record_failure(host)
+            raise
+
+        if circuitbreaker.is_failure(response=response):
+            circuitbreaker.record_failure(host)
+        elif report:
+            circuitbreaker.record_success(host)
+
+        if response.status_code != 429:
+            return response
+
+        retry_after = ratelimit.parse_retry_after(response.headers.get('Retry-After'))
+        retry_after = 1.0 if retry_after is None else retry_after
+        ratelimit.pause(integration, rate_key, retry_after)
+        if attempt == retries or retry_after > settings.INTEGRATION_RATE_LIMIT_MAX_WAIT:
+            return response
+        logger.warning(f"[{integration}] {method} {urlparse(url).netloc} throttled, retrying in {retry_after:.1f}s.")
+        time.sleep(retry_after)
+    return response
+
+
+def get(integration: str, url: str, **kwargs) -> requests.Response:
+    return request(integration, 'GET', url, **kwargs)
+
+
+def post(integration: str, url: str, **kwargs) -> requests.Response:
+    return request(integration, 'POST', url, **kwargs)
+
+
+def put(integration: str, url: str, **kwargs) -> requests.Response:
+    return request(integration, 'PUT', url, **kwargs)
@@ -0,0 +1,110 @@
+"""
+Async webhook ingestion endpoints, served through core.asgi.
+
+They only verify the request, persist the event and acknowledge with 202.
+Everything else happens after the commit, through the outbox dispatch, so a
+delivery holds no worker thread while it waits on the database or the broker.
+"""
+import json
+import logging
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from apps.events.ingestion import DuplicateEvent, aingest_event
+from .views import find_company_by_shopify_domain, get_shopify_config, verify_shopify_webhook
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWebhookView(View):
+    """
+    Base class for the async webhook views. ATOMIC_REQUESTS cannot wrap async
+    views, so they run in autocommit mode and aingest_event opens the
+    transaction of each delivery itself.
+    """
+    http_method_names = ['post']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        return csrf_exempt(transaction.non_atomic_requests(view))
+
+    def parse_payload(self, request):
+        try:
+            payload = json.loads(request.body)
+        except (TypeError, ValueError):
+            return None
+        return payload if isinstance(payload, dict) else None
+
+
+class AsyncErpNextPosInvoiceWebhookView(AsyncWebhookView):
+    async def post(self, request, *args, **kwargs):
+        """
+        Receives a POS invoice webhook from ERPNext and stores it as a pending event.
+        """
+        organization = getattr(request, 'organization', None)
+        if organization is None:
+            logger.warning("Webhook received without organization context.")
+            return JsonResponse({"error": "Organization context not found."}, status=400)
+
+        payload = self.parse_payload(request)
+        if payload is None:
+            return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+
+        try:
+            event = await aingest_event(organization.id, 'erpnext', 'pos.invoice.received', payload)
+        except DuplicateEvent:
+            return JsonResponse({"message": "Duplicate webhook received and ignored"}, status=200)
+        except Exception as e:
+            logger.error(f"Failed to create event for organization {organization.slug}: {e}", exc_info=True)
+            return JsonResponse({"error": "Failed to process webhook."}, status=500)
+
+        return JsonResponse({"message": "Webhook accepted for processing", "event_id": str(event.id)}, status=202)
+
+
+class AsyncShopifyOrderWebhookView(AsyncWebhookView):
+    async def post(self, request, *args, **kwargs):
+        """
+        Receives an orders/create webhook from Shopify, verifies its signature
+        and stores it as a pending event.
+        """
+        payload = self.parse_payload(request)
+        if payload is None:
+            return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
+
+        order_status_url = payload.get('order_status_url')
+        if not order_status_url:
+            return JsonResponse({'error': 'Payload is missing order_status_url'}, status=400)
+
+        hostname = urlparse(order_status_url).hostname
+        company = await sync_to_async(find_company_by_shopify_domain)(hostname)
+        if not company:
+            return JsonResponse({'error': f'Company with Shopify domain {hostname} not found'}, status=404)
+
+        shopify_config = get_shopify_config(company)
+        if shopify_config.get('verify_hmac', True) is True:
+            webhook_secret = shopify_config.get('webhook_secret')
+            if not webhook_secret:
+                logger.error(f"HMAC verification enabled but webhook_secret missing for company {company.id}")
+                return JsonResponse({"error": "HMAC verification enabled but secret not configured."}, status=400)
+            if not verify_shopify_webhook(request, webhook_secret):
+                logger.warning(f"Invalid Shopify webhook signature received for company {company.id}.")
+                return JsonResponse({"error": "Invalid signature"}, status=403)
+        else:
+            logger.warning(f"HMAC verification skipped for company {company.id} as per configuration.")
+
+        webhook_id = request.headers.get('X-Shopify-Webhook-Id')
+        if not webhook_id:
+            return JsonResponse({'error': 'Missing X-Shopify-Webhook-Id header'}, status=400)
+
+        try:
+            await aingest_event(company.organization_id, 'shopify', 'orders/create', payload, idempotency_key=webhook_id)
+        except DuplicateEvent:
+            return JsonResponse({'message': 'Duplicate webhook received and ignored'}, status=200)
+
+        return JsonResponse({'message': 'Webhook accepted for processing'}, status=202)
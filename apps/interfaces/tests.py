@@ -1,3 +1,124 @@
-from django.test import TestCase
+import json
+from unittest.mock import patch
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.companies.models import Company
+from apps.companies import services as company_services
+from apps.organizations.models import Organization
+from apps.events.models import Event
 
-# Create your tests here.
+
+class AsyncErpNextPosInvoiceWebhookTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    async def test_event_is_persisted_and_acknowledged(self):
+        response = await self.async_client.post(
+            '/api/webhooks/async/erpnext/pos-invoice/',
+            data=json.dumps({"name": "POS-0001"}),
+            content_type='application/json',
+            headers={'X-Organization-Slug': 'test-org'},
+        )
+
+        self.assertEqual(response.status_code, 202)
+        event = await Event.objects.aget(id=response.json()['event_id'])
+        self.assertEqual(event.topic, 'pos.invoice.received')
+
+    async def test_failed_outbox_write_leaves_no_event(self):
+        with patch('apps.events.outbox.enqueue', side_effect=RuntimeError("outbox down")):
+            response = await self.async_client.post(
+                '/api/webhooks/async/erpnext/pos-invoice/',
+                data=json.dumps({"name": "POS-0001"}),
+                content_type='application/json',
+                headers={'X-Organization-Slug': 'test-org'},
+            )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(await Event.objects.aexists())
+
+    async def test_unknown_tenant_is_rejected(self):
+        response = await self.async_client.post(
+            '/api/webhooks/async/erpnext/pos-invoice/',
+            data=json.dumps({"name": "POS-0001"}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IngestionDeduplicationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def _post(self, payload):
+        return self.client.post(
+            '/api/webhooks/erpnext/pos-invoice/',
+            data=json.dumps(payload),
+            content_type='application/json',
+            headers={'X-Organization-Slug': 'test-org'},
+        )
+
+    def test_redelivered_payload_is_ignored(self):
+        self.assertEqual(self._post({"name": "POS-0001", "grand_total": 10}).status_code, 201)
+        self.assertEqual(self._post({"grand_total": 10, "name": "POS-0001"}).status_code, 200)
+
+        cache.clear()
+        self.assertEqual(self._post({"name": "POS-0001", "grand_total": 10}).status_code, 200)
+        self.assertEqual(self._post({"name": "POS-0002", "grand_total": 10}).status_code, 201)
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_identical_proxied_orders_are_all_accepted(self):
+        company = Company.objects.create(organization=self.organization, name="Test Company")
+        order = {"store_id": str(company.id), "items": [{"sku": "A-1", "qty": 1}]}
+
+        for _ in range(2):
+            response = self.client.post('/api/webhook/order/create/', data=json.dumps(order), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(Event.objects.filter(topic='order.create').count(), 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ShopifyWebhookIdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company_services._shopify_domain_cache.local.clear()
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        Company.objects.create(
+            organization=self.organization,
+            name="Test Company",
+            metadata={"shopify_domain": "test-shop.myshopify.com", "shopify_config": {"verify_hmac": False}}
+        )
+
+    def _post(self, payload):
+        return self.client.post(
+            '/api/webhooks/shopify/order-create/',
+            data=json.dumps(payload),
+            content_type='application/json',
+            headers={'X-Shopify-Webhook-Id': 'webhook-1'},
+        )
+
+    def test_redelivered_webhook_id_is_rejected_before_the_database(self):
+        order = {"order_status_url": "https://test-shop.myshopify.com/orders/1", "name": "#1001"}
+        self.assertEqual(self._post(order).status_code, 202)
+
+        with self.assertNumQueries(0):
+            response = self._post({**order, "updated_at": "2026-10-17T10:00:00Z"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_webhook_id_keeps_its_full_ttl_only_once_committed(self):
+        order = {"order_status_url": "https://test-shop.myshopify.com/orders/1", "name": "#1001"}
+        with patch.object(cache, 'add', wraps=cache.add) as add, patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.assertEqual(self._post(order).status_code, 202)
+            key = f"event-idempotency:{self.organization.id}:webhook-1"
+            add.assert_any_call(key, 1, settings.EVENT_DEDUP_INFLIGHT_TTL)
+            touch.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+            touch.assert_any_call(key, settings.EVENT_IDEMPOTENCY_FAST_TTL)
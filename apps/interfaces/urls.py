@@ -1,9 +1,14 @@
 from django.urls import path
 from .views import ErpNextPosInvoiceWebhookView, ShopifyOrderWebhookView, OrderCreateProxyView
+from .async_views import AsyncErpNextPosInvoiceWebhookView, AsyncShopifyOrderWebhookView
 
 urlpatterns = [
     path('webhooks/erpnext/pos-invoice/', ErpNextPosInvoiceWebhookView.as_view(), name='erpnext-pos-invoice-webhook'),
     path('webhooks/shopify/order-create/', ShopifyOrderWebhookView.as_view(), name='shopify-webhook-order-create'),
     path('webhook/order/create/', OrderCreateProxyView.as_view(), name='order-create'),
+
+    # Async ingestion endpoints (ASGI, see core.asgi)
+    path('webhooks/async/erpnext/pos-invoice/', AsyncErpNextPosInvoiceWebhookView.as_view(), name='async-erpnext-pos-invoice-webhook'),
+    path('webhooks/async/shopify/order-create/', AsyncShopifyOrderWebhookView.as_view(), name='async-shopify-webhook-order-create'),
 ]
 
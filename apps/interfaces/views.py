@@ -4,7 +4,7 @@ import hashlib
 import base64
 from urllib.parse import urlparse
 
-from django.db import IntegrityError
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
@@ -12,8 +12,8 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from apps.companies.models import Company
-from apps.events.models import Event
-from apps.integrations.erpnext.tasks import create_erpnext_order_from_shopify_event
+from apps.companies.services import get_company_by_shopify_domain
+from apps.events.ingestion import DuplicateEvent, ingest_event
 
 
 logger = logging.getLogger(__name__)
@@ -36,16 +36,16 @@ class ErpNextPosInvoiceWebhookView(APIView):
         organization = request.organization
 
         try:
-            Event.objects.create(
-                organization=organization,
-                source='erpnext',
-                topic='pos.invoice.received',
-                payload=payload
-            )
+            ingest_event(organization.id, 'erpnext', 'pos.invoice.received', payload)
             return Response(
                 {"message": "Webhook received and event created."},
                 status=status.HTTP_201_CREATED
             )
+        except DuplicateEvent:
+            return Response(
+                {"message": "Duplicate webhook received and ignored"},
+                status=status.HTTP_200_OK
+            )
         except Exception as e:
             logger.error(
                 f"Failed to create event for organization {organization.slug}: {e}",
@@ -76,12 +76,41 @@ def verify_shopify_webhook(request, webhook_secret):
     return hmac.compare_digest(received_hmac, computed_hmac)
 
 
+def find_company_by_shopify_domain(hostname):
+    """
+    Returns the Company whose metadata declares the given Shopify domain, or None.
+    """
+    return get_company_by_shopify_domain(hostname)
+
+
+def get_shopify_config(company):
+    """
+    Returns the Shopify config stored in the company metadata.
+    """
+    shopify_config = company.metadata.get('shopify_config')
+
+    # If shopify_config is not found at the top level, try the double-nested path
+    if not shopify_config and isinstance(company.metadata.get('metadata'), dict):
+        shopify_config = company.metadata.get('metadata').get('shopify_config')
+
+    # Default to an empty dict if still not found
+    return shopify_config or {}
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ShopifyOrderWebhookView(APIView):
     """
     Receives, validates, and enqueues order-related webhooks from Shopify.
+
+    Runs outside ATOMIC_REQUESTS: redelivered webhook IDs are rejected by the
+    Redis fast path without opening a transaction, and ingest_event wraps the
+    insert in its own.
     """
 
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
+
     def post(self, request, *args, **kwargs):
         payload = request.data
 
@@ -94,9 +123,7 @@ class ShopifyOrderWebhookView(APIView):
 
         try:
             hostname = urlparse(order_status_url).hostname
-            company = Company.objects.filter(metadata__shopify_domain=hostname).first()
-            if not company:
-                company = Company.objects.filter(metadata__metadata__shopify_domain=hostname).first()
+            company = find_company_by_shopify_domain(hostname)
             if not company:
                 raise Company.DoesNotExist
 
@@ -106,15 +133,7 @@ class ShopifyOrderWebhookView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Retrieve Shopify config from company metadata
-        shopify_config = company.metadata.get('shopify_config')
-        
-        # If shopify_config is not found at the top level, try the double-nested path
-        if not shopify_config and isinstance(company.metadata.get('metadata'), dict):
-            shopify_config = company.metadata.get('metadata').get('shopify_config')
-
-        # Default to an empty dict if still not found
-        shopify_config = shopify_config or {}
+        shopify_config = get_shopify_config(company)
 
         verify_hmac = shopify_config.get('verify_hmac', True) # Default to True for security
         webhook_secret = shopify_config.get('webhook_secret')
@@ -144,17 +163,16 @@ class ShopifyOrderWebhookView(APIView):
             )
 
         try:
-            event = Event.objects.create(
-                organization=company.organization,
-                source='shopify',
-                topic='orders/create',
-                payload=payload,
+            ingest_event(
+                company.organization_id,
+                'shopify',
+                'orders/create',
+                payload,
                 idempotency_key=webhook_id # Re-enabled idempotency
             )
-            
-            create_erpnext_order_from_shopify_event.delay(event.id)
+            # Note: The signal dispatches create_erpnext_order_from_shopify_event after commit.
 
-        except IntegrityError:
+        except DuplicateEvent:
             return Response(
                 {'message': 'Duplicate webhook received and ignored'},
                 status=status.HTTP_200_OK
@@ -214,19 +232,19 @@ class OrderCreateProxyView(APIView):
             )
 
         try:
-            event = Event.objects.create(
-                organization=organization,
-                source='proxy', # Generic source
-                topic='order.create', # Generic topic
-                payload=payload
-            )
+            event = ingest_event(organization.id, 'proxy', 'order.create', payload) # Generic source and topic
             # Note: The signal will automatically trigger process_order_event.delay()
 
             return Response(
                 {'message': 'Request accepted for processing', 'event_id': str(event.id)},
                 status=status.HTTP_202_ACCEPTED
             )
-            
+
+        except DuplicateEvent as e:
+            return Response(
+                {'message': 'Duplicate request ignored', 'event_id': str(e.event_id) if e.event_id else None},
+                status=status.HTTP_200_OK
+            )
         except Exception as e:
             logger.error(f"Failed to create event for order: {e}", exc_info=True)
             return Response(
@@ -0,0 +1,29 @@
+from django.conf import settings
+from core.cache import TwoLevelCache
+from .models import Organization
+
+_organization_cache = TwoLevelCache(
+    'tenant:slug',
+    ttl=settings.ORGANIZATION_ACCESS_CACHE_TTL,
+    local_ttl=settings.ORGANIZATION_LOCAL_CACHE_TTL,
+    negative_ttl=settings.ORGANIZATION_NEGATIVE_CACHE_TTL,
+    maxsize=settings.ORGANIZATION_LOCAL_CACHE_SIZE,
+)
+
+
+def _load_active_organization(slug):
+    return Organization.objects.filter(slug=slug, is_active=True).first()
+
+
+def get_active_organization(slug: str):
+    """
+    Resolves an active Organization by slug through the tenant cache
+    (in-process LRU, then Redis, then the database).
+    Unknown or inactive slugs are cached as misses for a short time.
+    """
+    return _organization_cache.get_or_load(_load_active_organization, slug)
+
+
+def invalidate_organization(slug: str):
+    """Drops the cached resolution of a slug."""
+    _organization_cache.invalidate(slug)
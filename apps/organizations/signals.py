@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Organization
+from .services import invalidate_organization
+
+@receiver(pre_save, sender=Organization)
+def remember_previous_slug(sender, instance, **kwargs):
+    """
+    Keeps the slug stored in the database, so a renamed organization
+    also invalidates the cache entry of its old slug.
+    """
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = (
+            Organization.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_tenant_cache(sender, instance, **kwargs):
+    """
+    Invalidates the tenant cache when an organization is saved
+    (including activation/deactivation) or deleted. Invalidates again once
+    the change is committed: a concurrent request may have cached the old
+    row in between, which would otherwise stay until the TTL expires.
+    """
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)} - {None}
+    for slug in slugs:
+        invalidate_organization(slug)
+        transaction.on_commit(lambda slug=slug: invalidate_organization(slug))
@@ -1,3 +1,35 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.organizations.models import Organization
+from apps.organizations import services
 
-# Create your tests here.
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TenantCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        services._organization_cache.local.clear()
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+
+    def test_resolution_is_cached(self):
+        self.assertEqual(services.get_active_organization("test-org"), self.organization)
+        with self.assertNumQueries(0):
+            self.assertEqual(services.get_active_organization("test-org"), self.organization)
+
+    def test_unknown_slugs_are_cached_as_misses(self):
+        self.assertIsNone(services.get_active_organization("unknown"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(services.get_active_organization("unknown"))
+
+    def test_deactivation_invalidates_cache(self):
+        services.get_active_organization("test-org")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.organization.is_active = False
+            self.organization.save()
+            self.assertIsNone(services.get_active_organization("test-org"))
+
+        # A resolution cached before the commit is dropped once it happens.
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        with self.assertNumQueries(1):
+            self.assertIsNone(services.get_active_organization("test-org"))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowexecution',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='workflowexecution',
+            name='workflow',
+            field=models.CharField(choices=[('inventory_transfer', 'Inventory transfer'), ('intercompany_transfer', 'Intercompany transfer')], default='inventory_transfer', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='workflowexecution',
+            name='pr_id_a',
+            field=models.CharField(blank=True, default='', help_text='ID of Purchase Receipt from Company A', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='WorkflowStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('doctype', models.CharField(max_length=100)),
+                ('document_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('created', 'Created'), ('submitted', 'Submitted')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('execution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='workflows.workflowexecution')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('execution', 'name'), name='uniq_workflow_step')],
+            },
+        ),
+    ]
@@ -10,13 +10,20 @@ class WorkflowExecution(models.Model):
         ('success', 'Success'),
         ('failed', 'Failed'),
     ]
+    WORKFLOW_CHOICES = [
+        ('inventory_transfer', 'Inventory transfer'),
+        ('intercompany_transfer', 'Intercompany transfer'),
+    ]
 
     organization = models.ForeignKey(
         'organizations.Organization',
         on_delete=models.CASCADE,
         related_name='workflows'
     )
-    pr_id_a = models.CharField(max_length=255, help_text="ID of Purchase Receipt from Company A")
+    workflow = models.CharField(max_length=50, choices=WORKFLOW_CHOICES, default='inventory_transfer')
+    # Input of the workflow, kept so retries can rebuild the documents.
+    params = models.JSONField(default=dict, blank=True)
+    pr_id_a = models.CharField(max_length=255, blank=True, default='', help_text="ID of Purchase Receipt from Company A")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     dn_id_a = models.CharField(max_length=255, null=True, blank=True, help_text="ID of Delivery Note in Company A")
     pr_id_b = models.CharField(max_length=255, null=True, blank=True, help_text="ID of Purchase Receipt in Company B")
@@ -25,4 +32,37 @@ class WorkflowExecution(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Workflow {self.id} - PR A: {self.pr_id_a} - Status: {self.status}"
\ No newline at end of file
+        return f"Workflow {self.id} - PR A: {self.pr_id_a} - Status: {self.status}"
+
+
+class WorkflowStep(models.Model):
+    """
+    Checkpoint of one document of a workflow execution. A marker is recorded
+    before the document is created, the document name as soon as it is, and
+    the step is marked submitted once it is, so a retried execution resumes
+    from the first incomplete step instead of creating the documents again.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('created', 'Created'),
+        ('submitted', 'Submitted'),
+    ]
+
+    execution = models.ForeignKey(WorkflowExecution, on_delete=models.CASCADE, related_name='steps')
+    name = models.CharField(max_length=100)
+    doctype = models.CharField(max_length=100)
+    document_name = models.CharField(max_length=255, null=True, blank=True)
+    # Written into the document before it is created, so a create whose
+    # outcome is unknown (e.g. timeout) can be looked up on retry.
+    marker = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['execution', 'name'], name='uniq_workflow_step')
+        ]
+
+    def __str__(self):
+        return f"Step {self.name} of workflow {self.execution_id} - {self.status}"
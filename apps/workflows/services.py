@@ -1,5 +1,6 @@
 import requests
 import json
+from apps.integrations import transport
 
 class ERPNextClient:
     def __init__(self, api_url, api_key, api_secret):
@@ -16,11 +17,11 @@ class ERPNextClient:
         url = f"{self.api_url}/api/resource/{path}"
         try:
             if method == "GET":
-                response = requests.get(url, headers=self.headers, params=data)
+                response = transport.get('erpnext', url, headers=self.headers, params=data)
             elif method == "POST":
-                response = requests.post(url, headers=self.headers, data=json.dumps(data))
+                response = transport.post('erpnext', url, headers=self.headers, data=json.dumps(data))
             elif method == "PUT":
-                response = requests.put(url, headers=self.headers, data=json.dumps(data))
+                response = transport.put('erpnext', url, headers=self.headers, data=json.dumps(data))
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -47,6 +48,11 @@ class ERPNextClient:
         path = doctype
         return self._make_request("POST", path, data)
 
+    def find_documents(self, doctype, filters, fields=("name", "docstatus")):
+        """Returns the documents of `doctype` matching `filters` ([[field, operator, value], ...])."""
+        params = {'filters': json.dumps(filters), 'fields': json.dumps(list(fields))}
+        return self._make_request("GET", doctype, params).get('data', [])
+
     def get_customer(self, customer_email):
         """
         Retrieves a customer from ERPNext by email.
@@ -58,7 +64,7 @@ class ERPNextClient:
         # with filters in params.
         url = f"{self.api_url}/api/resource/Customer"
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = transport.get('erpnext', url, headers=self.headers, params=params)
             response.raise_for_status()
             customers = response.json().get('data', [])
             return customers[0] if customers else None
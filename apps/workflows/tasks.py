@@ -8,7 +8,8 @@ from requests.exceptions import RequestException
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, autoretry_for=(RequestException,), retry_kwargs={'max_retries': 5, 'countdown': 60})
+@shared_task(bind=True, autoretry_for=(RequestException,), retry_kwargs={'max_retries': 5},
+             retry_backoff=60, retry_backoff_max=3600, retry_jitter=True)
 def transfer_inventory_task(self, workflow_execution_id):
     try:
         workflow_execution = WorkflowExecution.objects.get(id=workflow_execution_id)
@@ -82,123 +83,198 @@ def transfer_inventory_task(self, workflow_execution_id):
         raise
 
 from requests.exceptions import RequestException, HTTPError
+from django.conf import settings
 from apps.companies.models import Company
+from apps.events.retries import backoff_delay
+from apps.workflows.models import WorkflowStep
 
-@shared_task(bind=True)
-def execute_intercompany_transfer_task(self, supplier, organization_id, source_company_id, destination_company_id, warehouse, items_data, destination_warehouse):
-    try:
-        logger.info(f"Starting intercompany transfer for organization {organization_id}.")
-        
-        organization = Organization.objects.get(id=organization_id)
-        source_company = Company.objects.get(id=source_company_id)
-        destination_company = Company.objects.get(id=destination_company_id)
-        
-        credentials = ErpnextCredential.objects.get(organization=organization, is_active=True)
-        erp_client = ERPNextClient(api_url=credentials.erpnext_site_url, api_key=credentials.api_key, api_secret=credentials.api_secret)
 
-        # Step 1: Create Purchase Receipt in Source Company (from external supplier)
-        logger.info(f"Step 1: Creating Purchase Receipt in {source_company.name} from supplier {supplier}.")
-        pr_source_items = []
-        for item in items_data:
-            pr_source_items.append({
-                "item_code": item['item_code'],
-                "qty": len(item['serial_numbers']),
-                "rate": item['value_per_unit'],
-                "warehouse": warehouse,
-                "serial_no": "\n".join(item['serial_numbers'])
-            })
-        
-        pr_source_data = {
+def _transfer_items(items_data, warehouse):
+    return [
+        {
+            "item_code": item['item_code'],
+            "qty": len(item['serial_numbers']),
+            "rate": item['value_per_unit'],
+            "warehouse": warehouse,
+            "serial_no": "\n".join(item['serial_numbers'])
+        }
+        for item in items_data
+    ]
+
+
+def _erpnext_customer_name(company):
+    # Get ERPNext customer name from metadata, fallback to company name
+    customer_metadata = company.metadata
+    if 'metadata' in customer_metadata: # Handle potential extra nesting
+        customer_metadata = customer_metadata['metadata']
+    return customer_metadata.get('erpnext_config', {}).get('erpnext_customer_name', company.name)
+
+
+def _intercompany_steps(params, source_company, destination_company):
+    """
+    The documents of an intercompany transfer, in order, as (step name,
+    doctype, document builder) tuples.
+    """
+    return [
+        # Step 1: Purchase Receipt in Source Company (from external supplier)
+        ('source_purchase_receipt', "Purchase Receipt", lambda: {
             "doctype": "Purchase Receipt",
             "company": source_company.name,
-            "supplier": supplier,
-            "set_warehouse": warehouse,
-            "items": pr_source_items
-        }
-        pr_source_response = erp_client.create_document("Purchase Receipt", pr_source_data)
-        pr_source_name = pr_source_response["data"]["name"]
-        erp_client.submit_document("Purchase Receipt", pr_source_name)
-        logger.info(f"Purchase Receipt {pr_source_name} created in {source_company.name}.")
-
-        # Step 2: Create Delivery Note from Source Company to Destination Company
-        logger.info(f"Step 2: Creating Delivery Note from {source_company.name} to {destination_company.name}.")
-        dn_items = []
-        for item in items_data:
-            dn_items.append({
-                "item_code": item['item_code'],
-                "qty": len(item['serial_numbers']),
-                "rate": item['value_per_unit'],
-                "warehouse": warehouse,
-                "serial_no": "\n".join(item['serial_numbers'])
-            })
-
-        # Get ERPNext customer name from metadata, fallback to company name
-        customer_metadata = destination_company.metadata
-        if 'metadata' in customer_metadata: # Handle potential extra nesting
-            customer_metadata = customer_metadata['metadata']
-        erpnext_customer_name = customer_metadata.get('erpnext_config', {}).get('erpnext_customer_name', destination_company.name)
-        logger.info(f"Using customer name for Delivery Note: '{erpnext_customer_name}'")
-
-        dn_data = {
+            "supplier": params['supplier'],
+            "set_warehouse": params['warehouse'],
+            "items": _transfer_items(params['items_data'], params['warehouse'])
+        }),
+        # Step 2: Delivery Note from Source Company to Destination Company
+        ('delivery_note', "Delivery Note", lambda: {
             "doctype": "Delivery Note",
             "company": source_company.name,
-            "customer": erpnext_customer_name,
-            "set_warehouse": warehouse,
-            "items": dn_items
-        }
-        dn_response = erp_client.create_document("Delivery Note", dn_data)
-        dn_name = dn_response["data"]["name"]
-        erp_client.submit_document("Delivery Note", dn_name)
-        logger.info(f"Delivery Note {dn_name} created in {source_company.name}.")
-
-        # Step 3: Create Purchase Receipt in Destination Company (from source company)
-        logger.info(f"Step 3: Creating Purchase Receipt in {destination_company.name}.")
-        pr_dest_items = []
-        for item in items_data:
-            pr_dest_items.append({
-                "item_code": item['item_code'],
-                "qty": len(item['serial_numbers']),
-                "rate": item['value_per_unit'],
-                "warehouse": destination_warehouse,
-                "serial_no": "\n".join(item['serial_numbers'])
-            })
-
-        pr_dest_data = {
+            "customer": _erpnext_customer_name(destination_company),
+            "set_warehouse": params['warehouse'],
+            "items": _transfer_items(params['items_data'], params['warehouse'])
+        }),
+        # Step 3: Purchase Receipt in Destination Company (from source company)
+        ('destination_purchase_receipt', "Purchase Receipt", lambda: {
             "doctype": "Purchase Receipt",
             "company": destination_company.name,
             "supplier": source_company.name,
-            "set_warehouse": destination_warehouse,
-            "items": pr_dest_items
-        }
-        pr_dest_response = erp_client.create_document("Purchase Receipt", pr_dest_data)
-        pr_dest_name = pr_dest_response["data"]["name"]
-        erp_client.submit_document("Purchase Receipt", pr_dest_name)
-        logger.info(f"Purchase Receipt {pr_dest_name} created in {destination_company.name}.")
+            "set_warehouse": params['destination_warehouse'],
+            "items": _transfer_items(params['items_data'], params['destination_warehouse'])
+        }),
+    ]
+
+
+def _step_marker(execution, name) -> str:
+    return f"workflow:{execution.id}:{name}"
+
+
+def _find_created_document(erp_client, step):
+    """The document an earlier attempt of the step created, found by its marker, or None."""
+    documents = erp_client.find_documents(step.doctype, [[settings.WORKFLOW_MARKER_FIELD, "=", step.marker]])
+    return documents[0] if documents else None
 
-        logger.info("Intercompany transfer workflow completed successfully.")
 
-    except (ErpnextCredential.DoesNotExist, Organization.DoesNotExist, Company.DoesNotExist) as e:
+def _run_step(erp_client, execution, name, doctype, build_document):
+    """
+    Creates and submits the document of a step, recording each call as it
+    succeeds. Completed calls of an earlier attempt are not repeated. The
+    step marker is recorded before the create and written into the
+    document, so a create whose response was lost is found on retry
+    instead of being sent again.
+    """
+    step, _ = WorkflowStep.objects.get_or_create(execution=execution, name=name, defaults={'doctype': doctype})
+    if step.status == 'submitted':
+        logger.info(f"Step {name} already done: {doctype} {step.document_name}.")
+        return step
+
+    if step.status == 'pending' and step.marker:
+        # An earlier create may have gone through before it failed.
+        document = _find_created_document(erp_client, step)
+        if document:
+            step.document_name = document["name"]
+            step.status = 'submitted' if document.get("docstatus") == 1 else 'created'
+            step.save(update_fields=['document_name', 'status', 'updated_at'])
+            logger.info(f"Step {name}: found {doctype} {step.document_name} created by an earlier attempt.")
+            if step.status == 'submitted':
+                return step
+
+    if step.status == 'created':
+        # The submit of an earlier attempt may have gone through before it failed.
+        document = erp_client.get_document(doctype, step.document_name)
+        if document.get("data", {}).get("docstatus") == 1:
+            step.status = 'submitted'
+            step.save(update_fields=['status', 'updated_at'])
+            return step
+    else:
+        step.marker = _step_marker(execution, name)
+        step.save(update_fields=['marker', 'updated_at'])
+        response = erp_client.create_document(doctype, {**build_document(), settings.WORKFLOW_MARKER_FIELD: step.marker})
+        step.document_name = response["data"]["name"]
+        step.status = 'created'
+        step.save(update_fields=['document_name', 'status', 'updated_at'])
+        logger.info(f"Step {name}: {doctype} {step.document_name} created.")
+
+    erp_client.submit_document(doctype, step.document_name)
+    step.status = 'submitted'
+    step.save(update_fields=['status', 'updated_at'])
+    logger.info(f"Step {name}: {doctype} {step.document_name} submitted.")
+    return step
+
+
+@shared_task(bind=True)
+def execute_intercompany_transfer_task(self, workflow_execution_id=None, **params):
+    """
+    Runs an intercompany transfer recorded as a WorkflowExecution. Each
+    document is checkpointed in a WorkflowStep, so a retry after a server or
+    network error resumes from the first incomplete step. Tasks queued with
+    the transfer parameters instead of an execution id get an execution
+    created on their first run.
+    """
+    if workflow_execution_id is None:
+        workflow_execution_id = WorkflowExecution.objects.create(
+            organization_id=params.pop('organization_id'),
+            workflow='intercompany_transfer',
+            params=params,
+        ).id
+
+    execution = WorkflowExecution.objects.get(id=workflow_execution_id)
+    params = execution.params
+    try:
+        logger.info(f"Starting intercompany transfer {execution.id} for organization {execution.organization_id}.")
+        WorkflowExecution.objects.filter(id=execution.id).update(status='processing')
+
+        source_company = Company.objects.get(id=params['source_company_id'])
+        destination_company = Company.objects.get(id=params['destination_company_id'])
+
+        credentials = ErpnextCredential.objects.get(organization_id=execution.organization_id, is_active=True)
+        erp_client = ERPNextClient(api_url=credentials.erpnext_site_url, api_key=credentials.api_key, api_secret=credentials.api_secret)
+
+        for name, doctype, build_document in _intercompany_steps(params, source_company, destination_company):
+            _run_step(erp_client, execution, name, doctype, build_document)
+
+        WorkflowExecution.objects.filter(id=execution.id).update(status='success', error_message=None)
+        logger.info(f"Intercompany transfer {execution.id} completed successfully.")
+
+    except (ErpnextCredential.DoesNotExist, Company.DoesNotExist) as e:
         logger.error(f"Configuration error in intercompany transfer workflow: {e}")
         # Do not retry for configuration errors
+        _fail_execution(execution, f"Configuration error: {e}")
         raise
 
     except HTTPError as e:
         # For HTTP errors, check the status code to decide whether to retry.
-        if e.response and 400 <= e.response.status_code < 500:
+        if e.response is not None and 400 <= e.response.status_code < 500:
             # 4xx errors are client errors (bad data). Do not retry.
             logger.error(f"Permanent API client error: {e.response.status_code} - {e.response.text}")
+            _fail_execution(execution, f"API client error: {e}")
             raise
         else:
-            # 5xx errors are server errors. Retry these.
+            # 5xx errors are server errors. Retry these from the first incomplete step.
             logger.warning(f"API server error, retrying: {e}")
-            raise self.retry(exc=e, max_retries=5, countdown=60)
+            raise _retry(self, execution, e)
 
     except RequestException as e:
         # For other network errors (timeouts, connection errors), retry.
         logger.warning(f"Network error, retrying: {e}")
-        raise self.retry(exc=e, max_retries=5, countdown=60)
+        raise _retry(self, execution, e)
 
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
         # Do not retry for other unexpected errors.
+        _fail_execution(execution, f"An unexpected error occurred: {e}")
         raise
+
+
+def _fail_execution(execution, message):
+    WorkflowExecution.objects.filter(id=execution.id).update(status='failed', error_message=message)
+
+
+def _retry(task, execution, error, max_retries=5):
+    """Schedules a retry of the execution (by id, so it resumes from its checkpoints)."""
+    if task.request.retries >= max_retries:
+        _fail_execution(execution, f"API request failed after {max_retries} retries: {error}")
+    else:
+        WorkflowExecution.objects.filter(id=execution.id).update(error_message=f"API request failed, retrying: {error}")
+    return task.retry(
+        args=(), kwargs={'workflow_execution_id': execution.id}, exc=error, max_retries=max_retries,
+        countdown=backoff_delay(task.request.retries + 1, base=60),
+    )
@@ -1,3 +1,80 @@
+from unittest.mock import MagicMock, patch
 from django.test import TestCase
+from requests.exceptions import HTTPError, Timeout
+from apps.companies.models import Company
+from apps.integrations.erpnext.models import ErpnextCredential
+from apps.organizations.models import Organization
+from apps.workflows.models import WorkflowExecution, WorkflowStep
+from apps.workflows.tasks import execute_intercompany_transfer_task
 
-# Create your tests here.
+
+class IntercompanyTransferCheckpointTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(slug="test-org", uuid="test-uuid")
+        source = Company.objects.create(organization=self.organization, name="Source")
+        destination = Company.objects.create(organization=self.organization, name="Destination")
+        ErpnextCredential.objects.create(
+            organization=self.organization, erpnext_site_url="https://erpnext.example.com",
+            api_key="key", api_secret="secret", is_active=True
+        )
+        self.execution = WorkflowExecution.objects.create(
+            organization=self.organization,
+            workflow='intercompany_transfer',
+            params={
+                "supplier": "Supplier", "source_company_id": str(source.id),
+                "destination_company_id": str(destination.id), "warehouse": "Stores - S",
+                "destination_warehouse": "Stores - D",
+                "items_data": [{"item_code": "ITEM", "value_per_unit": 10, "serial_numbers": ["SN1"]}],
+            },
+        )
+
+    @patch('apps.workflows.tasks.ERPNextClient')
+    def test_retry_resumes_from_first_incomplete_step(self, MockClient):
+        client = MockClient.return_value
+        client.create_document.side_effect = [
+            {"data": {"name": "PR-SRC-1"}}, {"data": {"name": "DN-1"}}, {"data": {"name": "PR-DST-1"}},
+        ]
+        server_error = HTTPError(response=MagicMock(status_code=503))
+        client.submit_document.side_effect = [None, server_error, None, None]
+        client.get_document.return_value = {"data": {"name": "DN-1", "docstatus": 0}}
+
+        with self.assertRaises(HTTPError):
+            execute_intercompany_transfer_task(workflow_execution_id=self.execution.id)
+        self.assertEqual(
+            dict(WorkflowStep.objects.values_list('name', 'status')),
+            {'source_purchase_receipt': 'submitted', 'delivery_note': 'created'},
+        )
+
+        execute_intercompany_transfer_task(workflow_execution_id=self.execution.id)
+
+        # Each document was created once; only the Delivery Note submit was sent again.
+        self.assertEqual([call.args[0] for call in client.create_document.call_args_list],
+                         ["Purchase Receipt", "Delivery Note", "Purchase Receipt"])
+        self.assertEqual([call.args[1] for call in client.submit_document.call_args_list],
+                         ["PR-SRC-1", "DN-1", "DN-1", "PR-DST-1"])
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.status, 'success')
+
+    @patch('apps.workflows.tasks.ERPNextClient')
+    def test_retry_after_create_timeout_finds_the_created_document(self, MockClient):
+        client = MockClient.return_value
+        client.create_document.side_effect = [
+            Timeout("read timed out"), {"data": {"name": "DN-1"}}, {"data": {"name": "PR-DST-1"}},
+        ]
+        client.find_documents.return_value = [{"name": "PR-SRC-1", "docstatus": 0}]
+
+        with self.assertRaises(Timeout):
+            execute_intercompany_transfer_task(workflow_execution_id=self.execution.id)
+        marker = f"workflow:{self.execution.id}:source_purchase_receipt"
+        self.assertEqual(WorkflowStep.objects.get(name='source_purchase_receipt').marker, marker)
+        self.assertEqual(client.create_document.call_args.args[1]["remarks"], marker)
+
+        execute_intercompany_transfer_task(workflow_execution_id=self.execution.id)
+
+        # The Purchase Receipt of the timed out create was found, not created again.
+        client.find_documents.assert_called_once_with("Purchase Receipt", [["remarks", "=", marker]])
+        self.assertEqual(client.create_document.call_count, 3)
+        self.assertEqual([call.args[1] for call in client.submit_document.call_args_list],
+                         ["PR-SRC-1", "DN-1", "PR-DST-1"])
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.status, 'success')
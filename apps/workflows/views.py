@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -121,22 +122,32 @@ class IntercompanyTransferView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        # --- 5. Trigger asynchronous workflow ---
+        # --- 5. Record and trigger asynchronous workflow ---
         try:
-            execute_intercompany_transfer_task.delay(
-                supplier=supplier,
-                organization_id=organization.id,
-                source_company_id=source_company.id,
-                destination_company_id=destination_company.id,
-                warehouse=warehouse,
-                items_data=items_data,
-                destination_warehouse=destination_warehouse
+            workflow_execution = WorkflowExecution.objects.create(
+                organization=organization,
+                workflow='intercompany_transfer',
+                params={
+                    "supplier": supplier,
+                    "source_company_id": str(source_company.id),
+                    "destination_company_id": str(destination_company.id),
+                    "warehouse": warehouse,
+                    "items_data": items_data,
+                    "destination_warehouse": destination_warehouse,
+                },
+            )
+            # Queued once the execution row is committed, so the worker always finds it.
+            transaction.on_commit(
+                lambda: execute_intercompany_transfer_task.delay(workflow_execution_id=workflow_execution.id)
             )
 
-            logger.info(f"Intercompany transfer initiated for organization {organization.id}.")
+            logger.info(f"Intercompany transfer {workflow_execution.id} initiated for organization {organization.id}.")
 
             return Response(
-                {"detail": "Intercompany transfer workflow initiated successfully."},
+                {
+                    "detail": "Intercompany transfer workflow initiated successfully.",
+                    "workflow_execution_id": workflow_execution.id,
+                },
                 status=status.HTTP_202_ACCEPTED
             )
 
@@ -0,0 +1,129 @@
+"""
+Two-level cache: an in-process LRU in front of the shared Django cache (Redis).
+
+The local level absorbs hot keys without a network round trip; its short TTL
+bounds how long other processes may serve a value after it was invalidated.
+Negative results (e.g. an unknown slug) can be cached too, with their own TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+_NEGATIVE = '__negative__'
+
+
+class LocalLRUCache:
+    """Thread-safe, size-bounded LRU with a per-entry expiry."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoLevelCache:
+    """
+    Caches the result of `loader(*key_parts)` under `namespace`.
+
+    - ttl: seconds a value lives in the shared cache.
+    - local_ttl: seconds a value lives in the in-process LRU.
+    - negative_ttl: seconds a None result is cached (0 disables negative caching).
+
+    Failures of the shared cache are logged and treated as misses, so a Redis
+    outage degrades to database lookups instead of failing requests.
+    """
+
+    def __init__(self, namespace, ttl, local_ttl=30, negative_ttl=30, maxsize=1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.negative_ttl = negative_ttl
+        self.local = LocalLRUCache(maxsize)
+
+    def make_key(self, *key_parts):
+        return ':'.join([self.namespace, *(str(part) for part in key_parts)])
+
+    def get_or_load(self, loader, *key_parts):
+        key = self.make_key(*key_parts)
+
+        value = self.local.get(key)
+        if value is MISSING:
+            try:
+                value = cache.get(key, MISSING)
+            except Exception as e:
+                logger.warning(f"Shared cache unavailable reading {key}: {e}")
+                value = MISSING
+
+            if value is MISSING:
+                value = loader(*key_parts)
+                self._store_shared(key, value)
+            self._store_local(key, value)
+
+        return None if value == _NEGATIVE else value
+
+    def set(self, value, *key_parts):
+        key = self.make_key(*key_parts)
+        self._store_shared(key, value)
+        self._store_local(key, value)
+
+    def invalidate(self, *key_parts):
+        key = self.make_key(*key_parts)
+        self.local.delete(key)
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable invalidating {key}: {e}")
+
+    def _store_local(self, key, value):
+        if value is None:
+            value = _NEGATIVE
+        if value == _NEGATIVE:
+            if self.negative_ttl:
+                self.local.set(key, value, min(self.local_ttl, self.negative_ttl))
+        else:
+            self.local.set(key, value, self.local_ttl)
+
+    def _store_shared(self, key, value):
+        if value is None or value == _NEGATIVE:
+            if not self.negative_ttl:
+                return
+            value, timeout = _NEGATIVE, self.negative_ttl
+        else:
+            timeout = self.ttl
+        try:
+            cache.set(key, value, timeout)
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable writing {key}: {e}")
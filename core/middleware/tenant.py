@@ -2,7 +2,7 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.http import HttpRequest
 from django_multitenant.utils import set_current_tenant
-from apps.organizations.models import Organization  # ajusta al nombre real de tu modelo
+from apps.organizations.services import get_active_organization
 
 def _extract_tenant_slug(request: HttpRequest) -> str | None:
     # 1) Por header (útil para APIs / gateways)
@@ -24,10 +24,8 @@ class TenantMiddleware(MiddlewareMixin):
         slug = _extract_tenant_slug(request)
         tenant = None
         if slug:
-            try:
-                tenant = Organization.objects.get(slug=slug, is_active=True)
-            except Organization.DoesNotExist:
-                tenant = None
+            # Cache en dos niveles (LRU local + Redis), incluye slugs inexistentes
+            tenant = get_active_organization(slug)
 
         # Fija el tenant actual para django-multitenant (thread-local)
         set_current_tenant(tenant)
@@ -25,6 +25,10 @@ ROOT_DOMAIN_SLUG = env("ROOT_DOMAIN_SLUG", default="julizen.com")
 ORGANIZATION_ACCESS_CACHE_TTL = env.int(
     "ORGANIZATION_ACCESS_CACHE_TTL", default=300
 )
+# In-process tenant cache in front of Redis, and TTL for unknown slugs
+ORGANIZATION_LOCAL_CACHE_TTL = env.int("ORGANIZATION_LOCAL_CACHE_TTL", default=30)
+ORGANIZATION_LOCAL_CACHE_SIZE = env.int("ORGANIZATION_LOCAL_CACHE_SIZE", default=1024)
+ORGANIZATION_NEGATIVE_CACHE_TTL = env.int("ORGANIZATION_NEGATIVE_CACHE_TTL", default=30)
 
 INSTALLED_APPS = [
     # Django
@@ -206,4 +210,122 @@ CELERY_RESULT_BACKEND = env("REDIS_URL", default="redis://localhost:6379/0")
 
 # Core Backend Integration
 CORE_BACKEND_URL = env("CORE_BACKEND_URL", default="http://localhost:8000")
-CORE_BACKEND_API_KEY = env("CORE_BACKEND_API_KEY", default="")
\ No newline at end of file
+CORE_BACKEND_API_KEY = env("CORE_BACKEND_API_KEY", default="")
+
+# Event workers
+EVENT_WORKER_BATCH_SIZE = env.int("EVENT_WORKER_BATCH_SIZE", default=100)
+EVENT_WORKER_CONCURRENCY = env.int("EVENT_WORKER_CONCURRENCY", default=1)
+# Per-topic overrides of the registry policy, e.g.
+# {"orders/create": {"queue": "shopify", "concurrency": 4, "timeout": 120}}
+# ("concurrency" caps each worker process, not the whole cluster).
+EVENT_TOPIC_POLICIES = env.json("EVENT_TOPIC_POLICIES", default={})
+# Retries of failed events: attempts before dead-lettering (per topic with
+# "max_attempts" in EVENT_TOPIC_POLICIES), and exponential backoff in seconds.
+EVENT_MAX_ATTEMPTS = env.int("EVENT_MAX_ATTEMPTS", default=5)
+EVENT_RETRY_BASE_DELAY = env.int("EVENT_RETRY_BASE_DELAY", default=30)
+EVENT_RETRY_MAX_DELAY = env.int("EVENT_RETRY_MAX_DELAY", default=3600)
+EVENT_RETRY_SWEEP_BATCH_SIZE = env.int("EVENT_RETRY_SWEEP_BATCH_SIZE", default=500)
+# Seconds after which an event still 'processing' is considered abandoned by
+# its worker and released by the retry sweep (keep above the topic timeouts).
+EVENT_STALE_CLAIM_TIMEOUT = env.int("EVENT_STALE_CLAIM_TIMEOUT", default=900)
+# Bulk retries (API and admin): events claimed and dispatched per chunk.
+EVENT_BULK_RETRY_CHUNK_SIZE = env.int("EVENT_BULK_RETRY_CHUNK_SIZE", default=500)
+# Event listing API: keyset page size (default and max with ?page_size=).
+EVENT_LIST_PAGE_SIZE = env.int("EVENT_LIST_PAGE_SIZE", default=50)
+EVENT_LIST_MAX_PAGE_SIZE = env.int("EVENT_LIST_MAX_PAGE_SIZE", default=500)
+# Streaming exports: rows fetched per server-side cursor round trip.
+EVENT_EXPORT_CHUNK_SIZE = env.int("EVENT_EXPORT_CHUNK_SIZE", default=2000)
+# Retention: terminal events older than EVENT_ARCHIVE_AFTER_DAYS move to the
+# (monthly partitioned) archive, which keeps them EVENT_ARCHIVE_RETENTION_DAYS
+# (0 keeps them forever).
+EVENT_ARCHIVE_STATUSES = env.list("EVENT_ARCHIVE_STATUSES", default=["success"])
+EVENT_ARCHIVE_AFTER_DAYS = env.int("EVENT_ARCHIVE_AFTER_DAYS", default=30)
+EVENT_ARCHIVE_RETENTION_DAYS = env.int("EVENT_ARCHIVE_RETENTION_DAYS", default=365)
+EVENT_ARCHIVE_BATCH_SIZE = env.int("EVENT_ARCHIVE_BATCH_SIZE", default=1000)
+# External payload store for large event bodies: "" (inline), "db" (side
+# table) or "filesystem" (EVENT_PAYLOAD_STORE_ROOT). Bodies smaller than
+# EVENT_PAYLOAD_MIN_BYTES once compressed stay inline; externalized ones keep
+# the EVENT_PAYLOAD_PROJECTION keys on the row.
+EVENT_PAYLOAD_STORE = env("EVENT_PAYLOAD_STORE", default="")
+EVENT_PAYLOAD_STORE_ROOT = env("EVENT_PAYLOAD_STORE_ROOT", default=str(BASE_DIR / "var" / "event-payloads"))
+EVENT_PAYLOAD_MIN_BYTES = env.int("EVENT_PAYLOAD_MIN_BYTES", default=1024)
+EVENT_PAYLOAD_PROJECTION = env.list("EVENT_PAYLOAD_PROJECTION", default=["id", "name", "company", "order_status_url", "store_id"])
+# Content-hash deduplication at ingestion: seconds an identical event of the
+# same organization is rejected (database window, per topic with
+# "dedup_window" in EVENT_TOPIC_POLICIES) and TTL of the Redis fast path.
+EVENT_DEDUP_WINDOW = env.int("EVENT_DEDUP_WINDOW", default=60 * 60 * 24)
+EVENT_DEDUP_FAST_TTL = env.int("EVENT_DEDUP_FAST_TTL", default=300)
+# TTL of the Redis fast path on idempotency keys (Shopify retries for 48h).
+EVENT_IDEMPOTENCY_FAST_TTL = env.int("EVENT_IDEMPOTENCY_FAST_TTL", default=60 * 60 * 48)
+# TTL of the fast path keys until the event is committed: a rolled back
+# delivery only blocks its redeliveries this long.
+EVENT_DEDUP_INFLIGHT_TTL = env.int("EVENT_DEDUP_INFLIGHT_TTL", default=60)
+
+# Executor backend for events processed outside the request cycle:
+# "thread" (bounded in-process pool) or "celery" (Celery queue).
+EVENT_EXECUTOR_BACKEND = env("EVENT_EXECUTOR_BACKEND", default="thread")
+EVENT_EXECUTOR_POOL_SIZE = env.int("EVENT_EXECUTOR_POOL_SIZE", default=4)
+EVENT_EXECUTOR_QUEUE_LIMIT = env.int("EVENT_EXECUTOR_QUEUE_LIMIT", default=100)
+# Seconds to wait for a free slot before leaving the event to the event worker.
+EVENT_EXECUTOR_SUBMIT_TIMEOUT = env.float("EVENT_EXECUTOR_SUBMIT_TIMEOUT", default=0)
+EVENT_EXECUTOR_CELERY_QUEUE = env("EVENT_EXECUTOR_CELERY_QUEUE", default=None)
+
+# Transactional outbox
+OUTBOX_SWEEP_BATCH_SIZE = env.int("OUTBOX_SWEEP_BATCH_SIZE", default=500)
+# Seconds before an unpublished outbox message is considered lost.
+OUTBOX_SWEEP_AFTER = env.int("OUTBOX_SWEEP_AFTER", default=60)
+
+# Shared HTTP transport for integrations: (connect, read) timeouts in seconds
+INTEGRATION_HTTP_TIMEOUTS = env.json("INTEGRATION_HTTP_TIMEOUTS", default={
+    "erpnext": [5, 30],
+    "alegra": [5, 20],
+    "core_backend": [5, 30],
+})
+# Number of hosts kept in the pool of each session and connections per host.
+INTEGRATION_HTTP_POOL_CONNECTIONS = env.int("INTEGRATION_HTTP_POOL_CONNECTIONS", default=20)
+INTEGRATION_HTTP_POOL_MAXSIZE = env.int("INTEGRATION_HTTP_POOL_MAXSIZE", default=10)
+# Distributed rate limits per integration and credential: `rate` requests per
+# second with bursts of up to `burst`. Integrations not listed are unlimited.
+INTEGRATION_RATE_LIMITS = env.json("INTEGRATION_RATE_LIMITS", default={
+    "alegra": {"rate": 2, "burst": 10},
+    "erpnext": {"rate": 10, "burst": 20},
+    "core_backend": {"rate": 20, "burst": 40},
+})
+# Max seconds a call waits for a token (or a Retry-After) before giving up,
+# and retries of a call answered with 429.
+INTEGRATION_RATE_LIMIT_MAX_WAIT = env.float("INTEGRATION_RATE_LIMIT_MAX_WAIT", default=30)
+INTEGRATION_RATE_LIMIT_RETRIES = env.int("INTEGRATION_RATE_LIMIT_RETRIES", default=2)
+# Per-host circuit breaker: consecutive failures that open a circuit, seconds
+# it stays open before probing, and concurrent probes while half-open.
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int("CIRCUIT_BREAKER_FAILURE_THRESHOLD", default=5)
+CIRCUIT_BREAKER_RESET_TIMEOUT = env.float("CIRCUIT_BREAKER_RESET_TIMEOUT", default=30)
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = env.int("CIRCUIT_BREAKER_HALF_OPEN_PROBES", default=1)
+
+# Shopify domain -> Company lookup cache
+SHOPIFY_DOMAIN_CACHE_TTL = env.int("SHOPIFY_DOMAIN_CACHE_TTL", default=3600)
+SHOPIFY_DOMAIN_LOCAL_CACHE_TTL = env.int("SHOPIFY_DOMAIN_LOCAL_CACHE_TTL", default=60)
+SHOPIFY_DOMAIN_NEGATIVE_CACHE_TTL = env.int("SHOPIFY_DOMAIN_NEGATIVE_CACHE_TTL", default=30)
+
+# ERPNext customer resolution cache (per tenant, site and email)
+ERPNEXT_CUSTOMER_CACHE_TTL = env.int("ERPNEXT_CUSTOMER_CACHE_TTL", default=60 * 60 * 24)
+ERPNEXT_CUSTOMER_LOCAL_CACHE_TTL = env.int("ERPNEXT_CUSTOMER_LOCAL_CACHE_TTL", default=300)
+# ERPNext field holding the workflow step marker of the documents created by
+# workflows (a custom field on doctypes without remarks).
+WORKFLOW_MARKER_FIELD = env("WORKFLOW_MARKER_FIELD", default="remarks")
+
+# POS invoice KPIs: cache of the responses built from the daily rollups
+# (keyed by a data version bumped on every rollup update) and list sizes.
+POS_KPI_CACHE_TTL = env.int("POS_KPI_CACHE_TTL", default=60 * 60)
+POS_KPI_LOCAL_CACHE_TTL = env.int("POS_KPI_LOCAL_CACHE_TTL", default=30)
+POS_KPI_TOP_ITEMS = env.int("POS_KPI_TOP_ITEMS", default=10)
+POS_KPI_RECENT_INVOICES = env.int("POS_KPI_RECENT_INVOICES", default=10)
+
+# Alegra invoice numbering: seconds between resyncs with Alegra and numbers
+# reserved per round trip (blocks > 1 may leave gaps when a process stops).
+ALEGRA_NUMBER_RESYNC_INTERVAL = env.int("ALEGRA_NUMBER_RESYNC_INTERVAL", default=3600)
+ALEGRA_NUMBER_BLOCK_SIZE = env.int("ALEGRA_NUMBER_BLOCK_SIZE", default=1)
+# Alegra error codes meaning "invoice number already used"; when empty the
+# error message must name the rejected number.
+ALEGRA_NUMBER_CONFLICT_CODES = env.list("ALEGRA_NUMBER_CONFLICT_CODES", default=[])
+# Concurrent invoice submissions per credential in bulk mode (POS bursts).
+ALEGRA_BULK_CONCURRENCY = env.int("ALEGRA_BULK_CONCURRENCY", default=4)